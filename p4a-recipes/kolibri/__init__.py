@@ -3,6 +3,8 @@ from os.path import dirname
 from os.path import join
 
 import kolibri
+import sh
+from pythonforandroid.logger import shprint
 from pythonforandroid.recipe import PythonRecipe
 
 
@@ -25,5 +27,16 @@ class KolibriRecipe(PythonRecipe):
         # Always clean the build to ensure that we always update Kolibri
         return True
 
+    def postbuild_arch(self, arch):
+        super().postbuild_arch(arch)
+        if environ.get("BYTECODE_BUNDLE"):
+            # Bundle Kolibri's bytecode into a single indexed file, before p4a compiles
+            # site-packages, using the python that will run it
+            shprint(
+                sh.Command(self.ctx.hostpython),
+                join(dirname(__file__), "../../scripts/bytecode_bundle.py"),
+                self.ctx.get_python_install_dir(arch.arch),
+            )
+
 
 recipe = KolibriRecipe()
@@ -4,9 +4,11 @@ import java.io.InputStream;
 import java.io.FileInputStream;
 import java.io.FileOutputStream;
 import java.io.File;
+import java.io.IOException;
 
 import android.app.Activity;
 import android.content.Context;
+import android.content.res.AssetManager;
 import android.content.res.Resources;
 import android.util.Log;
 import android.widget.Toast;
@@ -14,6 +16,7 @@ import android.widget.Toast;
 import java.util.ArrayList;
 import java.util.regex.Pattern;
 
+import org.learningequality.BundleUpdate;
 import org.learningequality.Kolibri.BuildConfig;
 import org.renpy.android.AssetExtract;
 
@@ -129,6 +132,28 @@ public class PythonUtil {
         f.delete();
     }
 
+    /**
+     * Returns whether the private and python bundles were both extracted with a manifest, and
+     * the incoming ones both have one, so that their files can be updated in place. Otherwise
+     * a full extraction over the old files would leave behind the ones that were removed.
+     */
+    private static boolean canUpdateBundles(Context ctx, File target) {
+        if (!new BundleUpdate(target, "private").canUpdate()
+                || !new BundleUpdate(target, "libpybundle").canUpdate()) {
+            return false;
+        }
+        String pyBundle = ctx.getApplicationInfo().nativeLibraryDir + "/libpybundle.so";
+        try (
+            InputStream privateStream = ctx.getAssets().open("private.tar", AssetManager.ACCESS_STREAMING);
+            InputStream pyBundleStream = new FileInputStream(pyBundle)
+        ) {
+            return BundleUpdate.hasManifest(privateStream) && BundleUpdate.hasManifest(pyBundleStream);
+        } catch (IOException e) {
+            Log.w(TAG, "Could not read the bundle manifests", e);
+            return false;
+        }
+    }
+
     public static void unpackAsset(
         Context ctx,
         final String resource,
@@ -173,19 +198,23 @@ public class PythonUtil {
         if (! dataVersion.equals(diskVersion)) {
             Log.v(TAG, "Extracting " + resource + " assets.");
 
-            if (cleanup_on_version_update) {
+            // Only skip the clean up if both bundles can be updated in place. This also
+            // cleans up the python bundle, which is extracted without one.
+            if (cleanup_on_version_update && !canUpdateBundles(ctx, target)) {
                 recursiveDelete(target);
             }
             target.mkdirs();
 
             AssetExtract ae = new AssetExtract(ctx);
-            if (!ae.extractTar(resource + ".tar", target.getAbsolutePath(), "private")) {
+            if (!ae.extractTar(resource + ".tar", target.getAbsolutePath(), "private", resource)) {
                 String msg = "Could not extract " + resource + " data.";
                 if (ctx instanceof Activity) {
                     toastError((Activity)ctx, msg);
                 } else {
                     Log.v(TAG, msg);
                 }
+                // Leave the version file out of date, to try again on the next launch
+                return;
             }
 
             try {
@@ -245,13 +274,15 @@ public class PythonUtil {
             target.mkdirs();
 
             AssetExtract ae = new AssetExtract(ctx);
-            if (!ae.extractTar(resource + ".so", target.getAbsolutePath(), "pybundle")) {
+            if (!ae.extractTar(resource + ".so", target.getAbsolutePath(), "pybundle", "libpybundle")) {
                 String msg = "Could not extract " + resource + " data.";
                 if (ctx instanceof Activity) {
                     toastError((Activity)ctx, msg);
                 } else {
                     Log.v(TAG, msg);
                 }
+                // Leave the version file out of date, to try again on the next launch
+                return;
             }
 
             try {
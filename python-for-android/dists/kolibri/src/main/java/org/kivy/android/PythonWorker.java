@@ -1,16 +1,36 @@
 package org.kivy.android;
 
 import android.content.Context;
+import android.net.LocalSocket;
+import android.net.LocalSocketAddress;
 import android.os.Process;
+import android.system.ErrnoException;
+import android.system.Os;
 import android.util.Log;
 
 import androidx.annotation.NonNull;
 
+import java.io.BufferedReader;
+import java.io.IOException;
+import java.io.InputStreamReader;
+import java.io.OutputStreamWriter;
+import java.io.Writer;
+import java.nio.charset.StandardCharsets;
+import java.util.Map;
+import java.util.concurrent.ArrayBlockingQueue;
+import java.util.concurrent.BlockingQueue;
+import java.util.concurrent.ConcurrentHashMap;
+
 /**
  * Ideally this would be called `PythonWorkerImpl` but the name is used in the native code.
  */
 public class PythonWorker {
     private static final String TAG = "PythonWorkerImpl";
+    // Exports the warm socket name to python, which listens on it once its first job is done
+    private static final String WARM_SOCKET_ENV = "PYTHON_WORKER_SOCKET";
+    // Results of the first job of each interpreter, by request ID, as reported by python
+    private static final Map<String, BlockingQueue<Integer>> results = new ConcurrentHashMap<>();
+    private final Context appContext;
     // Python environment variables
     private final String pythonName;
     private final String workerEntrypoint;
@@ -18,11 +38,15 @@ public class PythonWorker {
     private final String androidArgument;
     private final String pythonHome;
     private final String pythonPath;
+    // Abstract socket that an already initialized, warm, interpreter listens on
+    private final String warmSocketName;
 
     public PythonWorker(@NonNull Context context, String pythonName, String workerEntrypoint) {
         PythonLoader.doLoad(context);
+        this.appContext = context.getApplicationContext();
         this.pythonName = pythonName;
         this.workerEntrypoint = workerEntrypoint;
+        this.warmSocketName = context.getPackageName() + "." + pythonName;
 
         String appRoot = PythonUtil.getAppRoot(context);
         androidPrivate = appRoot;
@@ -44,28 +68,117 @@ public class PythonWorker {
     public boolean execute(String id, String arg) {
         Log.d(TAG, id + " Running with python worker argument: " + arg);
 
-        String serializedArg = String.join(
+        // The warm interpreter replaces this thread's ID with that of its own thread
+        Integer warmRes = executeWarm(id, serializeArg(id, arg));
+        if (warmRes != null) {
+            Log.d(TAG, id + " Finished executing python work in warm worker: " + warmRes);
+            return warmRes == 0;
+        }
+
+        int res = executeCold(id, arg);
+        Log.d(TAG, id + " Finished executing python work: " + res);
+        return res == 0;
+    }
+
+    /**
+     * The job request that python runs, with the ID of the calling thread, as Kolibri
+     * records the process and thread that run each job
+     */
+    private static String serializeArg(String id, String arg) {
+        return String.join(
                 ",",
                 id,
                 arg,
                 Integer.toString(Process.myPid()),
                 Long.toString(Thread.currentThread().getId())
         );
+    }
 
-        int res;
+    /**
+     * Starts a new interpreter for the work on its own thread, and waits for the result of the
+     * work rather than for the interpreter, which python keeps warm for later work once it
+     * has reported the result.
+     */
+    private int executeCold(String id, String arg) {
+        BlockingQueue<Integer> result = new ArrayBlockingQueue<>(1);
+        results.put(id, result);
+        Thread thread = new Thread(() -> {
+            int res;
+            try (PythonProvider ignored = PythonProvider.create(appContext)) {
+                Os.setenv(WARM_SOCKET_ENV, warmSocketName, true);
+                res = nativeStart(
+                        androidPrivate, androidArgument,
+                        workerEntrypoint, pythonName,
+                        pythonHome, pythonPath,
+                        serializeArg(id, arg)
+                );
+            } catch (ErrnoException | RuntimeException e) {
+                Log.e(TAG, "Error executing python work", e);
+                res = 1;
+            }
+            // Ignored if python reported the result already
+            result.offer(res);
+        }, "PythonWorker-" + id);
+        thread.start();
+        boolean interrupted = false;
         try {
-            res = nativeStart(
-                    androidPrivate, androidArgument,
-                    workerEntrypoint, pythonName,
-                    pythonHome, pythonPath,
-                    serializedArg
-            );
-            Log.d(TAG, id + " Finished executing python work: " + res);
-        } catch (Exception e) {
-            Log.e(TAG, "Error executing python work", e);
-            return false;
+            // The interpreter cannot be stopped once started, so wait for the work to finish
+            // even if interrupted, rather than letting it be retried while it still runs
+            while (true) {
+                try {
+                    return result.take();
+                } catch (InterruptedException e) {
+                    Log.w(TAG, id + " Interrupted while executing python work, still waiting");
+                    interrupted = true;
+                }
+            }
+        } finally {
+            results.remove(id);
+            if (interrupted) {
+                Thread.currentThread().interrupt();
+            }
         }
+    }
 
-        return res == 0;
+    /**
+     * This method is called by the python side, when the first job of an interpreter is done,
+     * so that the worker that requested it can finish while the interpreter is kept warm.
+     */
+    public static void reportResult(String id, int result) {
+        BlockingQueue<Integer> queue = results.get(id);
+        if (queue != null) {
+            queue.offer(result);
+        }
+    }
+
+    /**
+     * Attempts to hand the work to a warm interpreter, returning null if there is none available
+     * so that the caller falls back to starting a new one.
+     */
+    private Integer executeWarm(String id, String serializedArg) {
+        try (LocalSocket socket = new LocalSocket()) {
+            try {
+                socket.connect(new LocalSocketAddress(warmSocketName));
+            } catch (IOException e) {
+                // No warm interpreter is listening, or it is busy
+                return null;
+            }
+            Log.d(TAG, id + " Running in warm python worker");
+            Writer writer = new OutputStreamWriter(socket.getOutputStream(), StandardCharsets.UTF_8);
+            writer.write(serializedArg + "\n");
+            writer.flush();
+            BufferedReader reader = new BufferedReader(
+                    new InputStreamReader(socket.getInputStream(), StandardCharsets.UTF_8)
+            );
+            String line = reader.readLine();
+            if (line == null) {
+                Log.e(TAG, id + " Warm python worker closed without a result");
+                return 1;
+            }
+            return Integer.parseInt(line.trim());
+        } catch (IOException | NumberFormatException e) {
+            Log.e(TAG, "Error executing python work in warm worker", e);
+            return 1;
+        }
     }
 }
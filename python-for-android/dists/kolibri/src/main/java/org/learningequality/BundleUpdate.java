@@ -0,0 +1,322 @@
+package org.learningequality;
+
+import org.kamranzafar.jtar.TarEntry;
+import org.kamranzafar.jtar.TarInputStream;
+
+import java.io.BufferedInputStream;
+import java.io.BufferedOutputStream;
+import java.io.BufferedReader;
+import java.io.ByteArrayInputStream;
+import java.io.ByteArrayOutputStream;
+import java.io.File;
+import java.io.FileInputStream;
+import java.io.FileNotFoundException;
+import java.io.FileOutputStream;
+import java.io.IOException;
+import java.io.InputStream;
+import java.io.InputStreamReader;
+import java.io.OutputStream;
+import java.nio.charset.StandardCharsets;
+import java.util.HashMap;
+import java.util.HashSet;
+import java.util.Map;
+import java.util.Set;
+import java.util.zip.GZIPInputStream;
+
+/**
+ * Extracts a gzipped bundle tar into a directory, only writing the files that changed since
+ * the version already extracted there.
+ *
+ * scripts/bundle_manifest.py puts a manifest of the content hash of each file first in the
+ * tar. Once a bundle has been extracted, its manifest is kept in the target directory, and
+ * the next version's manifest is compared against it, to write only the files that were
+ * added or changed, or are missing from disk, and to delete the files that were removed.
+ * Bundles without a manifest are extracted in full, so PythonUtil only extracts over the
+ * previous version's files when every incoming bundle has one, and cleans them up otherwise.
+ *
+ * Files are written to a temporary file and renamed into place, and the new manifest is
+ * saved as pending before anything is changed. If extraction is interrupted, the next
+ * attempt first marks every file that differs between the two manifests as unknown in the
+ * installed one, as either version of it may be on disk, so that it is rewritten or deleted.
+ * The manifest is only replaced once all the files are in place.
+ *
+ * This uses no Android APIs, so it can be run on Linux by scripts/benchmarks/bundle_update.py.
+ */
+public class BundleUpdate {
+    // The name of the manifest entry in the tar, which is not extracted
+    public static final String MANIFEST_ENTRY = "bundle.manifest";
+
+    private static final String TEMP_SUFFIX = ".tmp";
+    // The hash of a file whose content on disk is not known
+    private static final String UNKNOWN = "-";
+
+    private final File target;
+    private final File manifestFile;
+    private final File pendingFile;
+
+    public static class Result {
+        public boolean delta;
+        public int filesWritten;
+        public long bytesWritten;
+        public int filesSkipped;
+        public int filesDeleted;
+
+        @Override
+        public String toString() {
+            return (delta ? "delta" : "full") + " extraction: wrote " + filesWritten + " files ("
+                    + bytesWritten + " bytes), skipped " + filesSkipped + ", deleted " + filesDeleted;
+        }
+    }
+
+    /**
+     * @param target The directory to extract into
+     * @param name The name of the bundle, under which its manifest is kept in the target
+     */
+    public BundleUpdate(File target, String name) {
+        this.target = target;
+        this.manifestFile = new File(target, name + ".manifest");
+        this.pendingFile = new File(target, name + ".manifest.pending");
+    }
+
+    /**
+     * Returns whether a bundle with a manifest has been extracted, so that the next one
+     * can be extracted as a delta.
+     */
+    public boolean canUpdate() {
+        return manifestFile.isFile() || pendingFile.isFile();
+    }
+
+    private static String entryPath(TarEntry entry) {
+        String name = entry.getName();
+        while (name.startsWith("./")) {
+            name = name.substring(2);
+        }
+        return name;
+    }
+
+    /**
+     * Returns whether the gzipped tar in the stream starts with a manifest, reading no further
+     * than its first entry. The stream is not closed.
+     */
+    public static boolean hasManifest(InputStream stream) throws IOException {
+        TarInputStream tis = new TarInputStream(new GZIPInputStream(new BufferedInputStream(stream, 8192)));
+        TarEntry entry = tis.getNextEntry();
+        return entry != null && entryPath(entry).equals(MANIFEST_ENTRY);
+    }
+
+    /**
+     * Parses a manifest, of a hash and a path on each line, separated by a tab
+     */
+    static Map<String, String> parseManifest(InputStream stream) throws IOException {
+        Map<String, String> manifest = new HashMap<>();
+        BufferedReader reader = new BufferedReader(new InputStreamReader(stream, StandardCharsets.UTF_8));
+        String line;
+        while ((line = reader.readLine()) != null) {
+            int tab = line.indexOf('\t');
+            if (line.startsWith("#") || tab < 0) {
+                continue;
+            }
+            manifest.put(line.substring(tab + 1), line.substring(0, tab));
+        }
+        return manifest;
+    }
+
+    private static Map<String, String> readManifest(File file) throws IOException {
+        try (InputStream stream = new FileInputStream(file)) {
+            return parseManifest(stream);
+        } catch (FileNotFoundException e) {
+            return null;
+        }
+    }
+
+    private static byte[] readEntry(TarInputStream tis) throws IOException {
+        ByteArrayOutputStream out = new ByteArrayOutputStream();
+        byte[] buf = new byte[64 * 1024];
+        int len;
+        while ((len = tis.read(buf)) != -1) {
+            out.write(buf, 0, len);
+        }
+        return out.toByteArray();
+    }
+
+    /**
+     * Writes the stream to the path, replacing any file there only once it is complete
+     */
+    private static long writeFile(InputStream in, File path, byte[] buf, boolean sync) throws IOException {
+        File parent = path.getParentFile();
+        if (parent != null) {
+            parent.mkdirs();
+        }
+        File temp = new File(path.getPath() + TEMP_SUFFIX);
+        long written = 0;
+        try (FileOutputStream fos = new FileOutputStream(temp)) {
+            OutputStream out = new BufferedOutputStream(fos, 8192);
+            int len;
+            while ((len = in.read(buf)) != -1) {
+                out.write(buf, 0, len);
+                written += len;
+            }
+            out.flush();
+            if (sync) {
+                fos.getFD().sync();
+            }
+        }
+        if (path.isDirectory()) {
+            deleteRecursively(path);
+        }
+        if (!temp.renameTo(path)) {
+            throw new IOException("Could not move " + temp + " into place");
+        }
+        return written;
+    }
+
+    private static void deleteRecursively(File file) {
+        File[] children = file.listFiles();
+        if (children != null) {
+            for (File child : children) {
+                deleteRecursively(child);
+            }
+        }
+        file.delete();
+    }
+
+    /**
+     * Returns the manifest of the files on disk after an interrupted extraction, with the
+     * files that differ between the installed and pending manifests marked as unknown
+     */
+    static Map<String, String> mergeInterrupted(Map<String, String> installed, Map<String, String> pending) {
+        Map<String, String> merged = new HashMap<>();
+        Set<String> paths = new HashSet<>(installed.keySet());
+        paths.addAll(pending.keySet());
+        for (String path : paths) {
+            String hash = installed.get(path);
+            merged.put(path, hash != null && hash.equals(pending.get(path)) ? hash : UNKNOWN);
+        }
+        return merged;
+    }
+
+    private static byte[] formatManifest(Map<String, String> manifest) {
+        StringBuilder builder = new StringBuilder();
+        for (Map.Entry<String, String> file : manifest.entrySet()) {
+            builder.append(file.getValue()).append('\t').append(file.getKey()).append('\n');
+        }
+        return builder.toString().getBytes(StandardCharsets.UTF_8);
+    }
+
+    /**
+     * Returns the paths to write, that were added or changed since the installed manifest,
+     * or are missing from disk
+     */
+    Set<String> pathsToWrite(Map<String, String> installed, Map<String, String> next) {
+        Set<String> writes = new HashSet<>();
+        for (Map.Entry<String, String> file : next.entrySet()) {
+            String path = file.getKey();
+            if (!file.getValue().equals(installed.get(path)) || !new File(target, path).isFile()) {
+                writes.add(path);
+            }
+        }
+        return writes;
+    }
+
+    /**
+     * Returns the paths to delete, that are in the installed manifest but not the next one
+     */
+    static Set<String> pathsToDelete(Map<String, String> installed, Map<String, String> next) {
+        Set<String> deletes = new HashSet<>(installed.keySet());
+        deletes.removeAll(next.keySet());
+        return deletes;
+    }
+
+    private void delete(String path) {
+        File file = new File(target, path);
+        file.delete();
+        // Along with any partial copy left by an interrupted extraction
+        new File(file.getPath() + TEMP_SUFFIX).delete();
+        // Remove any directories left empty, up to the target
+        File parent = file.getParentFile();
+        while (parent != null && !parent.equals(target) && parent.delete()) {
+            parent = parent.getParentFile();
+        }
+    }
+
+    /**
+     * Extracts the gzipped tar in the stream, which is not closed.
+     */
+    public Result apply(InputStream stream) throws IOException {
+        Result result = new Result();
+        byte[] buf = new byte[1024 * 1024];
+        TarInputStream tis = new TarInputStream(new BufferedInputStream(
+                new GZIPInputStream(new BufferedInputStream(stream, 8192)), 8192));
+        target.mkdirs();
+
+        TarEntry entry = tis.getNextEntry();
+        Map<String, String> next = null;
+        Set<String> writes = null;
+        Set<String> deletes = null;
+        if (entry != null && entryPath(entry).equals(MANIFEST_ENTRY)) {
+            byte[] manifest = readEntry(tis);
+            next = parseManifest(new ByteArrayInputStream(manifest));
+            Map<String, String> installed = readManifest(manifestFile);
+            Map<String, String> pending = readManifest(pendingFile);
+            if (installed == null) {
+                installed = new HashMap<>();
+            }
+            if (pending != null) {
+                installed = mergeInterrupted(installed, pending);
+                writeFile(new ByteArrayInputStream(formatManifest(installed)), manifestFile, buf, true);
+            }
+            writes = pathsToWrite(installed, next);
+            deletes = pathsToDelete(installed, next);
+            // Record what is about to be extracted, before changing anything
+            writeFile(new ByteArrayInputStream(manifest), pendingFile, buf, true);
+            result.delta = true;
+            entry = tis.getNextEntry();
+        } else {
+            // Whatever is on disk will no longer match any manifest
+            manifestFile.delete();
+            pendingFile.delete();
+        }
+
+        for (; entry != null; entry = tis.getNextEntry()) {
+            String path = entryPath(entry);
+            if (entry.isDirectory()) {
+                new File(target, path).mkdirs();
+                continue;
+            }
+            if (writes != null && !writes.remove(path)) {
+                result.filesSkipped++;
+                continue;
+            }
+            result.bytesWritten += writeFile(tis, new File(target, path), buf, false);
+            result.filesWritten++;
+        }
+
+        if (writes != null && !writes.isEmpty()) {
+            throw new IOException("The bundle is missing " + writes.size() + " files in its manifest, including "
+                    + writes.iterator().next());
+        }
+        if (deletes != null) {
+            for (String path : deletes) {
+                delete(path);
+                result.filesDeleted++;
+            }
+        }
+        if (next != null && !pendingFile.renameTo(manifestFile)) {
+            throw new IOException("Could not save the manifest to " + manifestFile);
+        }
+        return result;
+    }
+
+    /**
+     * Extracts a bundle on Linux, for testing: BundleUpdate bundle.tar.gz target name
+     */
+    public static void main(String[] args) throws IOException {
+        if (args.length != 3) {
+            System.err.println("Usage: BundleUpdate bundle.tar.gz target name");
+            System.exit(2);
+        }
+        try (InputStream stream = new FileInputStream(args[0])) {
+            System.out.println(new BundleUpdate(new File(args[1]), args[2]).apply(stream));
+        }
+    }
+}
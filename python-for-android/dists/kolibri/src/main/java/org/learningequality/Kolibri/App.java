@@ -1,29 +1,46 @@
 package org.learningequality.Kolibri;
 
 import android.app.Activity;
+import android.app.ActivityManager;
 import android.app.Application;
 import android.content.Context;
 import android.os.Build;
 import android.os.Bundle;
+import android.system.ErrnoException;
+import android.system.Os;
+import android.util.Log;
 
 import androidx.annotation.NonNull;
 import androidx.core.app.NotificationChannelCompat;
 import androidx.core.app.NotificationManagerCompat;
 import androidx.work.Configuration;
 
+import org.json.JSONException;
+import org.json.JSONObject;
 import org.kivy.android.PythonContext;
 import org.learningequality.notification.NotificationRef;
 
+import java.io.BufferedReader;
+import java.io.File;
+import java.io.FileReader;
+import java.io.IOException;
+import java.util.Locale;
+import java.util.TimeZone;
 import java.util.concurrent.Executors;
 import java.util.concurrent.atomic.AtomicInteger;
 
 
 public class App extends Application implements Configuration.Provider {
+    private static final String TAG = "Kolibri.App";
+    // Written by python's device_profile module
+    private static final String DEVICE_PROFILE_FILENAME = "device_profile.json";
+    private static final int DEFAULT_TASK_WORKERS = 6;
     protected final AtomicInteger activeActivities = new AtomicInteger(0);
 
     @Override
     public void onCreate() {
         super.onCreate();
+        exportBootEnvironment();
         // Initialize Python context
         PythonContext.getInstance(this);
         createNotificationChannels();
@@ -38,15 +55,58 @@ public class App extends Application implements Configuration.Provider {
         String processName = getApplicationContext().getPackageName();
         processName += getApplicationContext().getString(R.string.task_worker_process);
 
-        // Using the same quantity of worker threads as Kolibri's python side:
-        // https://github.com/learningequality/kolibri/blob/release-v0.16.x/kolibri/utils/options.py#L683
         return new Configuration.Builder()
                 .setDefaultProcessName(processName)
                 .setMinimumLoggingLevel(android.util.Log.DEBUG)
-                .setExecutor(Executors.newFixedThreadPool(6))
+                .setExecutor(Executors.newFixedThreadPool(getTaskWorkers()))
                 .build();
     }
 
+    /**
+     * Returns the number of task worker threads that python's device profile sized to this
+     * device, or the same quantity as Kolibri's python side before python has profiled it:
+     * https://github.com/learningequality/kolibri/blob/release-v0.16.x/kolibri/utils/options.py#L683
+     */
+    private int getTaskWorkers() {
+        File profileFile = new File(getFilesDir(), DEVICE_PROFILE_FILENAME);
+        if (!profileFile.exists()) {
+            return DEFAULT_TASK_WORKERS;
+        }
+        try (BufferedReader reader = new BufferedReader(new FileReader(profileFile))) {
+            StringBuilder profile = new StringBuilder();
+            String line;
+            while ((line = reader.readLine()) != null) {
+                profile.append(line);
+            }
+            int taskWorkers = new JSONObject(profile.toString())
+                    .getJSONObject("settings")
+                    .getInt("task_workers");
+            return taskWorkers > 0 ? taskWorkers : DEFAULT_TASK_WORKERS;
+        } catch (IOException | JSONException e) {
+            Log.e(TAG, "Failed to read device profile", e);
+            return DEFAULT_TASK_WORKERS;
+        }
+    }
+
+    /**
+     * Exports values that python uses to validate its cached boot environment and to profile
+     * the device, so that it can read them without calling into Java. This runs in every
+     * process, before python starts.
+     */
+    private void exportBootEnvironment() {
+        try {
+            // ANDROID_PRIVATE is the files directory in some processes and the app root in
+            // others, so python finds both from this
+            Os.setenv("KOLIBRI_ANDROID_FILES_DIR", getFilesDir().getAbsolutePath(), true);
+            Os.setenv("KOLIBRI_ANDROID_TIMEZONE", TimeZone.getDefault().getDisplayName(), true);
+            Os.setenv("KOLIBRI_ANDROID_LOCALE", Locale.getDefault().toLanguageTag(), true);
+            ActivityManager activityManager = (ActivityManager) getSystemService(Context.ACTIVITY_SERVICE);
+            Os.setenv("KOLIBRI_ANDROID_MEMORY_CLASS", String.valueOf(activityManager.getMemoryClass()), true);
+        } catch (ErrnoException e) {
+            Log.e(TAG, "Failed to export boot environment", e);
+        }
+    }
+
     private void createNotificationChannels() {
         // Create the NotificationChannel, but only on API 26+ because
         // the NotificationChannel class is not in the Support Library.
@@ -12,10 +12,14 @@ import org.learningequality.task.Observer;
 import org.learningequality.task.WorkerImpl;
 
 import java.util.List;
+import java.util.Map;
 import java.util.UUID;
+import java.util.concurrent.ConcurrentHashMap;
 
 public class TaskWorkerImpl extends PythonWorker implements WorkerImpl<TaskWorkerImpl.Message> {
     private static final ThreadLocal<TaskWorkerImpl> localInstance = new ThreadLocal<>();
+    // Instances by request ID, so warm python workers can report progress for any request
+    private static final Map<String, TaskWorkerImpl> instances = new ConcurrentHashMap<>();
     private final UUID id;
     private final List<Observer<Message>> observers;
 
@@ -24,6 +28,7 @@ public class TaskWorkerImpl extends PythonWorker implements WorkerImpl<TaskWorke
         this.id = id;
         observers = new java.util.ArrayList<>();
         localInstance.set(this);
+        instances.put(id.toString(), this);
     }
 
     public void addObserver(Observer<Message> observer) {
@@ -45,6 +50,7 @@ public class TaskWorkerImpl extends PythonWorker implements WorkerImpl<TaskWorke
     public void close() {
         observers.clear();
         localInstance.remove();
+        instances.remove(id.toString());
     }
 
     protected Message buildMessage(
@@ -67,6 +73,20 @@ public class TaskWorkerImpl extends PythonWorker implements WorkerImpl<TaskWorke
         }
     }
 
+    /**
+     * This method is called by the python side, when a warm python worker starts or finishes
+     * running a request on its own thread, so that progress is reported to the right worker.
+     * Passing an unknown or empty request ID unbinds the current thread.
+     */
+    public static void bindLocalInstance(String requestId) {
+        TaskWorkerImpl instance = instances.get(requestId);
+        if (instance != null) {
+            localInstance.set(instance);
+        } else {
+            localInstance.remove();
+        }
+    }
+
     public class Message {
         public static final String KEY_ID = "id";
         public static final String KEY_NOTIFICATION_TITLE = "notificationTitle";
@@ -1,5 +1,12 @@
 package org.learningequality;
 
+import android.content.Context;
+import android.net.ConnectivityManager;
+import android.net.LinkProperties;
+import android.net.Network;
+import android.net.NetworkCapabilities;
+import android.net.NetworkRequest;
+
 import java.net.Inet4Address;
 import java.net.InetAddress;
 import java.net.NetworkInterface;
@@ -11,6 +18,38 @@ import java.util.List;
 
 public class NetworkUtils {
 
+    public interface NetworkChangeListener {
+        void onNetworkChanged();
+    }
+
+    /**
+     * Calls the listener whenever a network connects or disconnects, or its addresses change,
+     * which are the changes that can alter the result of getActiveIPv4Addresses.
+     */
+    public static void registerNetworkChangeListener(Context context, final NetworkChangeListener listener) {
+        ConnectivityManager connectivityManager = (ConnectivityManager) context.getSystemService(Context.CONNECTIVITY_SERVICE);
+        // Include local networks without internet access, like a classroom's own Wi-Fi
+        NetworkRequest request = new NetworkRequest.Builder()
+                .removeCapability(NetworkCapabilities.NET_CAPABILITY_INTERNET)
+                .build();
+        connectivityManager.registerNetworkCallback(request, new ConnectivityManager.NetworkCallback() {
+            @Override
+            public void onAvailable(Network network) {
+                listener.onNetworkChanged();
+            }
+
+            @Override
+            public void onLost(Network network) {
+                listener.onNetworkChanged();
+            }
+
+            @Override
+            public void onLinkPropertiesChanged(Network network, LinkProperties linkProperties) {
+                listener.onNetworkChanged();
+            }
+        });
+    }
+
     public static List<String> getActiveIPv4Addresses() {
         List<String> ipAddresses = new ArrayList<>();
 
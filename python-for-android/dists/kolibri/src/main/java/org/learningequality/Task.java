@@ -33,8 +33,7 @@ import java9.util.concurrent.CompletableFuture;
 public class Task {
     public static final String TAG = "Kolibri.Task";
 
-    public static String enqueueOnce(String id, int delay, boolean expedite, String jobFunc, boolean longRunning) {
-        RemoteWorkManager workManager = RemoteWorkManager.getInstance(ContextUtil.getApplicationContext());
+    private static String enqueueOnce(RemoteWorkManager workManager, String id, int delay, boolean expedite, String jobFunc, boolean longRunning) {
         Builder.TaskRequest builder = new Builder.TaskRequest(id);
         builder.setDelay(delay)
                 .setExpedite(expedite)
@@ -47,6 +46,28 @@ public class Task {
         return workRequest.getId().toString();
     }
 
+    public static String enqueueOnce(String id, int delay, boolean expedite, String jobFunc, boolean longRunning) {
+        RemoteWorkManager workManager = RemoteWorkManager.getInstance(ContextUtil.getApplicationContext());
+        return enqueueOnce(workManager, id, delay, expedite, jobFunc, longRunning);
+    }
+
+    /**
+     * Enqueues many tasks with a single call from python, as each call crosses JNI
+     * The arrays are parallel, with the same meaning as the arguments to enqueueOnce
+     *
+     * @return The work request IDs, in the same order as the task IDs
+     */
+    public static String[] enqueueOnceBatch(
+            String[] ids, int[] delays, boolean[] expedites, String[] jobFuncs, boolean[] longRunnings
+    ) {
+        RemoteWorkManager workManager = RemoteWorkManager.getInstance(ContextUtil.getApplicationContext());
+        String[] requestIds = new String[ids.length];
+        for (int i = 0; i < ids.length; i++) {
+            requestIds[i] = enqueueOnce(workManager, ids[i], delays[i], expedites[i], jobFuncs[i], longRunnings[i]);
+        }
+        return requestIds;
+    }
+
     public static void clear(String id) {
         Context context = ContextUtil.getApplicationContext();
         RemoteWorkManager workManager = RemoteWorkManager.getInstance(context);
@@ -5,21 +5,13 @@ package org.renpy.android;
 import android.content.Context;
 import android.util.Log;
 
-import java.io.BufferedInputStream;
-import java.io.BufferedOutputStream;
 import java.io.IOException;
 import java.io.InputStream;
-import java.io.OutputStream;
-import java.io.FileOutputStream;
-import java.io.FileNotFoundException;
 import java.io.File;
 import java.io.FileInputStream;
 
-import java.util.zip.GZIPInputStream;
-
 import android.content.res.AssetManager;
-import org.kamranzafar.jtar.TarEntry;
-import org.kamranzafar.jtar.TarInputStream;
+import org.learningequality.BundleUpdate;
 
 public class AssetExtract {
 
@@ -29,12 +21,14 @@ public class AssetExtract {
         mAssetManager = context.getAssets();
     }
 
-    public boolean extractTar(String asset, String target, String method) {
-
-        byte buf[] = new byte[1024 * 1024];
-
+    /**
+     * Extracts the tar, only writing the files that changed since the last version
+     * extracted, if the tar has a manifest.
+     *
+     * @param name The name under which the tar's manifest is kept in the target
+     */
+    public boolean extractTar(String asset, String target, String method, String name) {
         InputStream assetStream = null;
-        TarInputStream tis = null;
 
         try {
             if(method == "private"){
@@ -42,74 +36,23 @@ public class AssetExtract {
             } else if (method == "pybundle") {
                 assetStream = new FileInputStream(asset);
             }
-
-            tis = new TarInputStream(new BufferedInputStream(new GZIPInputStream(new BufferedInputStream(assetStream, 8192)), 8192));
         } catch (IOException e) {
             Log.e("python", "opening up extract tar", e);
             return false;
         }
 
-        while (true) {
-            TarEntry entry = null;
-
-            try {
-                entry = tis.getNextEntry();
-            } catch ( IOException e ) {
-                Log.e("python", "extracting tar", e);
-                return false;
-            }
-
-            if ( entry == null ) {
-                break;
-            }
-
-            Log.v("python", "extracting " + entry.getName());
-
-            if (entry.isDirectory()) {
-
-                try {
-                    new File(target +"/" + entry.getName()).mkdirs();
-                } catch ( SecurityException e ) { };
-
-                continue;
-            }
-
-            OutputStream out = null;
-            String path = target + "/" + entry.getName();
-
-            try {
-                out = new BufferedOutputStream(new FileOutputStream(path), 8192);
-            } catch ( FileNotFoundException | SecurityException e ) {}
-
-            if ( out == null ) {
-                Log.e("python", "could not open " + path);
-                return false;
-            }
-
-            try {
-                while (true) {
-                    int len = tis.read(buf);
-
-                    if (len == -1) {
-                        break;
-                    }
-
-                    out.write(buf, 0, len);
-                }
-
-                out.flush();
-                out.close();
-            } catch ( IOException e ) {
-                Log.e("python", "extracting zip", e);
-                return false;
-            }
-        }
-
         try {
-            tis.close();
-            assetStream.close();
+            BundleUpdate.Result result = new BundleUpdate(new File(target), name).apply(assetStream);
+            Log.v("python", "Extracted " + asset + ": " + result);
         } catch (IOException e) {
-            // pass
+            Log.e("python", "extracting tar", e);
+            return false;
+        } finally {
+            try {
+                assetStream.close();
+            } catch (IOException e) {
+                // pass
+            }
         }
 
         return true;
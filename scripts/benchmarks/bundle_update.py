@@ -0,0 +1,251 @@
+"""
+Check BundleUpdate.java, which extracts the app's bundles on first launch after an update,
+against synthetic bundles, and compare delta extraction against extracting in full.
+
+Three versions of a bundle shaped like the python bundle are generated, each a little
+different from the last, with the third reverting some of the second's changes. Each
+scenario extracts them with BundleUpdate's main method, on Linux, and checks that the
+extracted files match the version extracted:
+
+- full: a version without a manifest, into an empty directory, as on every update before
+- delta: the second version over the first
+- interrupted: the second version over the first, killed at a random point, then the second
+  or third version extracted to completion
+
+Needs a JDK: set JAVA_HOME, or put javac and java on the PATH.
+
+Usage: python scripts/benchmarks/bundle_update.py [--files N] [--kills N]
+"""
+import argparse
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.join(BENCHMARK_DIR, "..", "..")
+sys.path.insert(0, os.path.join(REPO_DIR, "scripts"))
+
+from bundle_manifest import add_manifest  # noqa: E402
+
+JAVA_DIR = os.path.join(
+    REPO_DIR, "python-for-android", "dists", "kolibri", "src", "main", "java"
+)
+SOURCES = [os.path.join(JAVA_DIR, "org", "learningequality", "BundleUpdate.java")] + [
+    os.path.join(JAVA_DIR, "org", "kamranzafar", "jtar", name)
+    for name in sorted(os.listdir(os.path.join(JAVA_DIR, "org", "kamranzafar", "jtar")))
+]
+NAME = "libpybundle"
+# Files BundleUpdate keeps in the target, beside the bundle's own
+BOOKKEEPING = {NAME + ".manifest", NAME + ".manifest.pending"}
+
+
+def jdk_tool(name):
+    java_home = os.environ.get("JAVA_HOME")
+    if java_home:
+        return os.path.join(java_home, "bin", name)
+    return shutil.which(name)
+
+
+def random_content(rng):
+    size = rng.random()
+    if size < 0.9:
+        length = rng.randint(200, 20000)
+    elif size < 0.99:
+        length = rng.randint(20000, 500000)
+    else:
+        length = rng.randint(2000000, 8000000)
+    return rng.randbytes(length)
+
+
+def make_versions(count, rng):
+    """
+    Returns three dicts of path to content, for each version of the bundle
+    """
+    v1 = {}
+    for i in range(count):
+        path = "_python_bundle/site-packages/package{}/module{}/file{}.pyc".format(
+            i % 40, i % 7, i
+        )
+        v1[path] = random_content(rng)
+    paths = sorted(v1)
+    v2 = dict(v1)
+    changed = rng.sample(paths, count * 3 // 100)
+    for path in changed:
+        v2[path] = random_content(rng)
+    for path in rng.sample(paths, count * 2 // 100):
+        v2.pop(path, None)
+    for i in range(count * 2 // 100):
+        v2["_python_bundle/site-packages/new/file{}.pyc".format(i)] = random_content(
+            rng
+        )
+    v3 = dict(v2)
+    # Revert half the changes, and restore some of the removed files
+    for path in changed[: len(changed) // 2]:
+        v3[path] = v1[path]
+    for path in set(v1) - set(v2):
+        if rng.random() < 0.5:
+            v3[path] = v1[path]
+    return v1, v2, v3
+
+
+def write_bundle(files, path, manifest=True):
+    with tempfile.TemporaryDirectory() as source:
+        for name, content in files.items():
+            os.makedirs(os.path.dirname(os.path.join(source, name)), exist_ok=True)
+            with open(os.path.join(source, name), "wb") as f:
+                f.write(content)
+        with tarfile.open(path, "w:gz", format=tarfile.USTAR_FORMAT) as tar:
+            tar.add(os.path.join(source, "_python_bundle"), arcname="_python_bundle")
+    if manifest:
+        add_manifest(path)
+    return path
+
+
+def compile_java(classes_dir):
+    subprocess.run(
+        [jdk_tool("javac"), "-nowarn", "-d", classes_dir] + SOURCES,
+        check=True,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def extract_command(classes_dir, bundle, target):
+    return [
+        jdk_tool("java"),
+        "-cp",
+        classes_dir,
+        "org.learningequality.BundleUpdate",
+        bundle,
+        target,
+        NAME,
+    ]
+
+
+def extract(classes_dir, bundle, target):
+    start = time.perf_counter()
+    output = subprocess.run(
+        extract_command(classes_dir, bundle, target),
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.strip()
+    return output, time.perf_counter() - start
+
+
+def matches(target, files):
+    """
+    Returns whether the files in target, apart from bookkeeping, are exactly `files`
+    """
+    found = set()
+    for root, _, names in os.walk(target):
+        for name in names:
+            path = os.path.relpath(os.path.join(root, name), target)
+            if path not in BOOKKEEPING:
+                found.add(path)
+    if found != set(files):
+        return False
+    for path, content in files.items():
+        with open(os.path.join(target, path), "rb") as f:
+            if f.read() != content:
+                return False
+    return True
+
+
+def interrupted(classes_dir, bundles, versions, installed, temp_dir, kills, rng):
+    """
+    Extracts the second version over the first, killing it at random points, then extracts
+    the second or the third version to completion
+    """
+    timing = os.path.join(temp_dir, "timing")
+    shutil.copytree(installed, timing)
+    _, seconds = extract(classes_dir, bundles["v2"], timing)
+    mid_extraction = 0
+    failures = 0
+    for i in range(kills):
+        target = os.path.join(temp_dir, "killed{}".format(i))
+        shutil.copytree(installed, target)
+        process = subprocess.Popen(
+            extract_command(classes_dir, bundles["v2"], target),
+            stdout=subprocess.DEVNULL,
+        )
+        time.sleep(rng.uniform(0, seconds))
+        process.kill()
+        process.wait()
+        if os.path.exists(os.path.join(target, NAME + ".manifest.pending")):
+            mid_extraction += 1
+        final = "v3" if i % 2 else "v2"
+        extract(classes_dir, bundles[final], target)
+        if not matches(target, versions[final]):
+            failures += 1
+        shutil.rmtree(target)
+    print(
+        "interrupted: {} kills, {} during a delta extraction, {} mismatches".format(
+            kills, mid_extraction, failures
+        )
+    )
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=3000)
+    parser.add_argument("--kills", type=int, default=10)
+    args = parser.parse_args()
+
+    if not jdk_tool("javac") or not os.path.exists(jdk_tool("javac")):
+        sys.exit("javac not found: set JAVA_HOME or put a JDK on the PATH")
+
+    rng = random.Random(0)
+    v1, v2, v3 = make_versions(args.files, rng)
+    versions = {"v1": v1, "v2": v2, "v3": v3}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        classes_dir = os.path.join(temp_dir, "classes")
+        compile_java(classes_dir)
+        bundles = {
+            name: write_bundle(files, os.path.join(temp_dir, name + ".tar.gz"))
+            for name, files in versions.items()
+        }
+        full_bundle = write_bundle(
+            v2, os.path.join(temp_dir, "v2-full.tar.gz"), manifest=False
+        )
+        print(
+            "{} files, {:.0f} MB; v2 changes {} files".format(
+                len(v1),
+                sum(len(content) for content in v1.values()) / 1e6,
+                sum(1 for path in set(v1) | set(v2) if v1.get(path) != v2.get(path)),
+            )
+        )
+
+        installed = os.path.join(temp_dir, "installed")
+        extract(classes_dir, bundles["v1"], installed)
+        ok = matches(installed, v1)
+
+        target = os.path.join(temp_dir, "full")
+        output, seconds = extract(classes_dir, full_bundle, target)
+        ok &= matches(target, v2)
+        print("full:  {:.2f}s, {}".format(seconds, output))
+
+        target = os.path.join(temp_dir, "delta")
+        shutil.copytree(installed, target)
+        output, seconds = extract(classes_dir, bundles["v2"], target)
+        ok &= matches(target, v2)
+        print("delta: {:.2f}s, {}".format(seconds, output))
+        # Extracting the same version again writes nothing
+        output, seconds = extract(classes_dir, bundles["v2"], target)
+        ok &= matches(target, v2) and "wrote 0 files" in output
+        print("again: {:.2f}s, {}".format(seconds, output))
+
+        ok &= not interrupted(
+            classes_dir, bundles, versions, installed, temp_dir, args.kills, rng
+        )
+    print("OK" if ok else "MISMATCH")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Compare the import time and memory of the app's entry points with Kolibri's modules loaded
+from the bytecode bundle built by scripts/bytecode_bundle.py, against loading them from
+.pyc files as p4a lays them out.
+
+Both layouts are built from the installed Kolibri package, as p4a would: the sources are
+compiled with -OO into .pyc files beside them and then deleted, after bundling them for the
+bundle layout. Each entry point's leading imports are then run in a fresh interpreter with
+the jnius stand-in from stubs/, with the layout's files dropped from the page cache first,
+to approximate a cold start from flash, and again without, and the median time and the
+resident memory after importing are reported.
+
+Usage: python scripts/benchmarks/bytecode_imports.py [--runs N]
+"""
+import argparse
+import compileall
+import importlib.util
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from environment import app_env
+from environment import SRC_DIR
+
+sys.path.insert(0, os.path.join(SRC_DIR, "..", "scripts"))
+
+from bytecode_bundle import build_bundle  # noqa: E402
+
+ENTRY_POINTS = ["main.py", "taskworker.py", "remoteshell.py"]
+
+# Runs the imports at the top of an entry point, and reports how long they took
+IMPORT_ENTRY_POINT = """
+import ast
+import json
+import sys
+import time
+
+start = time.perf_counter()
+path = sys.argv[1]
+with open(path) as f:
+    tree = ast.parse(f.read())
+imports = []
+for node in tree.body:
+    if not isinstance(node, (ast.Import, ast.ImportFrom)):
+        break
+    imports.append(node)
+exec(compile(ast.Module(body=imports, type_ignores=[]), path, "exec"), {})
+seconds = time.perf_counter() - start
+
+with open("/proc/self/status") as f:
+    status = dict(line.split(":", 1) for line in f)
+bundled = sum(
+    1
+    for module in list(sys.modules.values())
+    if type(getattr(module, "__loader__", None)).__name__ == "BundleLoader"
+)
+print(
+    json.dumps(
+        {
+            "seconds": seconds,
+            "rss_kb": int(status["VmRSS"].split()[0]),
+            "modules": len(sys.modules),
+            "bundled": bundled,
+        }
+    )
+)
+"""
+
+
+class ImportFailed(Exception):
+    pass
+
+
+def build_layout(layout_dir, bundle):
+    source = importlib.util.find_spec("kolibri").submodule_search_locations[0]
+    shutil.copytree(
+        source,
+        os.path.join(layout_dir, "kolibri"),
+        ignore=shutil.ignore_patterns("__pycache__", "tests", "py2only", "cext"),
+    )
+    # As install-tar patches Django, to find migrations as .pyc files
+    loader = os.path.join(
+        layout_dir, "kolibri", "dist", "django", "db", "migrations", "loader.py"
+    )
+    with open(loader) as f:
+        patched = f.read().replace(
+            'if name.endswith(".py"):',
+            'if name.endswith(".py") or name.endswith(".pyc"):',
+        )
+    with open(loader, "w") as f:
+        f.write(patched)
+    if bundle:
+        build_bundle(layout_dir)
+    # As p4a compiles site-packages, and then leaves the sources out
+    compileall.compile_dir(layout_dir, quiet=2, legacy=True, optimize=2)
+    for root, _, files in os.walk(layout_dir):
+        for name in files:
+            if name.endswith(".py"):
+                os.remove(os.path.join(root, name))
+
+
+def evict(directory):
+    """
+    Drops the files under the directory from the page cache
+    """
+    for root, _, files in os.walk(directory):
+        for name in files:
+            fd = os.open(os.path.join(root, name), os.O_RDONLY)
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            finally:
+                os.close(fd)
+
+
+def import_entry_point(entry_point, layout_dir, files_dir):
+    env = app_env(files_dir)
+    env["PYTHONPATH"] = os.pathsep.join([env["PYTHONPATH"], layout_dir])
+    # As p4a's launcher sets it
+    env["PYTHONOPTIMIZE"] = "2"
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_ENTRY_POINT, os.path.join(SRC_DIR, entry_point)],
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    if output.returncode:
+        raise ImportFailed(output.stderr.strip().splitlines()[-1])
+    return json.loads(output.stdout.splitlines()[-1])
+
+
+def measure(entry_point, layout_dir, files_dir, runs, cold):
+    results = []
+    for _ in range(runs):
+        if cold:
+            evict(layout_dir)
+        results.append(import_entry_point(entry_point, layout_dir, files_dir))
+    return {
+        "seconds": statistics.median(result["seconds"] for result in results),
+        "rss_kb": statistics.median(result["rss_kb"] for result in results),
+        "modules": results[-1]["modules"],
+        "bundled": results[-1]["bundled"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        layouts = {}
+        for name, bundle in (("pyc files", False), ("bundle", True)):
+            layouts[name] = os.path.join(temp_dir, name.replace(" ", "-"))
+            build_layout(layouts[name], bundle)
+
+        print(
+            "{:<15} {:<10} {:>8} {:>8} {:>8} {:>8} {:>8}".format(
+                "", "", "cold ms", "warm ms", "RSS MB", "modules", "bundled"
+            )
+        )
+        for entry_point in ENTRY_POINTS:
+            for name, layout_dir in layouts.items():
+                files_dir = os.path.join(temp_dir, "files", entry_point, name)
+                # Boot once, so that we measure a normal start rather than the first one
+                try:
+                    import_entry_point(entry_point, layout_dir, files_dir)
+                except ImportFailed as e:
+                    print("{:<15} {:<10} failed: {}".format(entry_point, name, e))
+                    continue
+                cold = measure(entry_point, layout_dir, files_dir, args.runs, True)
+                warm = measure(entry_point, layout_dir, files_dir, args.runs, False)
+                print(
+                    "{:<15} {:<10} {:>8.0f} {:>8.0f} {:>8.1f} {:>8} {:>8}".format(
+                        entry_point,
+                        name,
+                        cold["seconds"] * 1000,
+                        warm["seconds"] * 1000,
+                        cold["rss_kb"] / 1024,
+                        cold["modules"],
+                        cold["bundled"],
+                    )
+                )
+
+
+if __name__ == "__main__":
+    main()
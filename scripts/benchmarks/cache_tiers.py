@@ -0,0 +1,123 @@
+"""
+Compare Kolibri's default local memory cache, bounded only by its number of entries,
+against the tiered cache in src/android_cache.py, under a synthetic request mix.
+
+Requests look up keys with a skewed popularity, setting the value on a miss, with mostly
+small values and some large ones, like cached API responses. Reports the hit rate, hit
+latency and the peak memory held by the cache, measured with tracemalloc.
+
+Usage: python scripts/benchmarks/cache_tiers.py [--requests N] [--memory-kb N]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARK_DIR, "..", "..", "src"))
+
+import kolibri  # noqa: E402,F401 (puts Kolibri's bundled django on the path)
+from django.conf import settings  # noqa: E402
+
+settings.configure()
+
+from android_cache import TieredCache  # noqa: E402
+from django.core.cache.backends.locmem import LocMemCache  # noqa: E402
+
+KEYS = 5000
+
+
+def value_for(key):
+    rng = random.Random(key)
+    size = rng.random()
+    if size < 0.8:
+        return {"id": key, "title": "x" * 400}
+    if size < 0.95:
+        return [{"id": i, "title": "y" * 90} for i in range(100)]
+    return "z" * 200000
+
+
+def run(name, cache, requests):
+    rng = random.Random(0)
+    # Zipf-like popularity
+    keys = rng.choices(
+        ["key-{}".format(i) for i in range(KEYS)],
+        weights=[1 / (rank + 1) ** 0.9 for rank in range(KEYS)],
+        k=requests,
+    )
+    hits = 0
+    hit_latencies = []
+    tracemalloc.start()
+    start_memory = tracemalloc.get_traced_memory()[0]
+    peak = 0
+    start = time.perf_counter()
+    for i, key in enumerate(keys):
+        lookup = time.perf_counter()
+        value = cache.get(key)
+        if value is not None:
+            hit_latencies.append(time.perf_counter() - lookup)
+            hits += 1
+        else:
+            cache.set(key, value_for(key))
+        if i % 100 == 0:
+            peak = max(peak, tracemalloc.get_traced_memory()[0] - start_memory)
+    elapsed = time.perf_counter() - start
+    tracemalloc.stop()
+
+    hit_latencies.sort()
+    print(
+        "{:<10} {:>8.1%} {:>10.1f} {:>10.1f} {:>12.1f} {:>10.2f}".format(
+            name,
+            hits / requests,
+            hit_latencies[len(hit_latencies) // 2] * 1e6,
+            hit_latencies[int(len(hit_latencies) * 0.99)] * 1e6,
+            peak / 1024 / 1024,
+            elapsed,
+        )
+    )
+    return cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=50000)
+    parser.add_argument("--memory-kb", type=int, default=8192)
+    args = parser.parse_args()
+
+    print(
+        "{} requests over {} keys, {} KB memory budget".format(
+            args.requests, KEYS, args.memory_kb
+        )
+    )
+    print(
+        "{:<10} {:>8} {:>10} {:>10} {:>12} {:>10}".format(
+            "", "hits", "p50 us", "p99 us", "peak MB", "seconds"
+        )
+    )
+    run(
+        "locmem",
+        LocMemCache("benchmark", {"OPTIONS": {"MAX_ENTRIES": 1000}}),
+        args.requests,
+    )
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = run(
+            "tiered",
+            TieredCache(temp_dir, {"OPTIONS": {"MEMORY_BYTES": args.memory_kb * 1024}}),
+            args.requests,
+        )
+        stats = cache.stats()
+        print(
+            "tiered: {} memory hits, {} disk hits, {} misses, {} evictions".format(
+                stats.get("memory_hits", 0),
+                stats.get("disk_hits", 0),
+                stats.get("misses", 0),
+                stats.get("memory_evictions", 0),
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
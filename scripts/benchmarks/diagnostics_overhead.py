@@ -0,0 +1,158 @@
+"""
+Measure how much each remote shell diagnostics tool slows a busy process down while it runs.
+
+A process is initialized against the jnius stand-in in stubs/ and serves the tools, as the
+main process does, while server threads run a loop of database queries and some Python work.
+Each tool is called over its socket as the shell would, and the loops the threads complete
+per second while it runs are compared with those just before.
+
+Each comparison is repeated, and the median shown, as the rate varies from one window to
+the next.
+
+Usage: python scripts/benchmarks/diagnostics_overhead.py [--seconds N] [--threads N] [--runs N]
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from environment import app_env
+from environment import SRC_DIR
+
+sys.path.insert(0, SRC_DIR)
+
+import diagnostics  # noqa: E402
+
+# Serves the tools while threads loop, with one more tool that returns the loops done
+WORKLOAD = """
+import os
+import sys
+import threading
+
+import initialization
+from kolibri.main import initialize
+
+initialize()
+
+import diagnostics
+from kolibri.core.auth.models import FacilityUser
+
+loops = [0] * int(sys.argv[1])
+
+
+def work(index):
+    while True:
+        FacilityUser.objects.filter(username="nobody").exists()
+        sorted(str(i) for i in range(500))
+        loops[index] += 1
+
+
+for index in range(len(loops)):
+    threading.Thread(
+        target=work, args=(index,), name="CP Server Thread-{}".format(index), daemon=True
+    ).start()
+diagnostics.TOOLS["loops"] = lambda: sum(loops)
+diagnostics.start_agent(os.environ["KOLIBRI_HOME"])
+sys.stdout.write("ready\\n")
+sys.stdout.flush()
+threading.Event().wait()
+"""
+
+
+def rate(pid, window, tool=None, **kwargs):
+    """
+    Returns the loops per second over `window` seconds, while the tool runs if one is given
+    """
+    start = diagnostics.call(pid, "loops")
+    started = time.perf_counter()
+    if tool:
+        diagnostics.call(pid, tool, **kwargs)
+    remaining = window - (time.perf_counter() - started)
+    if remaining > 0:
+        time.sleep(remaining)
+    return (diagnostics.call(pid, "loops") - start) / (time.perf_counter() - started)
+
+
+def compare(pid, seconds, tool, kwargs):
+    """
+    Returns the loops per second while the tool runs, and the change from just before
+    """
+    baseline = rate(pid, seconds)
+    during = rate(pid, seconds, tool, **kwargs)
+    return during, (during - baseline) / baseline * 100
+
+
+def compare_tracing(pid, seconds):
+    """
+    Returns the loops per second while allocations are traced, which costs while tracing
+    is on rather than while a tool runs, and the change from just before
+    """
+    baseline = rate(pid, seconds)
+    diagnostics.call(pid, "memory_snapshot")
+    during = rate(pid, seconds)
+    diagnostics.call(pid, "memory_stop")
+    return during, (during - baseline) / baseline * 100
+
+
+def _report(label, results):
+    print(
+        "{:<20} {:>10.0f} {:>+9.1f}%".format(
+            label,
+            statistics.median(during for during, _ in results),
+            statistics.median(change for _, change in results),
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=int, default=5)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+    seconds = args.seconds
+    runs = args.runs
+    tools = [
+        ("sample_stacks 10ms", "sample_stacks", {"seconds": seconds}),
+        (
+            "sample_stacks 5ms",
+            "sample_stacks",
+            {"seconds": seconds, "interval": diagnostics.MIN_INTERVAL},
+        ),
+        ("thread_stacks", "thread_stacks", {}),
+        ("db_summary", "db_summary", {"seconds": seconds}),
+        ("gc_stats", "gc_stats", {"seconds": seconds}),
+        ("gc_stats types", "gc_stats", {"types": 20}),
+    ]
+    with tempfile.TemporaryDirectory() as files_dir, tempfile.TemporaryFile() as output:
+        process = subprocess.Popen(
+            [sys.executable, "-c", WORKLOAD, str(args.threads)],
+            env=app_env(files_dir),
+            cwd=files_dir,
+            stdout=subprocess.PIPE,
+            stderr=output,
+            universal_newlines=True,
+        )
+        try:
+            for line in process.stdout:
+                if line.strip() == "ready":
+                    break
+            else:
+                raise SystemExit("The workload did not start")
+            pid = process.pid
+            rate(pid, 1)
+            print("{:<20} {:>10} {:>10}".format("", "loops/s", "change"))
+            for label, tool, kwargs in tools:
+                _report(
+                    label, [compare(pid, seconds, tool, kwargs) for _ in range(runs)]
+                )
+            _report("tracemalloc", [compare_tracing(pid, seconds) for _ in range(runs)])
+        finally:
+            process.kill()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Check that the set of modules eagerly imported by our startup modules does not grow.
+
+Every process imports these before doing anything else, so anything they import at module
+load is paid by the main process, every task worker and the remote shell. Expensive modules
+should instead be imported on first use.
+
+Each module is imported in a fresh interpreter with the jnius stand-in from stubs/, after a
+first boot has populated any caches, and the non-standard library packages it pulls in are
+compared against eager_imports.json.
+Exits with a non-zero status if any new packages are imported.
+
+Usage: python scripts/benchmarks/eager_imports.py [--update]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from environment import app_env
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, "eager_imports.json")
+
+MODULES = [
+    "android_utils",
+    "monkey_patch_zeroconf",
+    "initialization",
+]
+
+# Kolibri is imported first by every process, and makes its bundled dependencies importable
+LIST_IMPORTS = """
+import json
+import sys
+import sysconfig
+
+import kolibri
+
+before = set(sys.modules)
+__import__(sys.argv[1])
+stdlib = (sysconfig.get_paths()["stdlib"], sysconfig.get_paths()["platstdlib"])
+
+
+def is_stdlib(path):
+    return path.startswith(stdlib) and "-packages" not in path
+
+
+packages = set()
+for name in set(sys.modules) - before:
+    path = getattr(sys.modules[name], "__file__", None)
+    if path and not is_stdlib(path):
+        packages.add(name.split(".")[0])
+# The module may print, so the result goes on the last line
+print(json.dumps(sorted(packages)))
+"""
+
+
+def eager_imports(module, files_dir):
+    output = subprocess.run(
+        [sys.executable, "-c", LIST_IMPORTS, module],
+        env=app_env(files_dir),
+        check=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        universal_newlines=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--update", action="store_true", help="Record the current imports as allowed"
+    )
+    args = parser.parse_args()
+
+    try:
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        baseline = {}
+
+    failed = False
+    current = {}
+    with tempfile.TemporaryDirectory() as files_dir:
+        # Boot once, so that we measure a normal start rather than the first one
+        eager_imports("initialization", files_dir)
+        for module in MODULES:
+            current[module] = eager_imports(module, files_dir)
+            added = sorted(set(current[module]) - set(baseline.get(module, [])))
+            removed = sorted(set(baseline.get(module, [])) - set(current[module]))
+            if added and not args.update:
+                failed = True
+                print("{} now eagerly imports: {}".format(module, ", ".join(added)))
+            if removed:
+                print("{} no longer imports: {}".format(module, ", ".join(removed)))
+
+    if args.update:
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(current, f, indent=4, sort_keys=True)
+            f.write("\n")
+    elif failed:
+        print("Import these on first use, or run with --update if this is intended")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
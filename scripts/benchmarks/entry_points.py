@@ -0,0 +1,340 @@
+"""
+Measure each of the app's entry points end to end on Linux, against the jnius stand-in in
+stubs/, and record the results so that they can be compared across commits.
+
+Each entry point is run in its own process, as Android would start it, after a first boot
+that provisions the home folder. The phases come from the boot trace each process writes,
+peak memory from the kernel once it exits, and JNI calls from the jnius stand-in:
+
+- import: ms from process start until the entry point's imports are done
+- ready: ms from process start until it is useful: `loadUrl` for main.py, after `SERVING`,
+  `listening` for remoteshell.py and the end of its job for a cold taskworker.py
+- job: ms a warm task worker takes per no-op job, handed to it over its socket
+- peak RSS and the number of JNI calls, with the calls by class and member in the results
+
+Each run appends one JSON line to the results file, with the commit it was run on, and the
+median of each measure per entry point. `compare` prints the change between two runs.
+
+Usage:
+    python scripts/benchmarks/entry_points.py run [--runs N] [--results FILE]
+    python scripts/benchmarks/entry_points.py compare [--results FILE] [BASE] [HEAD]
+"""
+import argparse
+import datetime
+import glob
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from environment import app_env
+from environment import BENCHMARK_DIR
+from environment import SRC_DIR
+from taskworker_latency import COLD_WORKER
+from taskworker_latency import run_warm
+
+RESULTS = os.path.join(BENCHMARK_DIR, "results", "entry_points.jsonl")
+
+# How long an entry point may take to get ready, before it is considered hung
+TIMEOUT = 300
+
+# Runs an entry point until it records the phase that shows it is ready, then writes the
+# JNI calls it made and exits, rather than relying on it shutting down cleanly
+RUNNER = """
+import os
+import runpy
+import sys
+
+import boot_trace
+import jnius
+
+ready, calls_path = sys.argv[1:3]
+record = boot_trace.record
+
+
+def record_until_ready(phase, start_ms, duration_ms):
+    record(phase, start_ms, duration_ms)
+    if phase == ready:
+        jnius.write_calls(calls_path)
+        os._exit(0)
+
+
+boot_trace.record = record_until_ready
+sys.argv = sys.argv[3:]
+if sys.argv[0] == "-c":
+    exec(compile(sys.argv.pop(1), "<string>", "exec"), {"__name__": "__main__"})
+else:
+    sys.path[0] = os.path.dirname(sys.argv[0])
+    runpy.run_path(sys.argv[0], run_name="__main__")
+"""
+
+# Imports a module after initialization, as the entry points do
+IMPORT_MODULE = """
+import initialization
+import {}
+import boot_trace
+boot_trace.mark("imported")
+"""
+
+# The command for each entry point, its process role and any more environment it needs,
+# and the phases that end its imports and that show it is ready
+ENTRY_POINTS = {
+    "initialization.py": {
+        "command": ["-c", IMPORT_MODULE.format("boot_trace")],
+        "env": {},
+        "imported": "imported",
+        "ready": "imported",
+    },
+    "android_app_plugin": {
+        "command": ["-c", IMPORT_MODULE.format("android_app_plugin.kolibri_plugin")],
+        "env": {},
+        "imported": "imported",
+        "ready": "imported",
+    },
+    "main.py": {
+        "command": [os.path.join(SRC_DIR, "main.py")],
+        "env": {},
+        "imported": "imports",
+        "ready": "loadUrl",
+    },
+    "taskworker.py": {
+        "command": ["-c", COLD_WORKER, "request-0,job-0,0,1"],
+        "role": "taskworker",
+        "env": {"KOLIBRI_TASKWORKER_MAX_JOBS": "0"},
+        "imported": "initialize",
+        "ready": "job",
+    },
+    "remoteshell.py": {
+        "command": [os.path.join(SRC_DIR, "remoteshell.py")],
+        "role": "remoteshell",
+        "env": {},
+        # Kolibri is initialized once listening, so its imports are done by then
+        "imported": "listening",
+        "ready": "listening",
+    },
+}
+
+
+class EntryPointFailed(Exception):
+    pass
+
+
+def read_trace(path):
+    """
+    Returns the phases of a boot trace, as a dict of name to start and end ms
+    """
+    phases = {}
+    with open(path) as f:
+        for line in f:
+            if line.startswith("#"):
+                continue
+            name, start, duration, _ = line.rstrip("\n").split("\t")
+            phases.setdefault(name, (float(start), float(start) + float(duration)))
+    return phases
+
+
+def _wait(process):
+    """
+    Waits for the process to exit, killing it if it hangs, and returns its resource usage
+    """
+    deadline = time.monotonic() + TIMEOUT
+    while time.monotonic() < deadline:
+        pid, _, usage = os.wait4(process.pid, os.WNOHANG)
+        if pid:
+            return usage
+        time.sleep(0.01)
+    process.kill()
+    os.wait4(process.pid, 0)
+    raise EntryPointFailed("not ready after {}s".format(TIMEOUT))
+
+
+def run_entry_point(name, files_dir):
+    entry_point = ENTRY_POINTS[name]
+    env = app_env(files_dir, role=entry_point.get("role", "main"))
+    env.update(entry_point["env"])
+    calls_path = os.path.join(files_dir, "jni_calls.json")
+    command = [sys.executable, "-c", RUNNER, entry_point["ready"], calls_path]
+    with tempfile.TemporaryFile("w+") as output:
+        process = subprocess.Popen(
+            command + entry_point["command"],
+            env=env,
+            cwd=files_dir,
+            stdout=output,
+            stderr=subprocess.STDOUT,
+            universal_newlines=True,
+        )
+        usage = _wait(process)
+        output.seek(0)
+        lines = output.read().strip().splitlines()
+
+    if not os.path.exists(calls_path):
+        raise EntryPointFailed(lines[-1] if lines else "exited before it was ready")
+    with open(calls_path) as f:
+        calls = json.load(f)
+    os.remove(calls_path)
+    trace_path = glob.glob(
+        os.path.join(
+            files_dir, "KOLIBRI_DATA", "boot_traces", "*-{}.tsv".format(process.pid)
+        )
+    )[0]
+    phases = read_trace(trace_path)
+    return {
+        "import_ms": phases[entry_point["imported"]][0],
+        "ready_ms": phases[entry_point["ready"]][1],
+        # ru_maxrss is in kB on Linux
+        "peak_rss_kb": usage.ru_maxrss,
+        "jni_calls": sum(calls.values()),
+        "calls": calls,
+    }
+
+
+def _median(results, key):
+    return statistics.median(result[key] for result in results)
+
+
+def measure(name, files_dir, runs):
+    # Boot once, so that we measure a normal start rather than the first one
+    run_entry_point(name, files_dir)
+    results = [run_entry_point(name, files_dir) for _ in range(runs)]
+    measures = {
+        key: _median(results, key)
+        for key in ("import_ms", "ready_ms", "peak_rss_kb", "jni_calls")
+    }
+    measures["calls"] = results[-1]["calls"]
+    if name == "taskworker.py":
+        env = app_env(files_dir, role="taskworker")
+        env["KOLIBRI_TASKWORKER_MAX_JOBS"] = "0"
+        # The first warm job includes booting the interpreter, so is left out
+        timings = run_warm(runs + 1, env)[1:]
+        measures["job_ms"] = statistics.median(timings) * 1000
+    return measures
+
+
+def git_commit():
+    def git(*args):
+        return subprocess.check_output(
+            ["git"] + list(args), cwd=BENCHMARK_DIR, universal_newlines=True
+        ).strip()
+
+    try:
+        commit = git("rev-parse", "--short", "HEAD")
+        dirty = bool(git("status", "--porcelain", "--untracked-files=no"))
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit + ("-dirty" if dirty else "")
+
+
+def _print_row(name, measures):
+    print(
+        "{:<20} {:>9.0f} {:>9.0f} {:>9} {:>9.1f} {:>9}".format(
+            name,
+            measures["import_ms"],
+            measures["ready_ms"],
+            "{:.1f}".format(measures["job_ms"]) if "job_ms" in measures else "",
+            measures["peak_rss_kb"] / 1024,
+            int(measures["jni_calls"]),
+        )
+    )
+
+
+def run(args):
+    record = {
+        "commit": git_commit(),
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "entry_points": {},
+    }
+    print(
+        "{:<20} {:>9} {:>9} {:>9} {:>9} {:>9}".format(
+            "", "import ms", "ready ms", "job ms", "peak MB", "JNI calls"
+        )
+    )
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name in args.entry_points or ENTRY_POINTS:
+            files_dir = os.path.join(temp_dir, name)
+            try:
+                measures = measure(name, files_dir, args.runs)
+            except EntryPointFailed as e:
+                print("{:<20} failed: {}".format(name, e))
+                record["entry_points"][name] = {"failed": str(e)}
+                continue
+            _print_row(name, measures)
+            record["entry_points"][name] = measures
+
+    os.makedirs(os.path.dirname(args.results), exist_ok=True)
+    with open(args.results, "a") as f:
+        f.write(json.dumps(record, sort_keys=True) + "\n")
+    print("Results for {} appended to {}".format(record["commit"], args.results))
+
+
+def _find_record(records, commit):
+    for record in reversed(records):
+        if record["commit"].startswith(commit):
+            return record
+    raise SystemExit("No results for {}".format(commit))
+
+
+def _change(base, head):
+    if base is None or head is None:
+        return "{:>22}".format("")
+    percent = (head - base) / base * 100 if base else 0
+    return "{:>9.1f} {:>9.1f} {:>+3.0f}%".format(base, head, percent)
+
+
+def compare(args):
+    with open(args.results) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    if len(records) < 2 and not (args.base and args.head):
+        raise SystemExit("Need two runs to compare")
+    base = _find_record(records, args.base) if args.base else records[-2]
+    head = _find_record(records, args.head) if args.head else records[-1]
+    print("{} -> {}".format(base["commit"], head["commit"]))
+    for name in head["entry_points"]:
+        base_measures = base["entry_points"].get(name, {})
+        head_measures = head["entry_points"][name]
+        if "failed" in base_measures or "failed" in head_measures:
+            print("{:<20} failed in one of the runs".format(name))
+            continue
+        for key in ("import_ms", "ready_ms", "job_ms", "peak_rss_kb", "jni_calls"):
+            if key in head_measures or key in base_measures:
+                print(
+                    "{:<20} {:<12} {}".format(
+                        name,
+                        key,
+                        _change(base_measures.get(key), head_measures.get(key)),
+                    )
+                )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run_parser = subparsers.add_parser("run", help="measure and record the results")
+    run_parser.add_argument("--runs", type=int, default=5)
+    run_parser.add_argument("--results", default=RESULTS)
+    run_parser.add_argument(
+        "entry_points", nargs="*", metavar="ENTRY_POINT", help="all by default"
+    )
+    run_parser.set_defaults(func=run)
+    compare_parser = subparsers.add_parser(
+        "compare", help="compare two recorded runs, the last two by default"
+    )
+    compare_parser.add_argument("--results", default=RESULTS)
+    compare_parser.add_argument("base", nargs="?")
+    compare_parser.add_argument("head", nargs="?")
+    compare_parser.set_defaults(func=compare)
+    args = parser.parse_args()
+    for name in getattr(args, "entry_points", []):
+        if name not in ENTRY_POINTS:
+            parser.error("Unknown entry point {}".format(name))
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
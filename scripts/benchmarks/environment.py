@@ -0,0 +1,39 @@
+"""
+The process environment that the app's entry points see on a device, for running them on Linux.
+"""
+import os
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(BENCHMARK_DIR, "..", "..", "src")
+
+
+def app_env(files_dir, version_code="1", role="main"):
+    """
+    Returns environment variables for running entry points against the jnius stand-in,
+    with `files_dir` standing in for the app's files directories, as set for a process
+    of the role, "main", "remoteshell" or "taskworker".
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [os.path.join(BENCHMARK_DIR, "stubs"), SRC_DIR, env.get("PYTHONPATH", "")]
+    )
+    env["BENCHMARK_FILES_DIR"] = files_dir
+
+    # As set up by the Java side before python starts
+    app_root = os.path.join(files_dir, "app")
+    os.makedirs(app_root, exist_ok=True)
+    with open(os.path.join(app_root, "private.version"), "w") as f:
+        f.write(version_code)
+    env["KOLIBRI_ANDROID_FILES_DIR"] = files_dir
+    env["ANDROID_ARGUMENT"] = app_root
+    # PythonWorker sets this to the app root, where PythonActivity and the services set it
+    # to the files directory
+    env["ANDROID_PRIVATE"] = app_root if role == "taskworker" else files_dir
+    if role == "remoteshell":
+        env["PYTHON_SERVICE_ARGUMENT"] = ""
+    elif role == "taskworker":
+        env["PYTHON_WORKER_ARGUMENT"] = ""
+    env["KOLIBRI_ANDROID_TIMEZONE"] = "UTC"
+    env["KOLIBRI_ANDROID_LOCALE"] = "en"
+    env["KOLIBRI_ANDROID_MEMORY_CLASS"] = "256"
+    return env
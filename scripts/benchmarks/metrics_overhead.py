@@ -0,0 +1,117 @@
+"""
+Measure what the metrics registry costs, and check its endpoint and dumps.
+
+Runs in an initialized Kolibri against the jnius stand-in in stubs/, with a super admin:
+
+- the time taken by each call that records a metric
+- the time Django takes to serve a small API request, with and without the request metrics
+  middleware
+- the endpoint's answer to an anonymous user and to the super admin
+- the size of a dump of the metrics recorded
+
+Usage: python scripts/benchmarks/metrics_overhead.py [--requests N]
+"""
+import argparse
+import subprocess
+import sys
+import tempfile
+
+from environment import app_env
+
+CHECK = """
+import os
+import sys
+import time
+import timeit
+
+import initialization
+from kolibri.main import enable_plugin
+from kolibri.main import initialize
+
+enable_plugin("android_app_plugin")
+initialize()
+
+from android_app_plugin.metrics import registry
+from android_app_plugin.metrics import Sampler
+from django.conf import settings
+from django.test import Client
+from django.test import override_settings
+from django.urls import reverse
+from kolibri.core.auth.models import Facility
+from kolibri.core.auth.models import FacilityUser
+
+requests = int(sys.argv[1])
+calls = 200000
+
+for label, call in (
+    ("counter.increment", lambda: registry.counter("check.counter").increment()),
+    ("histogram.observe", lambda: registry.histogram("check.histogram").observe(42)),
+    ("gauge.set", lambda: registry.gauge("check.gauge").set(42)),
+):
+    seconds = min(timeit.repeat(call, number=calls, repeat=3))
+    print("{:<44} {:>8.2f} us".format(label, seconds / calls * 1e6))
+
+client = Client()
+path = "/api/public/info/"
+middleware = "android_app_plugin.middleware.RequestMetricsMiddleware"
+without = [name for name in settings.MIDDLEWARE if name != middleware]
+
+
+def per_request():
+    client.get(path)
+    start = time.perf_counter()
+    for _ in range(requests):
+        client.get(path)
+    return (time.perf_counter() - start) / requests * 1000
+
+
+timings = {"with": [], "without": []}
+for _ in range(3):
+    timings["with"].append(per_request())
+    with override_settings(MIDDLEWARE=without):
+        timings["without"].append(per_request())
+for label, values in sorted(timings.items()):
+    print("{:<44} {:>8.3f} ms".format(path + " " + label, min(values)))
+
+url = reverse("kolibri:android_app_plugin:metrics")
+print("{:<44} {:>8}".format("anonymous " + url, client.get(url).status_code))
+user = FacilityUser.objects.create_superuser(
+    "admin", "password", facility=Facility.objects.create(name="Metrics")
+)
+client.force_login(user)
+response = client.get(url)
+print("{:<44} {:>8}".format("superuser " + url, response.status_code))
+metrics = response.json()["process"]["metrics"]
+print("request metrics: " + ", ".join(sorted(name for name in metrics if "request" in name)))
+
+sampler = Sampler(registry, os.environ["KOLIBRI_HOME"], 900)
+sampler.sample()
+sampler.dump(final=True)
+dump_dir = os.path.join(os.environ["KOLIBRI_HOME"], "metrics")
+for name in os.listdir(dump_dir):
+    print("{:<44} {:>8} bytes".format(name, os.path.getsize(os.path.join(dump_dir, name))))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as files_dir, tempfile.TemporaryFile() as output:
+        process = subprocess.run(
+            [sys.executable, "-c", CHECK, str(args.requests)],
+            env=app_env(files_dir),
+            cwd=files_dir,
+            stdout=subprocess.PIPE,
+            stderr=output,
+            universal_newlines=True,
+        )
+        print(process.stdout, end="")
+        if process.returncode:
+            output.seek(0)
+            sys.stderr.write(output.read().decode()[-3000:])
+            sys.exit(process.returncode)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+Compare Kolibri's zeroconf discovery against src/peer_discovery.py, for a device launched in
+a classroom of peers on congested Wi-Fi, on two days in a row.
+
+Zeroconf is replaced by a simulation: each peer answers our browse query after a random
+delay, zeroconf reports an update along with each new peer, and again whenever the peer's
+records are resent in answer to other devices, and each service lookup is answered from
+zeroconf's cache unless the network dropped some records, in which case it sends multicast
+queries until it gets an answer. Time is simulated, and the tasks that add network locations
+are recorded rather than run.
+
+Reports how soon peers are listed as network locations, and the service lookups and
+multicast queries made in the first minute.
+
+Usage: python scripts/benchmarks/peer_locations.py [--peers N] [--congestion P]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [
+    os.path.join(BENCHMARK_DIR, "stubs"),
+    os.path.join(BENCHMARK_DIR, "..", "..", "src"),
+]
+os.environ["KOLIBRI_HOME"] = tempfile.mkdtemp(prefix="kolibri-home-")
+os.environ["DJANGO_SETTINGS_MODULE"] = "kolibri.deployment.default.settings.base"
+
+import kolibri  # noqa: E402,F401 (puts Kolibri's bundled django on the path)
+import django  # noqa: E402
+
+django.setup()
+
+import monkey_patch_zeroconf  # noqa: E402
+import peer_discovery  # noqa: E402
+from kolibri.core.discovery.utils.network import search  # noqa: E402
+from kolibri.core.discovery.utils.network.broadcast import (  # noqa: E402
+    EVENT_REGISTER_INSTANCE,
+)
+from kolibri.core.discovery.utils.network.broadcast import (  # noqa: E402
+    KolibriBroadcast,
+)
+from kolibri.core.discovery.utils.network.broadcast import (  # noqa: E402
+    KolibriInstance,
+)
+
+ADDRESS = "192.168.1.20"
+DAY = 24 * 60 * 60
+FIRST_MINUTE = 60
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+        self.day = 0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.day * DAY + self.now
+
+
+clock = Clock()
+
+
+class Task:
+    """
+    Records the jobs enqueued, in place of a Kolibri task
+    """
+
+    def __init__(self):
+        self.enqueued = []
+
+    def enqueue(self, job_id=None, args=(), **kwargs):
+        self.enqueued.append((clock.now, args))
+
+
+class FakeZeroconf:
+    def __init__(self, service_infos, congestion, rng):
+        self.service_infos = service_infos
+        self.congestion = congestion
+        self.rng = rng
+        self.lookups = 0
+        self.queries = 0
+
+    def get_service_info(self, type_, name, timeout=3000):
+        self.lookups += 1
+        info = self.service_infos.get(name)
+        if self.rng.random() >= self.congestion:
+            return info
+        # Some records were dropped, so query at intervals doubling from 200ms
+        elapsed = 0
+        interval = 0.2
+        while elapsed < timeout / 1000:
+            self.queries += 1
+            if self.rng.random() < 0.5:
+                clock.now += elapsed
+                return info
+            elapsed += interval
+            interval *= 2
+        clock.now += timeout / 1000
+        return None
+
+
+def make_peers(count, first=0):
+    peers = []
+    for i in range(first, first + count):
+        peer_id = "{:032x}".format(i + 1)
+        peers.append(
+            KolibriInstance(
+                peer_id,
+                ip="192.168.1.{}".format(100 + i),
+                port=8080,
+                device_info={
+                    "instance_id": peer_id,
+                    "device_name": "Tablet {}".format(i),
+                },
+            )
+        )
+    return peers
+
+
+def launch(name, broadcast_cls, listener_cls, peers, congestion, seed):
+    clock.now = 0.0
+    rng = random.Random(seed)
+    add_task = Task()
+    search.add_dynamic_network_location = add_task
+    search.reset_connection_states = Task()
+    search.remove_dynamic_network_location = Task()
+    search.dispatch_broadcast_hooks = Task()
+
+    service_infos = {}
+    for peer in peers:
+        info = peer.to_service_info()
+        # Parse the properties back from the TXT record, as when received from the network
+        info._set_text(info.text)
+        service_infos[info.name] = info
+    broadcast = broadcast_cls(
+        KolibriInstance(
+            "f" * 32, ip=ADDRESS, port=8080, device_info={"instance_id": "f" * 32}
+        )
+    )
+    zeroconf = FakeZeroconf(service_infos, congestion, random.Random(seed + 1))
+    broadcast.zeroconf = zeroconf
+    if isinstance(broadcast, peer_discovery.PeerDiscoveryBroadcast):
+        broadcast.started_at = clock.monotonic()
+    broadcast.add_listener(listener_cls)
+    broadcast.events.publish(EVENT_REGISTER_INSTANCE, broadcast.instance)
+
+    events = []
+    for service_name in sorted(service_infos):
+        arrival = rng.uniform(0.5, 20)
+        events.append((arrival, "add_service", service_name))
+        events.append((arrival, "update_service", service_name))
+        # Records resent in answer to other devices' queries
+        resent = arrival
+        while resent < FIRST_MINUTE:
+            resent += rng.expovariate(1 / 8)
+            events.append((resent, "update_service", service_name))
+    for at, method, service_name in sorted(events):
+        if at >= FIRST_MINUTE:
+            break
+        clock.now = max(clock.now, at)
+        getattr(broadcast, method)(service_name)
+
+    listed = {}
+    for at, (_, instance) in add_task.enqueued:
+        listed.setdefault(instance["id"], at)
+    times = sorted(listed.values())
+    present = {peer.id for peer in peers}
+    print(
+        "{:<22} {:>6} {:>10} {:>8.1f} {:>8.1f} {:>8} {:>8}".format(
+            name,
+            len(set(listed) & present),
+            sum(1 for at in times if at < 5),
+            times[len(times) // 2] if times else 0,
+            max(listed[peer_id] for peer_id in present if peer_id in listed),
+            zeroconf.lookups,
+            zeroconf.queries,
+        )
+    )
+    return broadcast
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--peers", type=int, default=20)
+    parser.add_argument("--congestion", type=float, default=0.3)
+    args = parser.parse_args()
+
+    monkey_patch_zeroconf.address_cache._fetch = lambda: [ADDRESS]
+    peer_discovery.time = clock
+    cache_dir = tempfile.mkdtemp(prefix="peer-cache-")
+    peer_discovery.peer_cache = peer_discovery.PeerCache(
+        os.path.join(cache_dir, peer_discovery.PEER_CACHE_FILENAME), clock=clock.time
+    )
+
+    yesterday = make_peers(args.peers)
+    # Two of yesterday's peers are gone, and two new ones have joined
+    today = yesterday[2:] + make_peers(2, first=args.peers)
+
+    print(
+        "{} peers, {:.0%} of lookups missing records, first minute".format(
+            args.peers, args.congestion
+        )
+    )
+    print(
+        "{:<22} {:>6} {:>10} {:>8} {:>8} {:>8} {:>8}".format(
+            "", "listed", "within 5s", "p50 s", "last s", "lookups", "queries"
+        )
+    )
+    for day, peers in ((0, yesterday), (1, today)):
+        clock.day = day
+        launch(
+            "kolibri, day {}".format(day + 1),
+            KolibriBroadcast,
+            search.NetworkLocationListener,
+            peers,
+            args.congestion,
+            seed=day,
+        )
+        broadcast = launch(
+            "peer cache, day {}".format(day + 1),
+            peer_discovery.PeerDiscoveryBroadcast,
+            peer_discovery.CachingNetworkLocationListener,
+            peers,
+            args.congestion,
+            seed=day,
+        )
+        print(
+            "{:<22} {} served from cache, {} lookups reused".format(
+                "",
+                broadcast.counters["peers_served"],
+                broadcast.counters["lookups_reused"],
+            )
+        )
+
+    network = peer_discovery.network_key([ADDRESS])
+    cached = len(peer_discovery.peer_cache.peers(network))
+    # Past the expiry of the peers last seen on day 1, but not of those seen on day 2
+    clock.day = peer_discovery.PEER_TTL / DAY + 0.5
+    print(
+        "{} peers cached after day 2, {} once the peers missing on day 2 expire".format(
+            cached, len(peer_discovery.peer_cache.peers(network))
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
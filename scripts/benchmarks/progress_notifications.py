@@ -0,0 +1,151 @@
+"""
+Compare forwarding every job update to the Java side, as StorageHook.update used to, against
+coalescing them, for a job reporting progress as often as a large channel import does.
+
+Reports the number of JNI calls made and the rate of progress updates the job can sustain.
+jnius is replaced by the stand-in in stubs/, with each notification update taking
+--jni-cost milliseconds, to stand in for the JNI call and the notification update.
+
+Usage: python scripts/benchmarks/progress_notifications.py [--updates N] [--jni-cost MS]
+"""
+import argparse
+import os
+import sys
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [
+    os.path.join(BENCHMARK_DIR, "stubs"),
+    os.path.join(BENCHMARK_DIR, "..", "..", "src"),
+]
+
+import kolibri  # noqa: E402,F401 (puts Kolibri's bundled django on the path)
+import django  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+settings.configure(USE_I18N=True, LANGUAGE_CODE="en")
+django.setup()
+
+import jnius  # noqa: E402
+from android_app_plugin import kolibri_plugin  # noqa: E402
+from django.utils import translation  # noqa: E402
+from django.utils.translation import ngettext  # noqa: E402
+from kolibri.core.tasks.job import JobStatus  # noqa: E402
+from kolibri.core.tasks.job import State  # noqa: E402
+
+NOTIFY = "org.learningequality.Kolibri.task.TaskWorkerImpl.notifyLocalObservers"
+
+
+class Task:
+    def generate_status(self, job):
+        return JobStatus(
+            "Importing channel",
+            ngettext(
+                "{} of {} resource", "{} of {} resources", job.total_progress
+            ).format(job.progress, job.total_progress),
+        )
+
+
+class Job:
+    """
+    Stands in for the Job object that storage creates afresh for each update
+    """
+
+    def __init__(self, job_id, progress, total_progress):
+        self.job_id = job_id
+        self.progress = progress
+        self.total_progress = total_progress
+
+    @property
+    def task(self):
+        return Task()
+
+    def status(self, lang):
+        with translation.override(lang):
+            return self.task.generate_status(self)
+
+
+def legacy_update(job, state=None):
+    currentLocale = kolibri_plugin.Locale.getDefault().toLanguageTag()
+
+    status = job.status(currentLocale)
+
+    if status:
+        if job.total_progress:
+            progress = job.progress
+            total_progress = job.total_progress
+        else:
+            progress = -1
+            total_progress = -1
+
+        if total_progress > kolibri_plugin.PROGRESS_LIMIT:
+            progress = kolibri_plugin.PROGRESS_LIMIT * progress // total_progress
+            total_progress = kolibri_plugin.PROGRESS_LIMIT
+
+        kolibri_plugin.TaskWorker.notifyLocalObservers(
+            status.title,
+            status.text,
+            progress,
+            total_progress,
+        )
+
+
+def run(name, update, updates, work):
+    jnius.calls.clear()
+    job_id = "job-" + name
+    start = time.perf_counter()
+    update(Job(job_id, 0, updates), state=State.RUNNING)
+    for progress in range(1, updates + 1):
+        time.sleep(work)
+        update(Job(job_id, progress, updates))
+    update(Job(job_id, updates, updates), state=State.COMPLETED)
+    elapsed = time.perf_counter() - start
+    print(
+        "{:<10} {:>8} {:>10} {:>12.0f} {:>10.2f}".format(
+            name,
+            sum(jnius.calls.values()),
+            jnius.calls[NOTIFY],
+            updates / elapsed,
+            elapsed,
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--updates", type=int, default=20000)
+    parser.add_argument("--jni-cost", type=float, default=1.0)
+    parser.add_argument(
+        "--work", type=float, default=0.1, help="milliseconds of work per update"
+    )
+    args = parser.parse_args()
+
+    notify = kolibri_plugin.TaskWorker.notifyLocalObservers
+
+    def costly_notify(*args_):
+        time.sleep(args.jni_cost / 1000)
+        return notify(*args_)
+
+    kolibri_plugin.TaskWorker.notifyLocalObservers = costly_notify
+
+    print(
+        "{} progress updates, {}ms of work each, {}ms per notification update".format(
+            args.updates, args.work, args.jni_cost
+        )
+    )
+    print(
+        "{:<10} {:>8} {:>10} {:>12} {:>10}".format(
+            "", "jni", "notified", "updates/s", "seconds"
+        )
+    )
+    run("before", legacy_update, args.updates, args.work / 1000)
+    run(
+        "after",
+        kolibri_plugin.progress_coalescer.update,
+        args.updates,
+        args.work / 1000,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Measure how the remote shell handles bursts of concurrent SSH logins, and how responsive it
+stays to other connections while it checks them.
+
+remoteshell.py is run against the jnius stand-in in stubs/, on a device provisioned with one
+super admin, so that every login checks a password hash. Clients log in from their own
+loopback address each, as 127.0.0.0/8 all reaches the shell on Linux:
+
+- burst: concurrent logins, half with the right password and half with a wrong one
+- repeat: the same right logins again, straight after
+- flood: one address sending concurrent logins with a wrong password
+- retry: one address trying a wrong password again and again
+
+Throughout, a probe connects every PROBE_INTERVAL seconds and times how long the shell takes
+to send its SSH version, which it can only do when its reactor is free.
+
+To compare with another version of the shell, pass it with --remoteshell, for example
+`git show HEAD~1:src/remoteshell.py > /tmp/remoteshell.py`.
+
+Usage: python scripts/benchmarks/remoteshell_logins.py [--logins N] [--remoteshell PATH]
+"""
+import argparse
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from environment import app_env
+from environment import SRC_DIR
+from remoteshell_startup import ClientFactory
+from remoteshell_startup import PORT
+from remoteshell_startup import TIMEOUT
+from twisted.internet import defer
+from twisted.internet import protocol
+from twisted.internet import reactor
+from twisted.internet import task
+
+USERNAME = b"admin"
+PASSWORD = b"benchmark-password"
+PROBE_INTERVAL = 0.02
+
+# Sets up the database with a super admin, as the setup wizard would
+PROVISION = """
+import initialization
+from kolibri.main import initialize
+initialize()
+from kolibri.core.auth.models import Facility
+from kolibri.core.auth.models import FacilityUser
+FacilityUser.objects.create_superuser(
+    {username!r}, {password!r}, facility=Facility.objects.create(name="Benchmark")
+)
+"""
+
+
+class LoginFactory(ClientFactory):
+    """
+    Logs in, and hangs up as soon as the login is accepted or refused
+    """
+
+    def clientConnectionFailed(self, connector, reason):
+        if not self.done.called:
+            self.done.errback(reason)
+
+    def logged_in(self, connection):
+        if not self.done.called:
+            self.done.callback(time.perf_counter() - self.start)
+        connection.transport.loseConnection()
+
+
+class Probe(protocol.Protocol):
+    def dataReceived(self, data):
+        if b"SSH-" in data and not self.factory.done.called:
+            self.factory.done.callback(time.perf_counter() - self.factory.start)
+            self.transport.loseConnection()
+
+
+class ProbeFactory(protocol.ClientFactory):
+    protocol = Probe
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.done = defer.Deferred()
+
+    def clientConnectionFailed(self, connector, reason):
+        if not self.done.called:
+            self.done.errback(reason)
+
+
+class Prober(object):
+    """
+    Connects every PROBE_INTERVAL seconds, keeping how long each took to get the SSH version
+    """
+
+    def __init__(self):
+        self.timings = []
+        self.loop = task.LoopingCall(self.probe)
+
+    def probe(self):
+        factory = ProbeFactory()
+        reactor.connectTCP("127.0.0.1", PORT, factory)
+        factory.done.addCallbacks(self.timings.append, lambda _: None)
+
+    def start(self):
+        self.timings = []
+        self.loop.start(PROBE_INTERVAL)
+
+    def stop(self):
+        self.loop.stop()
+        return max(self.timings) * 1000 if self.timings else float("nan")
+
+
+def login(address, password):
+    """
+    Returns a Deferred that fires with whether the login was accepted, and the ms it took
+    """
+    factory = LoginFactory(time.perf_counter(), USERNAME, password)
+    reactor.connectTCP(
+        "127.0.0.1", PORT, factory, timeout=TIMEOUT, bindAddress=(address, 0)
+    )
+
+    def accepted(seconds):
+        return True, seconds * 1000
+
+    def refused(_):
+        return False, (time.perf_counter() - factory.start) * 1000
+
+    return factory.done.addCallbacks(accepted, refused)
+
+
+@defer.inlineCallbacks
+def measure(label, prober, attempts, concurrent=True):
+    prober.start()
+    if concurrent:
+        results = yield defer.gatherResults([login(*attempt) for attempt in attempts])
+    else:
+        results = []
+        for attempt in attempts:
+            results.append((yield login(*attempt)))
+    max_probe_ms = prober.stop()
+    accepted = [ms for ok, ms in results if ok]
+    refused = [ms for ok, ms in results if not ok]
+    print(
+        "{:<8} {:>8} {:>8} {:>12} {:>12} {:>12}".format(
+            label,
+            len(accepted),
+            len(refused),
+            "{:.0f}".format(statistics.median(accepted)) if accepted else "",
+            "{:.0f}".format(statistics.median(refused)) if refused else "",
+            "{:.0f}".format(max_probe_ms),
+        )
+    )
+
+
+@defer.inlineCallbacks
+def wait_until_ready():
+    """
+    Waits until the shell sends its SSH version, without logging in, then lets it settle
+    """
+    deadline = time.perf_counter() + TIMEOUT
+    while True:
+        factory = ProbeFactory()
+        reactor.connectTCP("127.0.0.1", PORT, factory)
+        try:
+            yield factory.done
+            break
+        except Exception:
+            if time.perf_counter() > deadline:
+                raise
+            yield task.deferLater(reactor, 0.05, lambda: None)
+    yield task.deferLater(reactor, 1, lambda: None)
+
+
+def provision(files_dir, output):
+    subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            PROVISION.format(username=USERNAME.decode(), password=PASSWORD.decode()),
+        ],
+        env=app_env(files_dir),
+        cwd=files_dir,
+        stdout=output,
+        stderr=subprocess.STDOUT,
+        check=True,
+    )
+
+
+@defer.inlineCallbacks
+def run(_, logins, remoteshell):
+    with tempfile.TemporaryDirectory() as files_dir, tempfile.TemporaryFile() as output:
+        provision(files_dir, output)
+        env = app_env(files_dir, role="remoteshell")
+        shell = subprocess.Popen(
+            [sys.executable, remoteshell],
+            env=env,
+            cwd=files_dir,
+            stdout=output,
+            stderr=subprocess.STDOUT,
+        )
+        try:
+            yield wait_until_ready()
+
+            prober = Prober()
+            right = [("127.0.1.{}".format(i + 1), PASSWORD) for i in range(logins // 2)]
+            wrong = [
+                ("127.0.2.{}".format(i + 1), b"wrong")
+                for i in range(logins - logins // 2)
+            ]
+            print(
+                "{:<8} {:>8} {:>8} {:>12} {:>12} {:>12}".format(
+                    "", "accepted", "refused", "accept ms", "refuse ms", "max probe ms"
+                )
+            )
+            yield measure("burst", prober, right + wrong)
+            yield measure("repeat", prober, right)
+            yield measure("flood", prober, [("127.0.4.1", b"wrong")] * logins)
+            yield measure(
+                "retry", prober, [("127.0.3.1", b"wrong")] * logins, concurrent=False
+            )
+        finally:
+            shell.send_signal(signal.SIGTERM)
+            shell.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=20)
+    parser.add_argument(
+        "--remoteshell", default=os.path.join(SRC_DIR, "remoteshell.py")
+    )
+    args = parser.parse_args()
+    task.react(run, [args.logins, os.path.abspath(args.remoteshell)])
+
+
+if __name__ == "__main__":
+    main()
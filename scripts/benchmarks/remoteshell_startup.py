@@ -0,0 +1,202 @@
+"""
+Measure how long the remote shell takes to start listening, and to show its first prompt to
+an SSH client that connects as soon as it can, with and without a host key already made.
+
+remoteshell.py is run against the jnius stand-in in stubs/, on a device with no users yet,
+so that any credentials are accepted. The client is played by this script with Twisted Conch,
+retrying its connection until the port accepts it, then logging in and opening a shell.
+Times are from starting the process.
+
+Usage: python scripts/benchmarks/remoteshell_startup.py [--runs N]
+"""
+import argparse
+import glob
+import os
+import signal
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+from environment import app_env
+from environment import SRC_DIR
+from twisted.conch.ssh import channel
+from twisted.conch.ssh import common
+from twisted.conch.ssh import connection
+from twisted.conch.ssh import transport
+from twisted.conch.ssh import userauth
+from twisted.internet import defer
+from twisted.internet import protocol
+from twisted.internet import reactor
+from twisted.internet import task
+
+PORT = 4242
+PROMPT = b">>> "
+TIMEOUT = 300
+
+
+class Session(channel.SSHChannel):
+    name = b"session"
+
+    def channelOpen(self, data):
+        # A terminal of 80x24 characters, as the manhole needs one
+        pty = common.NS(b"xterm") + struct.pack(">4L", 80, 24, 0, 0) + common.NS(b"")
+        self.conn.sendRequest(self, b"pty-req", pty, wantReply=True)
+        self.conn.sendRequest(self, b"shell", b"", wantReply=True)
+        self.output = b""
+
+    def dataReceived(self, data):
+        self.output += data
+        if PROMPT in self.output:
+            self.conn.transport.factory.prompted()
+
+
+class Connection(connection.SSHConnection):
+    def serviceStarted(self):
+        self.transport.factory.logged_in(self)
+
+
+class UserAuth(userauth.SSHUserAuthClient):
+    def getPassword(self, prompt=None):
+        # Give the password once, so that a refused login ends the connection
+        if getattr(self, "password_sent", False):
+            return None
+        self.password_sent = True
+        return defer.succeed(self.transport.factory.password)
+
+    def getPublicKey(self):
+        return None
+
+
+class ClientTransport(transport.SSHClientTransport):
+    def connectionMade(self):
+        self.factory.connected()
+        transport.SSHClientTransport.connectionMade(self)
+
+    def verifyHostKey(self, hostKey, fingerprint):
+        self.factory.host_key_type = self.keyAlg
+        return defer.succeed(True)
+
+    def connectionSecure(self):
+        self.requestService(UserAuth(self.factory.username, Connection()))
+
+
+class ClientFactory(protocol.ClientFactory):
+    protocol = ClientTransport
+
+    def __init__(self, start, username=b"benchmark", password=b"benchmark"):
+        self.start = start
+        self.username = username
+        self.password = password
+        self.listen_seconds = None
+        self.host_key_type = None
+        self.done = defer.Deferred()
+
+    def connected(self):
+        self.listen_seconds = time.perf_counter() - self.start
+
+    def logged_in(self, connection):
+        connection.openChannel(Session(conn=connection))
+
+    def prompted(self):
+        if not self.done.called:
+            self.done.callback(time.perf_counter() - self.start)
+
+    def clientConnectionFailed(self, connector, reason):
+        # Not listening yet
+        reactor.callLater(0.005, connector.connect)
+
+    def clientConnectionLost(self, connector, reason):
+        if not self.done.called:
+            self.done.errback(reason)
+
+
+# Sets up the database, as the main process does before the remote shell is used
+PROVISION = """
+import initialization
+from kolibri.main import initialize
+initialize()
+"""
+
+
+def provision(files_dir, output):
+    env = app_env(files_dir)
+    subprocess.run(
+        [sys.executable, "-c", PROVISION],
+        env=env,
+        cwd=files_dir,
+        stdout=output,
+        stderr=subprocess.STDOUT,
+        check=True,
+    )
+
+
+@defer.inlineCallbacks
+def start_shell(files_dir, output):
+    env = app_env(files_dir, role="remoteshell")
+    start = time.perf_counter()
+    shell = subprocess.Popen(
+        [sys.executable, os.path.join(SRC_DIR, "remoteshell.py")],
+        env=env,
+        cwd=files_dir,
+        stdout=output,
+        stderr=subprocess.STDOUT,
+    )
+    client = ClientFactory(start)
+    connector = reactor.connectTCP("127.0.0.1", PORT, client)
+    try:
+        prompt_seconds = yield client.done.addTimeout(TIMEOUT, reactor)
+    finally:
+        connector.disconnect()
+        shell.send_signal(signal.SIGTERM)
+        shell.wait()
+    return {
+        "listen": client.listen_seconds * 1000,
+        "prompt": prompt_seconds * 1000,
+        "host key": client.host_key_type.decode(),
+    }
+
+
+def _report(label, results):
+    print(
+        "{:<18} {:>10.0f} {:>10.0f}  {}".format(
+            label,
+            statistics.median(result["listen"] for result in results),
+            statistics.median(result["prompt"] for result in results),
+            results[-1]["host key"],
+        )
+    )
+
+
+@defer.inlineCallbacks
+def run(_, runs):
+    with tempfile.TemporaryDirectory() as files_dir, tempfile.TemporaryFile() as output:
+        provision(files_dir, output)
+        # Boot once, so that we measure a normal start rather than the first one
+        yield start_shell(files_dir, output)
+        print(
+            "{:<18} {:>10} {:>10}  {}".format("", "listen ms", "prompt ms", "host key")
+        )
+        for label, new_key in (("new host key", True), ("existing host key", False)):
+            results = []
+            for _ in range(runs):
+                if new_key:
+                    for path in glob.glob(
+                        os.path.join(files_dir, "KOLIBRI_DATA", "ssh_host_*")
+                    ):
+                        os.remove(path)
+                results.append((yield start_shell(files_dir, output)))
+            _report(label, results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    task.react(run, [args.runs])
+
+
+if __name__ == "__main__":
+    main()
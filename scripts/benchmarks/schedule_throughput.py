@@ -0,0 +1,171 @@
+"""
+Compare scheduling jobs one at a time with WorkManager, as StorageHook.schedule used to,
+against batching them, for a facility admin queuing many jobs at once.
+
+Jobs are scheduled through Kolibri's job storage, in a SQLite database in a temporary
+directory. jnius is replaced by the stand-in in stubs/, with each call to the Task class
+taking --jni-cost milliseconds, and each task enqueued taking --enqueue-cost milliseconds,
+to stand in for the JNI call and the RemoteWorkManager IPC. Batching is run again with each
+batch failing, to check that its jobs are still enqueued one at a time.
+
+Usage: python scripts/benchmarks/schedule_throughput.py [--jobs N] [--jni-cost MS]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [
+    os.path.join(BENCHMARK_DIR, "stubs"),
+    os.path.join(BENCHMARK_DIR, "..", "..", "src"),
+]
+
+import kolibri  # noqa: E402,F401 (puts Kolibri's bundled django on the path)
+import django  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+settings.configure(USE_I18N=True, USE_TZ=True, LANGUAGE_CODE="en")
+django.setup()
+
+import jnius  # noqa: E402
+from android_app_plugin import kolibri_plugin  # noqa: E402
+from kolibri.core.tasks.job import Job  # noqa: E402
+from kolibri.core.tasks.job import Priority  # noqa: E402
+from kolibri.core.tasks.storage import ORMJob  # noqa: E402
+from kolibri.core.tasks.storage import Storage  # noqa: E402
+from kolibri.core.tasks.utils import make_connection  # noqa: E402
+from kolibri.utils.time_utils import local_now  # noqa: E402
+
+
+class TimedHook:
+    """
+    Accumulates the time spent in the hook, as storage spends much of the time scheduling
+    a job in its own commit, regardless of the hook
+    """
+
+    def __init__(self):
+        self.seconds = 0
+
+    def schedule(self, job, orm_job):
+        start = time.perf_counter()
+        self._schedule(job, orm_job)
+        self.seconds += time.perf_counter() - start
+
+    def flush(self):
+        pass
+
+
+class LegacyHook(TimedHook):
+    def _schedule(self, job, orm_job):
+        delay = (
+            max(0, (orm_job.scheduled_time - datetime.now()).total_seconds())
+            if orm_job.scheduled_time
+            else 0
+        )
+        high_priority = orm_job.priority <= Priority.HIGH
+        request_id = kolibri_plugin.Task.enqueueOnce(
+            orm_job.id,
+            delay,
+            high_priority,
+            job.func,
+            job.long_running,
+        )
+        job.update_worker_info(extra=request_id)
+
+
+class BatchedHook(TimedHook):
+    def _schedule(self, job, orm_job):
+        kolibri_plugin.schedule_batcher.add(job, orm_job)
+
+    def flush(self):
+        start = time.perf_counter()
+        kolibri_plugin.schedule_batcher.flush()
+        self.seconds += time.perf_counter() - start
+
+
+def costly(method, jni_cost, enqueue_cost):
+    def call(*args):
+        jobs = len(args[0]) if isinstance(args[0], list) else 1
+        time.sleep(jni_cost + enqueue_cost * jobs)
+        return method(*args)
+
+    return call
+
+
+def failing(method):
+    def call(*args):
+        method(*args)
+        raise RuntimeError("RemoteWorkManager is unavailable")
+
+    return call
+
+
+def run(name, hook, jobs, temp_dir):
+    path = os.path.join(temp_dir, name + ".sqlite3")
+    storage = Storage(make_connection("sqlite", "sqlite:///" + path))
+    storage._hooks = [hook]
+    jnius.calls.clear()
+
+    start = time.perf_counter()
+    for i in range(jobs):
+        job = Job("kolibri.core.tasks.test.base.noop", long_running=i % 2 == 0)
+        storage.schedule(local_now(), job, priority=Priority.REGULAR)
+    hook.flush()
+    elapsed = time.perf_counter() - start
+
+    with storage.session_scope() as session:
+        recorded = session.query(ORMJob).filter(ORMJob.worker_extra.isnot(None)).count()
+    print(
+        "{:<10} {:>8} {:>10} {:>10.0f} {:>10.2f} {:>10.2f}".format(
+            name,
+            sum(jnius.calls.values()),
+            recorded,
+            jobs / elapsed,
+            elapsed,
+            hook.seconds,
+        )
+    )
+    if recorded != jobs:
+        print("Only recorded work request IDs for {} of {} jobs".format(recorded, jobs))
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--jobs", type=int, default=2000)
+    parser.add_argument("--jni-cost", type=float, default=0.5)
+    parser.add_argument("--enqueue-cost", type=float, default=0.05)
+    args = parser.parse_args()
+
+    Task = kolibri_plugin.Task
+    for method in ("enqueueOnce", "enqueueOnceBatch"):
+        setattr(
+            Task,
+            method,
+            costly(
+                getattr(Task, method), args.jni_cost / 1000, args.enqueue_cost / 1000
+            ),
+        )
+
+    print(
+        "{} jobs, {}ms per JNI call, {}ms per task enqueued".format(
+            args.jobs, args.jni_cost, args.enqueue_cost
+        )
+    )
+    print(
+        "{:<10} {:>8} {:>10} {:>10} {:>10} {:>10}".format(
+            "", "jni", "recorded", "jobs/s", "seconds", "in hook"
+        )
+    )
+    with tempfile.TemporaryDirectory() as temp_dir:
+        run("before", LegacyHook(), args.jobs, temp_dir)
+        run("after", BatchedHook(), args.jobs, temp_dir)
+        Task.enqueueOnceBatch = failing(Task.enqueueOnceBatch)
+        run("fallback", BatchedHook(), args.jobs, temp_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Load test the Kolibri server with the thread pool that device_profile picks for this
+machine, against the fixed pool of 2 threads that the app used to run with.
+
+Starts `kolibri start --foreground` for each pool size, with a temporary KOLIBRI_HOME, and
+has --clients concurrent clients request a mix of API and page URLs over keep-alive
+connections for --duration seconds, reporting requests per second and latency.
+
+Usage: python scripts/benchmarks/server_load.py [--clients N] [--duration S] [--threads N]
+"""
+import argparse
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARK_DIR, "..", "..", "src"))
+
+import device_profile  # noqa: E402
+
+FIXED_THREADS = 2
+
+URLS = [
+    "/api/public/info/",
+    "/api/public/v1/channels/",
+    "/en/user/",
+    "/api/auth/session/current/",
+]
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_server(port, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            connection.request("GET", URLS[0])
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError("The server did not start")
+
+
+def client(port, deadline, latencies, errors):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    i = 0
+    while time.monotonic() < deadline:
+        url = URLS[i % len(URLS)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            connection.request("GET", url)
+            response = connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            errors.append(url)
+            connection.close()
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            continue
+        if response.status >= 500:
+            errors.append(url)
+        else:
+            latencies.append(time.perf_counter() - start)
+    connection.close()
+
+
+def run(name, threads, home, clients, duration):
+    port = _free_port()
+    env = dict(os.environ)
+    env["KOLIBRI_HOME"] = home
+    env["KOLIBRI_CHERRYPY_THREAD_POOL"] = str(threads)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "kolibri", "start", "--foreground", "--port", str(port)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        _wait_for_server(port)
+        latencies = []
+        errors = []
+        deadline = time.monotonic() + duration
+        workers = [
+            threading.Thread(target=client, args=(port, deadline, latencies, errors))
+            for _ in range(clients)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies.sort()
+    print(
+        "{:<8} {:>8} {:>10.1f} {:>10.1f} {:>10.1f} {:>8}".format(
+            name,
+            threads,
+            len(latencies) / duration,
+            statistics.median(latencies) * 1000 if latencies else 0,
+            latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0,
+            len(errors),
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument(
+        "--threads",
+        type=int,
+        help="the thread pool to compare against the fixed one, instead of the profile's",
+    )
+    args = parser.parse_args()
+
+    profile = device_profile.profile_device()
+    threads = args.threads or device_profile.derive_settings(profile)["server_threads"]
+    print("Device profile: {}".format(profile))
+    print(
+        "{} clients for {}s each, requesting {}".format(
+            args.clients, args.duration, ", ".join(URLS)
+        )
+    )
+    print(
+        "{:<8} {:>8} {:>10} {:>10} {:>10} {:>8}".format(
+            "", "threads", "req/s", "p50 ms", "p95 ms", "errors"
+        )
+    )
+    with tempfile.TemporaryDirectory() as home:
+        run("fixed", FIXED_THREADS, home, args.clients, args.duration)
+        run("profile", threads, home, args.clients, args.duration)
+
+
+if __name__ == "__main__":
+    main()
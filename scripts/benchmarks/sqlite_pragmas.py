@@ -0,0 +1,230 @@
+"""
+Compare the SQLite settings that the app ran with, against the per process profile in
+src/sqlite_profile.py, with queries typical of Kolibri.
+
+A database shaped like Kolibri's, with a content tree and learner logs, is read and written
+by server threads making requests, while a task worker process writes in batches as a
+channel import does. With the generic settings, each request opens a new connection, as
+Django does by default, with only the pragmas Kolibri applies itself. With the profile,
+connections are kept open, with the pragmas for the server and task worker roles.
+
+Usage: python scripts/benchmarks/sqlite_pragmas.py [--threads N] [--duration S] [--nodes N]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARK_DIR, "..", "..", "src"))
+
+import sqlite_profile  # noqa: E402
+
+# As applied by Kolibri to each connection, and to the default database on start
+GENERIC_PRAGMAS = ["PRAGMA journal_mode=WAL", "PRAGMA wal_autocheckpoint=500"]
+# As set in Kolibri's DATABASES OPTIONS
+GENERIC_TIMEOUT = 100
+
+SCHEMA = """
+CREATE TABLE contentnode (
+    id TEXT PRIMARY KEY, parent_id TEXT, tree_id INTEGER, lft INTEGER, rght INTEGER,
+    channel_id TEXT, kind TEXT, title TEXT, available INTEGER
+);
+CREATE INDEX contentnode_parent ON contentnode (parent_id);
+CREATE INDEX contentnode_tree ON contentnode (tree_id, lft);
+CREATE INDEX contentnode_title ON contentnode (title);
+CREATE TABLE contentsummarylog (
+    user_id TEXT, content_id TEXT, progress REAL, time_spent REAL, end_timestamp REAL,
+    PRIMARY KEY (user_id, content_id)
+);
+CREATE TABLE localfile (id TEXT PRIMARY KEY, extension TEXT, available INTEGER);
+"""
+
+
+class Settings:
+    def __init__(self, pragmas, persistent, timeout=GENERIC_TIMEOUT):
+        self.pragmas = pragmas
+        self.persistent = persistent
+        self.timeout = timeout
+
+
+def connect(path, settings):
+    connection = sqlite3.connect(path, timeout=settings.timeout)
+    for pragma in settings.pragmas:
+        connection.execute(pragma)
+    return connection
+
+
+def create_database(path, nodes):
+    connection = sqlite3.connect(path)
+    connection.executescript(SCHEMA)
+    rows = []
+    ids = []
+    # A tree with 10 children per node, numbered in preorder
+    for i in range(nodes):
+        node_id = uuid.uuid4().hex
+        parent_id = ids[(i - 1) // 10] if i else None
+        ids.append(node_id)
+        rows.append(
+            (node_id, parent_id, 1, i, i, "channel", "video", "Lesson {}".format(i), 1)
+        )
+    connection.executemany(
+        "INSERT INTO contentnode VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+    )
+    connection.commit()
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.close()
+    return ids
+
+
+def read_request(connection, ids):
+    node_id = random.choice(ids)
+    connection.execute(
+        "SELECT id, title, kind FROM contentnode WHERE parent_id = ? ORDER BY lft",
+        (node_id,),
+    ).fetchall()
+    connection.execute("SELECT * FROM contentnode WHERE id = ?", (node_id,)).fetchone()
+    connection.execute(
+        "SELECT COUNT(*) FROM contentnode WHERE tree_id = 1 AND lft BETWEEN ? AND ?",
+        (1000, 5000),
+    ).fetchone()
+    connection.execute(
+        "SELECT id FROM contentnode WHERE title LIKE ? LIMIT 20",
+        ("Lesson {}%".format(random.randint(1, 999)),),
+    ).fetchall()
+
+
+def write_request(connection, ids):
+    user_id = "user-{}".format(random.randint(1, 40))
+    content_id = random.choice(ids)
+    with connection:
+        updated = connection.execute(
+            "UPDATE contentsummarylog SET progress = ?, time_spent = time_spent + 1, "
+            "end_timestamp = ? WHERE user_id = ? AND content_id = ?",
+            (random.random(), time.time(), user_id, content_id),
+        ).rowcount
+        if not updated:
+            connection.execute(
+                "INSERT INTO contentsummarylog VALUES (?, ?, ?, 1, ?)",
+                (user_id, content_id, random.random(), time.time()),
+            )
+
+
+def server_thread(path, settings, ids, deadline, latencies):
+    connection = connect(path, settings) if settings.persistent else None
+    i = 0
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        request_connection = connection or connect(path, settings)
+        # One request in ten records progress
+        if i % 10 == 0:
+            write_request(request_connection, ids)
+        else:
+            read_request(request_connection, ids)
+        if not settings.persistent:
+            request_connection.close()
+        latencies.append(time.perf_counter() - start)
+        i += 1
+
+
+def task_worker(path, pragmas, deadline, batches):
+    settings = Settings(pragmas, persistent=True)
+    connection = connect(path, settings)
+    while time.monotonic() < deadline:
+        with connection:
+            connection.executemany(
+                "INSERT INTO localfile VALUES (?, 'mp4', 1)",
+                [(uuid.uuid4().hex,) for _ in range(200)],
+            )
+        batches.value += 1
+
+
+def run(name, path, ids, server_settings, worker_pragmas, threads, duration):
+    deadline = time.monotonic() + duration
+    batches = multiprocessing.Value("i", 0)
+    worker = multiprocessing.Process(
+        target=task_worker, args=(path, worker_pragmas, deadline, batches)
+    )
+    worker.start()
+    latencies = []
+    server_threads = [
+        threading.Thread(
+            target=server_thread,
+            args=(path, server_settings, ids, deadline, latencies),
+        )
+        for _ in range(threads)
+    ]
+    for thread in server_threads:
+        thread.start()
+    for thread in server_threads:
+        thread.join()
+    worker.join()
+
+    latencies.sort()
+    print(
+        "{:<10} {:>10.0f} {:>10.2f} {:>10.2f} {:>12.0f}".format(
+            name,
+            len(latencies) / duration,
+            latencies[len(latencies) // 2] * 1000,
+            latencies[int(len(latencies) * 0.95)] * 1000,
+            batches.value * 200 / duration,
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--nodes", type=int, default=50000)
+    parser.add_argument(
+        "--cache-kb",
+        type=int,
+        default=8192,
+        help="the page cache size, as device_profile would pick",
+    )
+    args = parser.parse_args()
+
+    print(
+        "{} server threads and a task worker for {}s, on {} content nodes".format(
+            args.threads, args.duration, args.nodes
+        )
+    )
+    print(
+        "{:<10} {:>10} {:>10} {:>10} {:>12}".format(
+            "", "requests/s", "p50 ms", "p95 ms", "worker rows/s"
+        )
+    )
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name, server_settings, worker_pragmas in (
+            ("generic", Settings(GENERIC_PRAGMAS, persistent=False), GENERIC_PRAGMAS),
+            (
+                "profile",
+                Settings(
+                    sqlite_profile.connection_pragmas("main", args.cache_kb),
+                    persistent=True,
+                ),
+                sqlite_profile.connection_pragmas("taskworker", args.cache_kb),
+            ),
+        ):
+            path = os.path.join(temp_dir, name + ".sqlite3")
+            ids = create_database(path, args.nodes)
+            run(
+                name,
+                path,
+                ids,
+                server_settings,
+                worker_pragmas,
+                args.threads,
+                args.duration,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Check that create_strings.py finds the same translations with its index of Kolibri's message
+files as it did by rescanning them for every string, and compare how long each takes.
+
+Looks up every string in the app's strings.xml for every language Kolibri supports, and the
+Python only strings, as `make create-strings` does, first as create_strings.py did before
+it was indexed, then with the index. Kolibri is initialized before timing either.
+
+Usage: python scripts/benchmarks/string_lookup.py
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from importlib import resources
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.join(BENCHMARK_DIR, "..")
+sys.path.insert(0, SCRIPTS_DIR)
+
+os.environ.setdefault("KOLIBRI_HOME", tempfile.mkdtemp(prefix="kolibri-strings-"))
+
+import create_strings  # noqa: E402
+
+STRINGS_XML = os.path.join(
+    SCRIPTS_DIR,
+    "../python-for-android/dists/kolibri/src/main/res/values/strings.xml",
+)
+
+
+def find_string_by_scanning(lang, string):
+    """
+    The lookup as create_strings.py made it before it was indexed
+    """
+    from kolibri.main import initialize
+    from django.utils.translation import override
+    from django.utils.translation import ugettext as _
+    from django.utils.translation import to_locale
+
+    initialize(skip_update=True)
+
+    with override(lang):
+        new_string = _(string)
+        if new_string != string and new_string:
+            return new_string
+
+    messages_dir = resources.files("kolibri") / "locale" / "en" / "LC_MESSAGES"
+    for message_file in os.listdir(messages_dir):
+        if message_file.endswith(".json"):
+            with open(messages_dir / message_file, "r") as f:
+                messages = json.load(f)
+                for key, value in messages.items():
+                    if value == string:
+                        try:
+                            with open(
+                                resources.files("kolibri")
+                                / "locale"
+                                / to_locale(lang)
+                                / "LC_MESSAGES"
+                                / message_file,
+                                "r",
+                            ) as lang_message_file:
+                                messages = json.load(lang_message_file)
+                                new_string = messages[key]
+                                if new_string != string and new_string:
+                                    return new_string
+                                return None
+                        except FileNotFoundError:
+                            break
+    return None
+
+
+def lookups():
+    from kolibri.utils.i18n import KOLIBRI_SUPPORTED_LANGUAGES
+
+    strings = [string.text for string in ET.parse(STRINGS_XML).getroot()]
+    langs = sorted(KOLIBRI_SUPPORTED_LANGUAGES)
+    for lang in langs:
+        if lang != create_strings.DEFAULT_LANGUAGE:
+            for string in strings:
+                yield lang, string
+    for string in create_strings.PYTHON_ONLY_STRINGS:
+        for lang in langs:
+            yield lang, string
+
+
+def run(find_string):
+    start = time.perf_counter()
+    found = {(lang, string): find_string(lang, string) for lang, string in lookups()}
+    return found, time.perf_counter() - start
+
+
+def main():
+    create_strings._initialize()
+    scanned, scanning_seconds = run(find_string_by_scanning)
+    indexed, indexed_seconds = run(create_strings._find_string)
+
+    translated = sum(1 for value in indexed.values() if value is not None)
+    print("{} lookups, {} translated".format(len(indexed), translated))
+    print("scanning {:8.0f} ms".format(scanning_seconds * 1000))
+    print("indexed  {:8.0f} ms".format(indexed_seconds * 1000))
+    different = [key for key in scanned if scanned[key] != indexed[key]]
+    for lang, string in different:
+        print(
+            "Different for {} {!r}: {!r} != {!r}".format(
+                lang, string, scanned[lang, string], indexed[lang, string]
+            )
+        )
+    if different:
+        sys.exit(1)
+    print("Identical translations")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+A stand-in for pyjnius, so that the app entry points can be imported and run on Linux.
+
+Every call that would cross into Java is counted in `calls`, keyed by `Class.member`,
+so benchmarks can report how many JNI calls a code path makes.
+"""
+import json
+import os
+import tempfile
+from collections import Counter
+
+calls = Counter()
+
+
+def write_calls(path):
+    """
+    Writes the calls counted so far as JSON, for benchmarks that run code in a subprocess
+    """
+    with open(path, "w") as f:
+        json.dump(calls, f, indent=0, sort_keys=True)
+
+
+# Where the fake Android context puts its files
+FILES_DIR = os.environ.get("BENCHMARK_FILES_DIR") or tempfile.mkdtemp(
+    prefix="kolibri-android-"
+)
+
+
+class JavaStub(object):
+    """
+    A Java object or class whose members are all stubs, unless set explicitly.
+    """
+
+    def __init__(self, name, **members):
+        self._name = name
+        self.__dict__.update(members)
+
+    def __getattr__(self, attr):
+        if attr.startswith("__"):
+            raise AttributeError(attr)
+        member = JavaMethod("{}.{}".format(self._name, attr))
+        setattr(self, attr, member)
+        return member
+
+    def __call__(self, *args):
+        calls[self._name + ".<init>"] += 1
+        return JavaStub(self._name)
+
+    def __or__(self, other):
+        return 0
+
+    __ror__ = __or__
+
+    def __iter__(self):
+        return iter(())
+
+    def __repr__(self):
+        return "<JavaStub {}>".format(self._name)
+
+
+class JavaMethod(object):
+    def __init__(self, name, result=None):
+        self._name = name
+        self._result = result
+
+    def __call__(self, *args):
+        calls[self._name] += 1
+        if callable(self._result):
+            return self._result(*args)
+        if self._result is not None:
+            return self._result
+        return JavaStub(self._name + "()")
+
+    def __or__(self, other):
+        return 0
+
+    __ror__ = __or__
+
+
+def _signature_der():
+    # Generated lazily, as it is only needed on a first boot
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.hazmat.primitives.serialization import Encoding
+    from cryptography.x509.oid import NameOID
+    import datetime
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name(
+        [x509.NameAttribute(NameOID.ORGANIZATION_NAME, "Learning Equality")]
+    )
+    now = datetime.datetime.utcnow()
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(1)
+        .not_valid_before(now)
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    return cert.public_bytes(Encoding.DER)
+
+
+def _package_info(*args):
+    signature = JavaStub(
+        "android.content.pm.Signature",
+        toByteArray=JavaMethod(
+            "android.content.pm.Signature.toByteArray",
+            lambda: JavaStub("byte[]", tostring=_signature_der),
+        ),
+    )
+    return JavaStub(
+        "android.content.pm.PackageInfo",
+        versionName="0.16.2-0.1.1-debug",
+        versionCode=1,
+        signatures=[signature],
+    )
+
+
+_context = JavaStub(
+    "android.content.Context",
+    getExternalFilesDir=JavaMethod(
+        "android.content.Context.getExternalFilesDir",
+        lambda _: JavaStub("java.io.File", toString=lambda: FILES_DIR),
+    ),
+    getPackageManager=JavaMethod(
+        "android.content.Context.getPackageManager",
+        lambda: JavaStub(
+            "android.content.pm.PackageManager",
+            getPackageInfo=JavaMethod(
+                "android.content.pm.PackageManager.getPackageInfo", _package_info
+            ),
+        ),
+    ),
+    getPackageName=JavaMethod(
+        "android.content.Context.getPackageName", "org.learningequality.Kolibri"
+    ),
+)
+
+
+def _activity():
+    def run_on_ui_thread(runnable):
+        runnable.run()
+
+    return JavaStub(
+        "org.kivy.android.PythonActivity",
+        runOnUiThread=JavaMethod(
+            "org.kivy.android.PythonActivity.runOnUiThread", run_on_ui_thread
+        ),
+    )
+
+
+_activity_instance = _activity()
+
+_classes = {
+    "org.kivy.android.PythonContext": lambda: JavaStub(
+        "org.kivy.android.PythonContext",
+        get=JavaMethod("org.kivy.android.PythonContext.get", lambda: _context),
+    ),
+    "org.kivy.android.PythonActivity": lambda: JavaStub(
+        "org.kivy.android.PythonActivity",
+        mActivity=_activity_instance,
+        mWebView=JavaStub("android.webkit.WebView"),
+    ),
+    "java.util.TimeZone": lambda: JavaStub(
+        "java.util.TimeZone",
+        getDefault=JavaMethod(
+            "java.util.TimeZone.getDefault",
+            lambda: JavaStub("java.util.TimeZone", getDisplayName=lambda: "UTC"),
+        ),
+    ),
+    "java.util.Locale": lambda: JavaStub(
+        "java.util.Locale",
+        getDefault=JavaMethod(
+            "java.util.Locale.getDefault",
+            lambda: JavaStub("java.util.Locale", toLanguageTag=lambda: "en"),
+        ),
+    ),
+    "android.provider.Settings$Secure": lambda: JavaStub(
+        "android.provider.Settings$Secure",
+        ANDROID_ID="android_id",
+        getString=JavaMethod(
+            "android.provider.Settings$Secure.getString", "0123456789abcdef"
+        ),
+    ),
+    "android.content.pm.PackageManager": lambda: JavaStub(
+        "android.content.pm.PackageManager", GET_SIGNATURES=64
+    ),
+    "org.learningequality.NetworkUtils": lambda: JavaStub(
+        "org.learningequality.NetworkUtils",
+        getActiveIPv4Addresses=JavaMethod(
+            "org.learningequality.NetworkUtils.getActiveIPv4Addresses",
+            lambda: ["127.0.0.1"],
+        ),
+    ),
+    "org.learningequality.Task": lambda: JavaStub(
+        "org.learningequality.Task",
+        enqueueOnce=JavaMethod(
+            "org.learningequality.Task.enqueueOnce",
+            lambda id, *args: "request-" + id,
+        ),
+        enqueueOnceBatch=JavaMethod(
+            "org.learningequality.Task.enqueueOnceBatch",
+            lambda ids, *args: ["request-" + id for id in ids],
+        ),
+    ),
+}
+
+
+def autoclass(name):
+    calls["autoclass:" + name] += 1
+    factory = _classes.get(name)
+    if factory is not None:
+        return factory()
+    return JavaStub(name)
+
+
+def cast(cls, obj):
+    calls["cast"] += 1
+    return obj
+
+
+class PythonJavaClass(object):
+    def __init__(self, *args, **kwargs):
+        pass
+
+
+def detach():
+    pass
+
+
+def java_method(signature, name=None):
+    def decorator(func):
+        return func
+
+    return decorator
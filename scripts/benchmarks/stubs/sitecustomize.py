@@ -0,0 +1,74 @@
+"""
+Hides the parts of Kolibri that blocklist.txt leaves out of the app, as they are not there
+on a device, so that entry points run against the stand-ins in this directory import what
+they would on a device.
+
+Loaded by every python process started with this directory on PYTHONPATH.
+"""
+import os
+import re
+import sys
+from fnmatch import translate
+from importlib.machinery import PathFinder
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..")
+
+
+def _patterns(filename):
+    with open(os.path.join(REPO_DIR, filename)) as f:
+        lines = [line.strip() for line in f]
+    patterns = [
+        # As p4a matches them against the paths in the python bundle
+        line[1:] if line.startswith("^") else "*/" + line
+        for line in lines
+        if line and not line.startswith("#")
+    ]
+    return re.compile("|".join(translate(pattern) for pattern in patterns))
+
+
+class BlocklistFinder(object):
+    def __init__(self):
+        self.blocklist = _patterns("blocklist.txt")
+        self.allowlist = _patterns("allowlist.txt")
+
+    def is_blocked(self, origin):
+        index = origin.find(os.sep + "kolibri" + os.sep)
+        if index < 0:
+            return False
+        path = "_python_bundle/site-packages" + origin[index:]
+        # p4a ships modules compiled, so matches them as .pyc files
+        if path.endswith(".py"):
+            path += "c"
+        return bool(self.blocklist.match(path)) and not self.allowlist.match(path)
+
+    def find_spec(self, fullname, path=None, target=None):
+        for finder in sys.meta_path[sys.meta_path.index(self) + 1 :]:
+            find_spec = getattr(finder, "find_spec", None)
+            spec = find_spec(fullname, path, target) if find_spec else None
+            if spec is None:
+                continue
+            if spec.has_location and spec.origin and self.is_blocked(spec.origin):
+                return self.find_outside_kolibri(fullname, path)
+            return spec
+        return None
+
+    def find_outside_kolibri(self, fullname, path):
+        # Blocked dependencies of Kolibri may still be installed by their own recipe
+        spec = None
+        if path is None:
+            paths = [entry for entry in sys.path if not self.is_kolibri_dist(entry)]
+            spec = PathFinder.find_spec(fullname, paths)
+        if spec is None or self.is_blocked(spec.origin or ""):
+            raise ModuleNotFoundError(
+                "No module named {!r}".format(fullname), name=fullname
+            )
+        return spec
+
+    @staticmethod
+    def is_kolibri_dist(entry):
+        dist = os.sep + os.path.join("kolibri", "dist") + os.sep
+        return dist in os.path.realpath(entry or ".") + os.sep
+
+
+if os.environ.get("BENCHMARK_BLOCKLIST", "1") != "0":
+    sys.meta_path.insert(0, BlocklistFinder())
@@ -0,0 +1,125 @@
+"""
+Compare per-job latency of the task worker when every job boots a new interpreter (cold),
+against handing jobs to an already initialized interpreter (warm).
+
+Jobs are no-ops, so this measures the task worker overhead, not the work itself.
+The Java side is played by this script, and jnius is replaced by the stand-in in stubs/.
+
+Usage: python scripts/benchmarks/taskworker_latency.py [--jobs N]
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from environment import app_env
+
+COLD_WORKER = """
+import sys
+import taskworker
+taskworker.execute = lambda job_request: None
+taskworker.main(sys.argv[1])
+"""
+
+WARM_WORKER = """
+import sys
+import taskworker
+taskworker.serve(
+    address="\\0" + sys.argv[1],
+    idle_timeout=30,
+    max_jobs=int(sys.argv[2]),
+    execute=lambda job_request: None,
+    bind_local_worker=lambda request_id: None,
+)
+"""
+
+
+def _env(files_dir):
+    env = app_env(files_dir, role="taskworker")
+    env["KOLIBRI_TASKWORKER_MAX_JOBS"] = "0"
+    return env
+
+
+def _job_request(i):
+    return "request-{i},job-{i},{pid},1".format(i=i, pid=os.getpid())
+
+
+def run_cold(jobs, env):
+    timings = []
+    for i in range(jobs):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-c", COLD_WORKER, _job_request(i)],
+            env=env,
+            check=True,
+        )
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _connect(address, timeout=120):
+    deadline = time.monotonic() + timeout
+    while True:
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            client.connect(address)
+            return client
+        except OSError:
+            client.close()
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.001)
+
+
+def run_warm(jobs, env):
+    name = "kolibri-taskworker-benchmark-{}".format(os.getpid())
+    address = "\0" + name
+    start = time.perf_counter()
+    worker = subprocess.Popen(
+        [sys.executable, "-c", WARM_WORKER, name, str(jobs)],
+        env=env,
+    )
+    timings = []
+    try:
+        for i in range(jobs):
+            with _connect(address) as client, client.makefile("rw") as channel:
+                channel.write(_job_request(i) + "\n")
+                channel.flush()
+                assert channel.readline().strip() == "0"
+            timings.append(time.perf_counter() - start)
+            start = time.perf_counter()
+    finally:
+        worker.wait()
+    return timings
+
+
+def _report(label, timings):
+    print(
+        "{:<6} first {:8.1f} ms  median {:8.1f} ms  mean {:8.1f} ms".format(
+            label,
+            timings[0] * 1000,
+            statistics.median(timings) * 1000,
+            statistics.mean(timings) * 1000,
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--jobs", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as files_dir:
+        env = _env(files_dir)
+        # Run a cold job first, so both runs start from a provisioned home folder
+        run_cold(1, env)
+        _report("cold", run_cold(args.jobs, env))
+        _report("warm", run_warm(args.jobs, env))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Stress the UI thread dispatcher in src/runnable.py, with many threads and an asyncio loop
+making calls on a stand-in activity, whose UI thread runs posted Runnables in order, as an
+Android Looper does.
+
+Checks that every call runs exactly once on the UI thread, in the order each thread made
+them, with its own arguments, and that each caller gets its own result or exception back.
+Exits with a non-zero status on failure.
+
+Usage: python scripts/benchmarks/ui_dispatcher_stress.py [--threads N] [--calls N]
+"""
+import argparse
+import asyncio
+import os
+import queue
+import sys
+import threading
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [
+    os.path.join(BENCHMARK_DIR, "stubs"),
+    os.path.join(BENCHMARK_DIR, "..", "..", "src"),
+]
+
+import runnable  # noqa: E402
+
+
+class Activity:
+    """
+    Stands in for PythonActivity.mActivity, with a UI thread of its own
+    """
+
+    def __init__(self):
+        self.posted = queue.Queue()
+        self.thread = threading.Thread(target=self.loop, name="ui", daemon=True)
+        self.thread.start()
+
+    def runOnUiThread(self, java_runnable):
+        self.posted.put(java_runnable)
+
+    def loop(self):
+        while True:
+            java_runnable = self.posted.get()
+            if java_runnable is None:
+                return
+            java_runnable.run()
+
+
+class Failed(Exception):
+    pass
+
+
+class Stress:
+    def __init__(self, activity, calls):
+        self.activity = activity
+        self.calls = calls
+        self.seen = {}
+        self.errors = []
+        # Repeatedly calling the same Runnable, as loadUrl is
+        self.load = runnable.Runnable(self.record)
+
+    def record(self, caller, i):
+        if threading.current_thread() is not self.activity.thread:
+            raise AssertionError("Called off the UI thread")
+        self.seen.setdefault(caller, []).append(i)
+        if i % 2 == 0:
+            raise Failed((caller, i))
+        return (caller, i)
+
+    def check(self, caller, i, result):
+        if result != (caller, i):
+            self.errors.append("{} {} got the result {}".format(caller, i, result))
+
+    def caller_thread(self, caller):
+        futures = [self.load(caller, i) for i in range(self.calls)]
+        for i, future in enumerate(futures):
+            try:
+                result = future.result(timeout=30)
+            except Failed as e:
+                result = e.args[0]
+            self.check(caller, i, result)
+
+    async def caller_async(self):
+        futures = [
+            runnable.dispatcher.submit_async(self.record, "async", i)
+            for i in range(self.calls)
+        ]
+        for i, future in enumerate(futures):
+            try:
+                result = await future
+            except Failed as e:
+                result = e.args[0]
+            self.check("async", i, result)
+
+    def check_order(self, callers):
+        for caller in callers:
+            if self.seen.get(caller) != list(range(self.calls)):
+                self.errors.append(
+                    "Calls by {} ran out of order, or not once".format(caller)
+                )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--calls", type=int, default=2000)
+    args = parser.parse_args()
+
+    # Half the calls raise, which the dispatcher logs
+    runnable.logger.disabled = True
+    activity = Activity()
+    runnable._PythonActivity.mActivity = activity
+    stress = Stress(activity, args.calls)
+
+    start = time.perf_counter()
+    threads = [
+        threading.Thread(target=stress.caller_thread, args=(caller,))
+        for caller in range(args.threads)
+    ]
+    for thread in threads:
+        thread.start()
+    asyncio.run(stress.caller_async())
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    stress.check_order(list(range(args.threads)) + ["async"])
+
+    print(
+        "{} calls from {} threads and asyncio, in {} UI thread hops, {:.2f}s".format(
+            (args.threads + 1) * args.calls,
+            args.threads,
+            runnable.dispatcher.hops,
+            elapsed,
+        )
+    )
+    if stress.errors:
+        print("\n".join(stress.errors[:20]))
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Stress the value store shared by the app's processes, with several processes writing,
+reading and racing to populate the same keys, while others are killed mid-commit.
+
+Checks that no committed value is lost or torn, and that racing get_or_set calls only
+compute a value once. Exits with a non-zero status on failure.
+
+Usage: python scripts/benchmarks/value_cache_stress.py [--processes N] [--commits N]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import signal
+import sys
+import tempfile
+import time
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "src")
+)
+
+import value_store  # noqa: E402
+from value_store import ValueStore  # noqa: E402
+
+# Compact often, so that compaction races with appends and reads
+value_store.COMPACT_AFTER = 8
+
+
+def writer(path, worker, commits, computed_path):
+    store = ValueStore(path, version="1")
+    for i in range(commits):
+        store.set_many(
+            {
+                "{}-a".format(worker): str(i),
+                "{}-b".format(worker): str(i),
+                "shared": "{}-{}".format(worker, i),
+            }
+        )
+        values = store.get_many(["{}-a".format(worker), "{}-b".format(worker)])
+        # Both keys were committed together, so must be read together
+        assert values == {"{}-a".format(worker): str(i), "{}-b".format(worker): str(i)}
+
+        def compute(i=i):
+            with open(computed_path, "a") as f:
+                f.write("{}\n".format(i))
+            return str(i)
+
+        store.get_or_set("once-{}".format(i), compute)
+
+
+def killed_writer(path):
+    store = ValueStore(path, version="1")
+    while True:
+        store.set("doomed", "x" * random.randint(1, 100000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--commits", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "store.log")
+        computed_path = os.path.join(temp_dir, "computed")
+        start = time.perf_counter()
+
+        workers = [
+            multiprocessing.Process(
+                target=writer, args=(path, worker, args.commits, computed_path)
+            )
+            for worker in range(args.processes)
+        ]
+        for process in workers:
+            process.start()
+
+        for _ in range(5):
+            doomed = multiprocessing.Process(target=killed_writer, args=(path,))
+            doomed.start()
+            time.sleep(random.random() / 10)
+            os.kill(doomed.pid, signal.SIGKILL)
+            doomed.join()
+
+        for process in workers:
+            process.join()
+        elapsed = time.perf_counter() - start
+
+        failed = any(process.exitcode != 0 for process in workers)
+        store = ValueStore(path, version="1")
+        last = str(args.commits - 1)
+        for worker in range(args.processes):
+            for key in ("a", "b"):
+                if store.get("{}-{}".format(worker, key)) != last:
+                    print("Lost the last commit for worker {}".format(worker))
+                    failed = True
+        with open(computed_path) as f:
+            computed = f.read().split()
+        if len(computed) != args.commits:
+            print(
+                "get_or_set computed {} values for {} keys".format(
+                    len(computed), args.commits
+                )
+            )
+            failed = True
+
+        print(
+            "{} processes, {} commits each, in {:.2f}s".format(
+                args.processes, args.commits, elapsed
+            )
+        )
+        if failed:
+            sys.exit(1)
+        print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Check that the value cache of the main process refreshes versioned values when the app is
+updated, and keeps them while it is not.
+
+Starts the main process against the jnius stand-in in stubs/ three times with the same files
+directory, first with version code 1, again with 1, then with 2 as after an update, and
+counts the Locale lookups each start makes to get the dummy user name. Exits with a
+non-zero status on failure.
+
+Usage: python scripts/benchmarks/value_cache_versions.py
+"""
+import json
+import subprocess
+import sys
+import tempfile
+
+from environment import app_env
+
+CHECK = """
+import json
+import sys
+
+from android_utils import get_dummy_user_name
+from android_utils import value_cache
+from jnius import calls
+
+get_dummy_user_name()
+json.dump(
+    {
+        "version": value_cache.version,
+        "locale_lookups": calls["java.util.Locale.getDefault"],
+    },
+    sys.stdout,
+)
+"""
+
+# (version code, Locale lookups expected)
+STARTS = (("1", 1), ("1", 0), ("2", 1))
+
+
+def main():
+    failed = False
+    with tempfile.TemporaryDirectory() as files_dir:
+        for version_code, expected in STARTS:
+            process = subprocess.run(
+                [sys.executable, "-c", CHECK],
+                env=app_env(files_dir, version_code=version_code),
+                cwd=files_dir,
+                stdout=subprocess.PIPE,
+                universal_newlines=True,
+                check=True,
+            )
+            result = json.loads(process.stdout)
+            print(
+                "version code {:<4} cache version {!r:<6} {} Locale lookups".format(
+                    version_code, result["version"], result["locale_lookups"]
+                )
+            )
+            if result["version"] != version_code:
+                print("The cache is not versioned by the version code")
+                failed = True
+            if result["locale_lookups"] != expected:
+                print("Expected {} Locale lookups".format(expected))
+                failed = True
+    if failed:
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
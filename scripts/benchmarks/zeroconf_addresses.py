@@ -0,0 +1,171 @@
+"""
+Compare walking the network interfaces over JNI each time zeroconf asks for the device's
+addresses, as monkey_patch_zeroconf used to, against the cached, change driven list.
+
+Simulates a day of Kolibri's zeroconf plugin, which checks the addresses every 5 seconds,
+with bursts of lookups for announcements, while the device moves between networks, some
+changes reported by Android, and some, like starting a hotspot, not. Reports the number of
+interface walks, and how many answers differed from a fresh walk, and for how long.
+
+Also checks that the cache recovers from failed walks, both the first one and one after a
+reported change. Exits with a non-zero status if it does not.
+
+Usage: python scripts/benchmarks/zeroconf_addresses.py [--hours N] [--changes N]
+"""
+import argparse
+import os
+import random
+import sys
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [
+    os.path.join(BENCHMARK_DIR, "stubs"),
+    os.path.join(BENCHMARK_DIR, "..", "..", "src"),
+]
+
+import kolibri  # noqa: E402,F401 (puts Kolibri's bundled zeroconf on the path)
+import jnius  # noqa: E402
+import monkey_patch_zeroconf  # noqa: E402
+
+WALK = "org.learningequality.NetworkUtils.getActiveIPv4Addresses"
+TICK = 5
+ANNOUNCEMENT_LOOKUPS = 6
+
+
+class Network:
+    """
+    The device's current addresses, and a simulated clock
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.addresses = ["192.168.1.20"]
+
+    def clock(self):
+        return self.now
+
+    def walk(self):
+        jnius.calls[WALK] += 1
+        return list(self.addresses)
+
+
+def events(hours, changes):
+    """
+    Returns (time, addresses, reported) for each change of network, in order
+    """
+    rng = random.Random(0)
+    result = []
+    for _ in range(changes):
+        at = rng.uniform(0, hours * 3600)
+        addresses = ["10.0.{}.{}".format(rng.randint(0, 9), rng.randint(2, 250))]
+        # One change in four is a hotspot starting or stopping, which is not reported
+        reported = rng.random() > 0.25
+        if not reported:
+            addresses.append("192.168.43.1")
+        result.append((at, addresses, reported))
+    return sorted(result)
+
+
+def run(name, lookup, network, cache, schedule, hours):
+    jnius.calls.clear()
+    pending = list(schedule)
+    wrong = 0
+    wrong_since = None
+    longest_wrong = 0
+    lookups = 0
+    while network.now < hours * 3600:
+        while pending and pending[0][0] <= network.now:
+            _, network.addresses, reported = pending.pop(0)
+            if reported and cache is not None:
+                cache.invalidate()
+        # A tick, and now and then an announcement
+        count = ANNOUNCEMENT_LOOKUPS if int(network.now) % 300 == 0 else 1
+        for _ in range(count):
+            lookups += 1
+            if lookup() != network.addresses:
+                wrong += 1
+                if wrong_since is None:
+                    wrong_since = network.now
+            elif wrong_since is not None:
+                longest_wrong = max(longest_wrong, network.now - wrong_since)
+                wrong_since = None
+        network.now += TICK
+    print(
+        "{:<10} {:>10} {:>10} {:>10} {:>14.0f}".format(
+            name, lookups, jnius.calls[WALK], wrong, longest_wrong
+        )
+    )
+
+
+def check_failing_walks():
+    """
+    Returns whether the cache walks again after a failed walk, rather than raising or
+    serving the addresses from before it
+    """
+    network = Network()
+    failing = True
+
+    def walk():
+        if failing:
+            raise RuntimeError("No network interfaces")
+        return network.walk()
+
+    def get():
+        try:
+            return cache.get()
+        except RuntimeError:
+            return None
+
+    cache = monkey_patch_zeroconf.AddressCache(fetch=walk, clock=network.clock)
+    # The first walk fails
+    answers = [get()]
+    failing = False
+    answers.append(get())
+    # The walk after a reported change fails
+    network.addresses = ["10.0.0.2"]
+    cache.invalidate()
+    failing = True
+    answers.append(get())
+    failing = False
+    answers.append(get())
+    print("failing walks: answered {}".format(answers))
+    return answers == [None, ["192.168.1.20"], None, ["10.0.0.2"]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--hours", type=float, default=24)
+    parser.add_argument("--changes", type=int, default=40)
+    args = parser.parse_args()
+
+    schedule = events(args.hours, args.changes)
+    print(
+        "{} hours, {} network changes, {} not reported".format(
+            args.hours,
+            args.changes,
+            sum(1 for _, _, reported in schedule if not reported),
+        )
+    )
+    print(
+        "{:<10} {:>10} {:>10} {:>10} {:>14}".format(
+            "", "lookups", "walks", "stale", "longest stale s"
+        )
+    )
+    network = Network()
+    run("uncached", network.walk, network, None, schedule, args.hours)
+
+    network = Network()
+    cache = monkey_patch_zeroconf.AddressCache(fetch=network.walk, clock=network.clock)
+    run("cached", cache.get, network, cache, schedule, args.hours)
+    print(
+        "cached: refreshed {refreshed} times, served {served} times".format(
+            **cache.report()
+        )
+    )
+    if not check_failing_walks():
+        print("The cache did not recover from a failed walk")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Summarize boot traces written by src/boot_trace.py, comparing boots by phase.
+
+Pull the traces from a device with e.g.:
+    adb pull /sdcard/Android/data/org.learningequality.Kolibri/files/KOLIBRI_DATA/boot_traces
+
+Then run:
+    python scripts/boot_trace_summary.py boot_traces [--role main] [--boots 5]
+"""
+import argparse
+import os
+import statistics
+from collections import OrderedDict
+
+
+def read_trace(path):
+    """
+    Returns the role, process start time and an ordered dict of phase name to
+    (start ms, duration ms, rss kB) for a trace file
+    """
+    phases = OrderedDict()
+    role = None
+    started = 0.0
+    with open(path) as f:
+        for line in f:
+            if line.startswith("#"):
+                role, _, started = line[1:].split()
+                started = float(started)
+                continue
+            try:
+                name, start, duration, rss = line.rstrip("\n").split("\t")
+            except ValueError:
+                # Ignore lines torn by the process being killed mid-write
+                continue
+            # Phases can repeat, e.g. jobs run by a warm task worker, so number them
+            key = name
+            count = 1
+            while key in phases:
+                count += 1
+                key = "{} #{}".format(name, count)
+            phases[key] = (float(start), float(duration), int(rss))
+    return role, started, phases
+
+
+def find_traces(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith(".tsv"):
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+
+def summarize(traces, boots):
+    traces = sorted(traces, key=lambda trace: trace[1])[-boots:]
+    names = []
+    for _, _, phases in traces:
+        for name in phases:
+            if name not in names:
+                names.append(name)
+
+    width = max(len(name) for name in names + ["phase"])
+
+    def print_row(cells):
+        print(
+            "  ".join(
+                [cells[0].ljust(width)] + ["{:>10}".format(cell) for cell in cells[1:]]
+            )
+        )
+
+    print_row(
+        ["phase", "median"] + ["boot {}".format(i + 1) for i in range(len(traces))]
+    )
+    for name in names:
+        durations = [
+            phases[name][1] if name in phases else None for _, _, phases in traces
+        ]
+        present = [d for d in durations if d is not None]
+        row = [name, "{:.1f}".format(statistics.median(present))]
+        row += ["-" if d is None else "{:.1f}".format(d) for d in durations]
+        print_row(row)
+
+    # The end of the last phase, and memory at that point, for each boot
+    totals = ["end", ""]
+    rss = ["rss kB", ""]
+    for _, _, phases in traces:
+        start, duration, last_rss = next(reversed(phases.values()), (0, 0, 0))
+        totals.append("{:.1f}".format(start + duration))
+        rss.append(str(last_rss))
+    print_row(totals)
+    print_row(rss)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("paths", nargs="+", help="Trace files or directories")
+    parser.add_argument("--role", help="Only include this process role")
+    parser.add_argument(
+        "--boots", type=int, default=5, help="Number of most recent boots to compare"
+    )
+    args = parser.parse_args()
+
+    by_role = {}
+    for path in find_traces(args.paths):
+        role, started, phases = read_trace(path)
+        if phases and (args.role is None or role == args.role):
+            by_role.setdefault(role, []).append((role, started, phases))
+
+    for role, traces in sorted(by_role.items()):
+        print("\n{} (durations in ms)".format(role))
+        summarize(traces, args.boots)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Add a manifest of the content hash of each file to the bundles that the app extracts on
+first launch after an update, so that BundleUpdate.java only writes the files that changed.
+
+The manifest is added as the first entry of each gzipped tar, named `bundle.manifest`, with
+a sha256 hash and a path on each line, separated by a tab. Bundles that already have one
+have it replaced.
+
+The Makefile runs this on the bundles p4a builds for the app, once it has built them:
+    python scripts/bundle_manifest.py python-for-android/dists/kolibri/src/main/assets/private.tar \
+        python-for-android/dists/kolibri/libs/*/libpybundle.so
+"""
+import argparse
+import hashlib
+import io
+import os
+import tarfile
+
+MANIFEST_ENTRY = "bundle.manifest"
+
+
+def entry_path(name):
+    while name.startswith("./"):
+        name = name[2:]
+    return name
+
+
+def build_manifest(tar):
+    """
+    Returns the manifest for the files in an open tar, as bytes
+    """
+    lines = []
+    for member in tar:
+        path = entry_path(member.name)
+        if not member.isfile() or path == MANIFEST_ENTRY:
+            continue
+        digest = hashlib.sha256()
+        f = tar.extractfile(member)
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+        lines.append("{}\t{}\n".format(digest.hexdigest(), path))
+    return "".join(sorted(lines, key=lambda line: line.split("\t", 1)[1])).encode()
+
+
+def add_manifest(path):
+    """
+    Rewrites the gzipped tar at path, with its manifest first, and returns the number of
+    files in it
+    """
+    with tarfile.open(path, "r:gz") as tar:
+        manifest = build_manifest(tar)
+    temp_path = path + ".tmp"
+    # p4a writes the bundles in the ustar format, which the Java tar reader supports
+    with tarfile.open(path, "r:gz") as tar, tarfile.open(
+        temp_path, "w:gz", format=tarfile.USTAR_FORMAT
+    ) as out:
+        info = tarfile.TarInfo(MANIFEST_ENTRY)
+        info.size = len(manifest)
+        out.addfile(info, io.BytesIO(manifest))
+        for member in tar:
+            if entry_path(member.name) == MANIFEST_ENTRY:
+                continue
+            out.addfile(member, tar.extractfile(member) if member.isfile() else None)
+    os.replace(temp_path, path)
+    return manifest.count(b"\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("bundles", nargs="+", help="gzipped tars to add manifests to")
+    args = parser.parse_args()
+    for path in args.bundles:
+        print("Added a manifest of {} files to {}".format(add_manifest(path), path))
+
+
+if __name__ == "__main__":
+    main()
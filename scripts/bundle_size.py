@@ -0,0 +1,390 @@
+"""
+Report what an unpacked Kolibri tarball adds to the app, and propose blocklist.txt entries
+for what the app never uses.
+
+Sizes are reported by package and by file type, for the files that the app ships, after
+blocklist.txt and allowlist.txt are applied as p4a applies them, and for those it leaves
+out. Modules are compared against import traces, of the modules imported by the entry
+points and by test runs, and two kinds of entries are proposed:
+
+- packages none of whose modules were imported in any trace, apart from the migrations,
+  management commands and template tags of packages that were
+- the locale directories of Kolibri's dependencies, for languages that Kolibri does not
+  support
+
+Entries that would leave out a file that allowlist.txt keeps are narrowed to the parts of
+the package that do not hold one. The proposal is printed as a diff of blocklist.txt, with
+the bytes each entry saves, for review: a package missing from the traces may still be
+imported by code paths they did not cover.
+
+An import trace is a text file of module names, one per line. Record them with the `trace`
+command, which runs a command with every python process it starts writing the modules it
+imported as it exits, e.g. for the entry points and Kolibri's tests:
+    python scripts/bundle_size.py trace traces -- python scripts/benchmarks/eager_imports.py
+    python scripts/bundle_size.py trace traces -- pytest kolibri
+On a device, print the names in `sys.modules` from the remote shell.
+
+Then run:
+    python scripts/bundle_size.py analyze tar/patched traces [--min-kb 20]
+"""
+import argparse
+import difflib
+import json
+import os
+import subprocess
+import sys
+import tarfile
+import tempfile
+from collections import defaultdict
+
+from bytecode_bundle import ALLOWLIST
+from bytecode_bundle import BLOCKLIST
+from bytecode_bundle import DIST
+from bytecode_bundle import LISTED_DIRECTORIES
+from bytecode_bundle import matches
+from bytecode_bundle import module_name
+from bytecode_bundle import REPO_DIR
+
+BLOCKLIST_PATH = os.path.join(REPO_DIR, "blocklist.txt")
+
+# What install-tar leaves out when it extracts the tarball
+INSTALL_TAR_EXCLUDES = (
+    "kolibri/dist/py2only",
+    "kolibri/dist/cext",
+    "kolibri/dist/ifaddr",
+)
+
+# Written into a directory put first on PYTHONPATH, so every python process loads it
+SITECUSTOMIZE = """
+import atexit
+import os
+import sys
+
+
+def _write_import_trace():
+    path = os.path.join({trace_dir!r}, "{{}}.txt".format(os.getpid()))
+    with open(path, "w") as f:
+        f.write("\\n".join(sorted(sys.modules)) + "\\n")
+
+
+atexit.register(_write_import_trace)
+"""
+
+
+def is_listed(path):
+    return any(listed in "/" + path + "/" for listed in LISTED_DIRECTORIES)
+
+
+def format_size(size):
+    for unit in ("B", "KB", "MB"):
+        if abs(size) < 1024:
+            return "{:.0f} {}".format(size, unit)
+        size /= 1024.0
+    return "{:.1f} GB".format(size)
+
+
+def find_root(path, temp_dir):
+    """
+    Returns the directory holding the `kolibri` package, unpacking the tarball at path
+    into temp_dir if it is not a directory
+    """
+    if not os.path.isdir(path):
+        with tarfile.open(path) as tar:
+            tar.extractall(temp_dir)
+        path = temp_dir
+    for root, dirs, files in os.walk(path):
+        if os.path.isfile(os.path.join(root, "kolibri", "__init__.py")):
+            return root
+        # Don't look inside packages
+        dirs[:] = [name for name in dirs if name != "kolibri"]
+    raise SystemExit("No kolibri package found in {}".format(path))
+
+
+def read_traces(paths):
+    imported = set()
+    for path in paths:
+        files = [path]
+        if os.path.isdir(path):
+            files = [os.path.join(path, name) for name in sorted(os.listdir(path))]
+        for filename in files:
+            with open(filename) as f:
+                imported.update(
+                    line.strip() for line in f if line.strip() and line[0] != "#"
+                )
+    return imported
+
+
+class File(object):
+    __slots__ = ("path", "size", "allowed", "shipped", "module", "imported")
+
+    def __init__(self, path, size, imported_names):
+        self.path = path
+        self.size = size
+        # As p4a compiles it, before matching it against the lists
+        bundle_path = path + "c" if path.endswith(".py") else path
+        self.allowed = matches(ALLOWLIST, bundle_path)
+        self.shipped = self.allowed or not matches(BLOCKLIST, bundle_path)
+        self.module = path.endswith(".py")
+        names = {module_name(path)}
+        if path.startswith(DIST + "/"):
+            names.add(module_name(os.path.relpath(path, DIST)))
+        self.imported = self.module and bool(names & imported_names)
+
+    @property
+    def discovered(self):
+        """
+        Whether Django finds the module by listing its directory, rather than by import,
+        so it may only be imported when running commands or migrations
+        """
+        return self.path.endswith("/management/__init__.py") or is_listed(self.path)
+
+    @property
+    def file_type(self):
+        name = os.path.basename(self.path)
+        return os.path.splitext(name)[1].lower() or "(none)"
+
+
+def read_files(root, imported_names):
+    files = []
+    for directory, dirs, names in os.walk(os.path.join(root, "kolibri")):
+        dirs[:] = [name for name in dirs if name != "__pycache__"]
+        for name in names:
+            path = os.path.relpath(os.path.join(directory, name), root)
+            path = path.replace(os.sep, "/")
+            if path.startswith(INSTALL_TAR_EXCLUDES) or name.endswith(".pyc"):
+                continue
+            size = os.path.getsize(os.path.join(directory, name))
+            files.append(File(path, size, imported_names))
+    return files
+
+
+def package_of(path):
+    parts = path.split("/")
+    if path.startswith(DIST + "/"):
+        return "/".join(parts[:3])
+    return "/".join(parts[: min(3, len(parts) - 1)])
+
+
+def report_sizes(files, key, title):
+    shipped = defaultdict(int)
+    left_out = defaultdict(int)
+    modules = defaultdict(int)
+    imported = defaultdict(int)
+    for f in files:
+        if f.shipped:
+            shipped[key(f)] += f.size
+            modules[key(f)] += f.module
+            imported[key(f)] += f.imported
+        else:
+            left_out[key(f)] += f.size
+    print(
+        "{:<45} {:>10} {:>10} {:>8} {:>8}".format(
+            title, "shipped", "left out", "modules", "imported"
+        )
+    )
+    for name in sorted(set(shipped) | set(left_out), key=lambda name: -shipped[name]):
+        print(
+            "{:<45} {:>10} {:>10} {:>8} {:>8}".format(
+                name,
+                format_size(shipped[name]),
+                format_size(left_out[name]),
+                modules[name],
+                imported[name],
+            )
+        )
+    print()
+
+
+class Directory(object):
+    def __init__(self):
+        self.children = {}
+        self.files = []
+
+    def walk(self):
+        yield self
+        for child in self.children.values():
+            yield from child.walk()
+
+    def all_files(self):
+        for directory in self.walk():
+            yield from directory.files
+
+
+def build_tree(files):
+    tree = Directory()
+    for f in files:
+        node = tree
+        for part in f.path.split("/")[:-1]:
+            node = node.children.setdefault(part, Directory())
+        node.files.append(f)
+    return tree
+
+
+def unused_packages(node, path, min_size):
+    """
+    Yields the largest packages whose modules were never imported, with their size
+    """
+    files = list(node.all_files())
+    shipped = [f for f in files if f.shipped]
+    modules = [f for f in shipped if f.module]
+    # Locale packages are only imported for their language, so are proposed by language
+    if not shipped or path.endswith("/locale"):
+        return
+    if (
+        any(f.path == path + "/__init__.py" for f in node.files)
+        and not is_listed(path)
+        and any(not f.discovered for f in modules)
+        and not any(f.imported for f in modules)
+        and not any(f.allowed for f in files)
+    ):
+        size = sum(f.size for f in shipped)
+        if size >= min_size:
+            yield path, size
+        return
+    for name, child in sorted(node.children.items()):
+        yield from unused_packages(child, path + "/" + name, min_size)
+
+
+def supported_languages(root):
+    with open(os.path.join(root, "kolibri", "locale", "language_info.json")) as f:
+        languages = json.load(f)
+    return {language["intl_code"].split("-")[0].lower() for language in languages}
+
+
+def unused_locales(tree, root, min_size):
+    """
+    Yields the locale directories of Kolibri's dependencies for languages that Kolibri
+    does not support, with their size
+    """
+    languages = supported_languages(root)
+    dist = tree
+    for part in DIST.split("/"):
+        dist = dist.children.get(part, Directory())
+    stack = [(DIST, dist)]
+    while stack:
+        path, node = stack.pop()
+        for name, child in sorted(node.children.items()):
+            if name != "locale":
+                stack.append((path + "/" + name, child))
+                continue
+            for language, locale in sorted(child.children.items()):
+                # Django falls back from a language variant to the language
+                if language.split("_")[0].lower() in languages:
+                    continue
+                files = list(locale.all_files())
+                if any(f.allowed for f in files):
+                    continue
+                size = sum(f.size for f in files if f.shipped)
+                if size >= min_size:
+                    yield "{}/locale/{}".format(path, language), size
+
+
+def propose(tree, root, min_size):
+    packages = list(unused_packages(tree.children["kolibri"], "kolibri", min_size))
+    locales = [
+        (path, size)
+        for path, size in unused_locales(tree, root, min_size)
+        if not any(path.startswith(package + "/") for package, _ in packages)
+    ]
+    proposals = [
+        ("No modules imported", packages),
+        ("Locales for languages Kolibri does not support", locales),
+    ]
+    with open(BLOCKLIST_PATH) as f:
+        current = f.read().splitlines(True)
+    proposed = list(current)
+    total = 0
+    for title, entries in proposals:
+        if not entries:
+            continue
+        size = sum(size for _, size in entries)
+        total += size
+        proposed.append("\n")
+        proposed.append("# {}, saving {}\n".format(title, format_size(size)))
+        for path, size in entries:
+            proposed.append("{}/*\n".format(path))
+    sys.stdout.writelines(
+        difflib.unified_diff(current, proposed, "a/blocklist.txt", "b/blocklist.txt")
+    )
+    print()
+    for title, entries in proposals:
+        for path, size in sorted(entries, key=lambda entry: -entry[1]):
+            print("{:>10}  {}/*".format(format_size(size), path))
+    print("{:>10}  in total".format(format_size(total)))
+
+
+def unimported_modules(files, limit):
+    unimported = [
+        f
+        for f in files
+        if f.shipped and f.module and not f.imported and not f.discovered
+    ]
+    print(
+        "{} of {} shipped modules never imported, {}; the largest:".format(
+            len(unimported),
+            sum(1 for f in files if f.shipped and f.module),
+            format_size(sum(f.size for f in unimported)),
+        )
+    )
+    for f in sorted(unimported, key=lambda f: -f.size)[:limit]:
+        print("{:>10}  {}".format(format_size(f.size), f.path))
+    print()
+
+
+def analyze(args):
+    imported = read_traces(args.traces)
+    if not imported:
+        raise SystemExit("No imported modules found in {}".format(args.traces))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        root = find_root(args.kolibri, temp_dir)
+        files = read_files(root, imported)
+        report_sizes(files, lambda f: package_of(f.path), "package")
+        report_sizes(files, lambda f: f.file_type, "file type")
+        unimported_modules(files, args.limit)
+        propose(build_tree(files), root, args.min_kb * 1024)
+
+
+def trace(args):
+    command = args.command
+    if command and command[0] == "--":
+        command = command[1:]
+    os.makedirs(args.trace_dir, exist_ok=True)
+    with tempfile.TemporaryDirectory() as site_dir:
+        with open(os.path.join(site_dir, "sitecustomize.py"), "w") as f:
+            f.write(SITECUSTOMIZE.format(trace_dir=os.path.abspath(args.trace_dir)))
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(
+            [site_dir] + ([env["PYTHONPATH"]] if env.get("PYTHONPATH") else [])
+        )
+        sys.exit(subprocess.call(command, env=env))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    commands = parser.add_subparsers(dest="action", required=True)
+    analyze_parser = commands.add_parser("analyze", help="Report sizes and proposals")
+    analyze_parser.add_argument(
+        "kolibri", help="An unpacked Kolibri tarball, such as tar/patched, or a tarball"
+    )
+    analyze_parser.add_argument(
+        "traces", nargs="+", help="Import trace files, or directories of them"
+    )
+    analyze_parser.add_argument(
+        "--min-kb", type=int, default=20, help="The smallest entry to propose"
+    )
+    analyze_parser.add_argument(
+        "--limit", type=int, default=20, help="How many unimported modules to list"
+    )
+    analyze_parser.set_defaults(func=analyze)
+    trace_parser = commands.add_parser("trace", help="Record import traces")
+    trace_parser.add_argument("trace_dir", help="The directory to write traces to")
+    trace_parser.add_argument("command", nargs=argparse.REMAINDER)
+    trace_parser.set_defaults(func=trace)
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Build the bytecode bundle that src/bytecode_importer.py imports Kolibri's modules from.
+
+Run with the python that the app bundles, on the directory Kolibri is installed in before
+p4a compiles it into the python bundle, as the Kolibri recipe does when BYTECODE_BUNDLE is
+set. Compiles each module of the `kolibri` package into `kolibri.bytecode` in that
+directory, and deletes its source, so that p4a does not also ship it as a .pyc file.
+
+Modules are compiled with docstrings and asserts stripped, as p4a does, except that modules
+that refer to `__doc__` keep their docstrings. Modules that Django finds by listing their
+directory, namely migrations, management commands and template tags, are left for p4a to
+compile, as are modules in namespace packages, and any that fail to compile. So are modules
+that blocklist.txt excludes from the app, for p4a to leave out as before.
+
+Usage: python scripts/bytecode_bundle.py <install dir>
+"""
+import argparse
+import marshal
+import os
+import sys
+from fnmatch import fnmatch
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(REPO_DIR, "src"))
+
+from bytecode_importer import BUNDLE_FILENAME  # noqa: E402
+from bytecode_importer import BUNDLE_FORMAT  # noqa: E402
+from bytecode_importer import HEADER  # noqa: E402
+from bytecode_importer import MAGIC_NUMBER  # noqa: E402
+
+PACKAGE = "kolibri"
+# Kolibri puts this on sys.path, so its modules are also imported by their own names
+DIST = os.path.join("kolibri", "dist")
+
+# Directories whose modules Django finds by listing the directory
+LISTED_DIRECTORIES = (
+    os.sep + "migrations" + os.sep,
+    os.sep + os.path.join("management", "commands") + os.sep,
+    os.sep + "templatetags" + os.sep,
+)
+
+
+def read_patterns(filename):
+    with open(os.path.join(REPO_DIR, filename)) as f:
+        lines = (line.strip() for line in f)
+        return [line for line in lines if line and not line.startswith("#")]
+
+
+BLOCKLIST = read_patterns("blocklist.txt")
+ALLOWLIST = read_patterns("allowlist.txt")
+
+
+def matches(patterns, path):
+    # As p4a matches them against the paths in the python bundle
+    for pattern in patterns:
+        if pattern.startswith("^"):
+            pattern = pattern[1:]
+        else:
+            pattern = "*/" + pattern
+        if fnmatch("_python_bundle/site-packages/" + path, pattern):
+            return True
+    return False
+
+
+def is_blocked(path):
+    pyc_path = path + "c"
+    return matches(BLOCKLIST, pyc_path) and not matches(ALLOWLIST, pyc_path)
+
+
+def is_package_dir(install_dir, directory):
+    return os.path.isfile(os.path.join(install_dir, directory, "__init__.py"))
+
+
+def module_name(path):
+    parts = os.path.splitext(path)[0].split(os.sep)
+    if parts[-1] == "__init__":
+        parts.pop()
+    return ".".join(parts)
+
+
+def bundled_modules(install_dir):
+    """
+    Yields the paths of the modules to bundle, relative to the install dir
+    """
+    for root, dirs, files in os.walk(os.path.join(install_dir, PACKAGE)):
+        directory = os.path.relpath(root, install_dir)
+        if not is_package_dir(install_dir, directory):
+            # A namespace package or a data directory, which p4a may still need to find
+            dirs[:] = []
+            continue
+        dirs[:] = [name for name in dirs if name != "__pycache__"]
+        for name in sorted(files):
+            path = os.path.join(directory, name)
+            if (
+                not name.endswith(".py")
+                or any(listed in os.sep + path for listed in LISTED_DIRECTORIES)
+                or is_blocked(path)
+            ):
+                continue
+            yield path
+
+
+def compile_module(install_dir, path):
+    with open(os.path.join(install_dir, path), "rb") as f:
+        source = f.read()
+    # Docstrings are stripped where nothing reads them
+    optimize = 1 if b"__doc__" in source else 2
+    return compile(
+        source,
+        os.path.join(install_dir, path),
+        "exec",
+        dont_inherit=True,
+        optimize=optimize,
+    )
+
+
+def names(path):
+    """
+    Yields the names a module is imported by, with the sys.path entry each is under
+    """
+    yield module_name(path), ""
+    if path.startswith(DIST + os.sep):
+        name = module_name(os.path.relpath(path, DIST))
+        if name:
+            yield name, DIST
+
+
+def build_bundle(install_dir):
+    """
+    Writes the bundle, deletes the sources of the modules in it, and returns their number
+    """
+    index = {}
+    code = []
+    offset = 0
+    bundled = []
+    for path in bundled_modules(install_dir):
+        try:
+            data = marshal.dumps(compile_module(install_dir, path))
+        except (SyntaxError, ValueError) as e:
+            print("Leaving {} out of the bundle: {}".format(path, e))
+            continue
+        # Where p4a would have put the .pyc file
+        pyc_path = path + "c"
+        for name, entry in names(path):
+            # Offsets are from the end of the index
+            index[name] = (offset, len(data), pyc_path, entry)
+        code.append(data)
+        offset += len(data)
+        bundled.append(path)
+
+    index_data = marshal.dumps(index)
+    bundle_path = os.path.join(install_dir, BUNDLE_FILENAME)
+    with open(bundle_path + ".tmp", "wb") as f:
+        f.write(HEADER.pack(BUNDLE_FORMAT, MAGIC_NUMBER, len(index_data)))
+        f.write(index_data)
+        for data in code:
+            f.write(data)
+    os.replace(bundle_path + ".tmp", bundle_path)
+
+    for path in bundled:
+        os.remove(os.path.join(install_dir, path))
+    return len(bundled)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("install_dir")
+    args = parser.parse_args()
+    count = build_bundle(args.install_dir)
+    print(
+        "Bundled the bytecode of {} modules into {}".format(
+            count, os.path.join(args.install_dir, BUNDLE_FILENAME)
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
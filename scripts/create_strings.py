@@ -1,10 +1,14 @@
 """
 Tooling for generating i18n strings using Kolibri's translation machinery.
 """
+import hashlib
+import io
 import json
 import os
 import tempfile
 import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from importlib import resources
 
 from version import apk_version
@@ -30,74 +34,91 @@ XML_TEMPLATE = """
 DEFAULT_LANGUAGE = "en"
 
 
-def generate_loading_pages(output_dir):
+@lru_cache(maxsize=None)
+def _initialize():
+    from kolibri.main import initialize
+
+    initialize(skip_update=True)
+
+
+def generate_loading_pages(output_dir, version_text):
     """
     Run the Django management command to generate the loading pages.
     """
     # Add the local Kolibri source directory to the path
 
-    from kolibri.main import initialize
-    from django.core.management import call_command
+    _initialize()
 
-    initialize(skip_update=True)
+    from django.core.management import call_command
 
     call_command(
         "loadingpage",
         "--output-dir",
         output_dir,
         "--version-text",
-        apk_version().replace("-official", ""),
+        version_text,
     )
 
 
+def _messages_dir(locale):
+    return resources.files("kolibri") / "locale" / locale / "LC_MESSAGES"
+
+
+@lru_cache(maxsize=None)
+def _english_index():
+    """
+    Maps each English message in Kolibri's frontend message files to the message file and
+    key it is first found under in each file, so that they are only read once per run.
+    """
+    index = {}
+    for message_file in os.listdir(_messages_dir("en")):
+        if message_file.endswith(".json"):
+            with open(_messages_dir("en") / message_file, "r") as f:
+                messages = json.load(f)
+            found = set()
+            for key, value in messages.items():
+                if value not in found:
+                    found.add(value)
+                    index.setdefault(value, []).append((message_file, key))
+    return index
+
+
+@lru_cache(maxsize=None)
+def _messages(locale, message_file):
+    """
+    The messages of a message file in a language, or None if it has no such file
+    """
+    try:
+        with open(_messages_dir(locale) / message_file, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
 def _find_string(lang, string):
-    from kolibri.main import initialize
+    _initialize()
+
     from django.utils.translation import override
     from django.utils.translation import ugettext as _
     from django.utils.translation import to_locale
 
-    initialize(skip_update=True)
-
     with override(lang):
         new_string = _(string)
         if new_string != string and new_string:
             return new_string
 
-    for message_file in os.listdir(
-        resources.files("kolibri") / "locale" / "en" / "LC_MESSAGES"
-    ):
-        if message_file.endswith(".json"):
-            with open(
-                resources.files("kolibri")
-                / "locale"
-                / "en"
-                / "LC_MESSAGES"
-                / message_file,
-                "r",
-            ) as f:
-                messages = json.load(f)
-                for key, value in messages.items():
-                    if value == string:
-                        try:
-                            # Do this in case we have a legacy translation file - this should be cleaned up
-                            # in a future version of Kolibri
-                            with open(
-                                resources.files("kolibri")
-                                / "locale"
-                                / to_locale(lang)
-                                / "LC_MESSAGES"
-                                / message_file,
-                                "r",
-                            ) as lang_message_file:
-                                messages = json.load(lang_message_file)
-                                new_string = messages[key]
-                                if new_string != string and new_string:
-                                    return new_string
-                                # If we have a translation but the string is no different in translation, it means we should
-                                # not include it in the strings.xml file
-                                return None
-                        except FileNotFoundError:
-                            break
+    for message_file, key in _english_index().get(string, []):
+        # Do this in case we have a legacy translation file - this should be cleaned up
+        # in a future version of Kolibri
+        messages = _messages(to_locale(lang), message_file)
+        if messages is None:
+            continue
+        new_string = messages[key]
+        if new_string != string and new_string:
+            return new_string
+        # If we have a translation but the string is no different in translation, it means we should
+        # not include it in the strings.xml file
+        return None
     return None
 
 
@@ -107,96 +128,229 @@ PYTHON_ONLY_STRINGS = [
 ]
 
 
-def create_resource_files(output_dir):  # noqa: C901
-    """
-    Read each language directory and create resource files in the corresponding Android values folder.
-    """
-    en_strings_file = os.path.join(
-        os.path.dirname(__file__),
-        "../python-for-android/dists/kolibri/src/main/res/values/strings.xml",
-    )
+RES_DIR = os.path.join(
+    os.path.dirname(__file__), "../python-for-android/dists/kolibri/src/main/res"
+)
 
-    en_strings_tree = ET.parse(en_strings_file)
+EN_STRINGS_FILE = os.path.join(RES_DIR, "values", "strings.xml")
 
-    en_strings_root = en_strings_tree.getroot()
+# The per language catalogs of the strings that src/i18n.py looks up
+PYTHON_STRINGS_DIR = os.path.join(os.path.dirname(__file__), "../src/i18n_strings")
+
+# Where all languages' strings were generated into a single module before
+LEGACY_PYTHON_STRINGS_FILE = os.path.join(
+    os.path.dirname(__file__), "../src/strings.py"
+)
+
+# Records the inputs a language's resource files were generated from, so that languages
+# whose inputs have not changed are skipped. A dotfile, so that Android ignores it.
+STAMP_FILENAME = ".create_strings_stamp"
 
-    all_langs = list(os.listdir(output_dir))
 
-    for lang_dir in all_langs:
-        if lang_dir == DEFAULT_LANGUAGE:
-            dir_name = "values"
+def _values_dir(lang_dir):
+    if lang_dir == DEFAULT_LANGUAGE:
+        return os.path.join(RES_DIR, "values")
+    if lang_dir in locale_code_map:
+        locale_dir = locale_code_map[lang_dir]
+    else:
+        parts = lang_dir.split("-")
+        if len(parts) == 1:
+            locale_dir = lang_dir
+        elif len(parts) == 2:
+            locale_dir = f"{parts[0]}-r{parts[1].upper()}"
         else:
-            if lang_dir in locale_code_map:
-                locale_dir = locale_code_map[lang_dir]
-            else:
-                parts = lang_dir.split("-")
-                if len(parts) == 1:
-                    locale_dir = lang_dir
-                elif len(parts) == 2:
-                    locale_dir = f"{parts[0]}-r{parts[1].upper()}"
-                else:
-                    raise ValueError(f"Invalid language code: {lang_dir}")
-            dir_name = f"values-{locale_dir}"
-
-        values_dir = os.path.join(
-            os.path.dirname(__file__),
-            "../python-for-android/dists/kolibri/src/main/res",
-            dir_name,
-        )
+            raise ValueError(f"Invalid language code: {lang_dir}")
+    return os.path.join(RES_DIR, f"values-{locale_dir}")
 
-        os.makedirs(values_dir, exist_ok=True)
 
-        with open(os.path.join(output_dir, lang_dir, "loading.html"), "r") as f:
-            html_content = f.read().replace("'", "\\'").replace('"', '\\"')
+def _outputs(lang_dir):
+    values_dir = _values_dir(lang_dir)
+    outputs = [os.path.join(values_dir, "html_content.xml")]
+    if lang_dir != DEFAULT_LANGUAGE:
+        outputs.append(os.path.join(values_dir, "strings.xml"))
+    return outputs
 
-        xml_content = XML_TEMPLATE.format(html_content)
 
-        with open(os.path.join(values_dir, "html_content.xml"), "w") as f:
-            f.write(xml_content)
+def _write_if_changed(path, content):
+    """
+    Write the file only if its content would change, so that Gradle does not recompile
+    resources that are unchanged. Returns whether it was written.
+    """
+    content = content.encode("utf-8")
+    try:
+        with open(path, "rb") as f:
+            if hashlib.sha256(f.read()).digest() == hashlib.sha256(content).digest():
+                return False
+    except FileNotFoundError:
+        pass
+    with open(path + ".tmp", "wb") as f:
+        f.write(content)
+    os.replace(path + ".tmp", path)
+    return True
+
+
+def _hash_messages_dir(sha, locale):
+    messages_dir = _messages_dir(locale)
+    if not messages_dir.is_dir():
+        return
+    for message_file in sorted(os.listdir(messages_dir)):
+        sha.update(message_file.encode("utf-8"))
+        with open(messages_dir / message_file, "rb") as f:
+            sha.update(f.read())
+
+
+def _stamp(lang_dir, version_text):
+    """
+    A hash of everything a language's resource files are generated from: the Kolibri version
+    and app version shown on the loading page, Kolibri's message catalogs for the language
+    and for English, the English strings.xml, and this script, which holds the template.
+    """
+    # Imported first, as it puts the Django it bundles on the path
+    import kolibri
+    from django.utils.translation import to_locale
 
-        if lang_dir == DEFAULT_LANGUAGE:
-            continue
+    sha = hashlib.sha256()
+    sha.update(kolibri.__version__.encode("utf-8"))
+    sha.update(version_text.encode("utf-8"))
+    _hash_messages_dir(sha, "en")
+    _hash_messages_dir(sha, to_locale(lang_dir))
+    for path in (EN_STRINGS_FILE, __file__):
+        with open(path, "rb") as f:
+            sha.update(f.read())
+    return sha.hexdigest()
+
+
+def _is_up_to_date(lang_dir, stamp):
+    try:
+        with open(os.path.join(_values_dir(lang_dir), STAMP_FILENAME), "r") as f:
+            if f.read() != stamp:
+                return False
+    except FileNotFoundError:
+        return False
+    return all(os.path.exists(path) for path in _outputs(lang_dir))
+
+
+def create_language_resource_files(output_dir, lang_dir, en_strings, stamp):
+    """
+    Create the resource files of a language in its Android values folder, and return the
+    number of files that changed.
+    """
+    values_dir = _values_dir(lang_dir)
+    os.makedirs(values_dir, exist_ok=True)
+    html_content_file, *strings_file = _outputs(lang_dir)
+
+    with open(os.path.join(output_dir, lang_dir, "loading.html"), "r") as f:
+        html_content = f.read().replace("'", "\\'").replace('"', '\\"')
 
+    changed = _write_if_changed(html_content_file, XML_TEMPLATE.format(html_content))
+
+    if strings_file:
         new_root = ET.Element("resources")
         new_tree = ET.ElementTree(element=new_root)
 
-        for string in en_strings_root.findall("string"):
-            name = string.get("name")
-            value = _find_string(lang_dir, string.text)
+        for name, text in en_strings:
+            value = _find_string(lang_dir, text)
             if value is None:
                 continue
             new_string = ET.SubElement(new_root, "string", attrib={"name": name})
             new_string.text = value
 
-        new_tree.write(
-            os.path.join(values_dir, "strings.xml"),
-            encoding="utf-8",
-            xml_declaration=True,
+        content = io.BytesIO()
+        new_tree.write(content, encoding="utf-8", xml_declaration=True)
+        changed += _write_if_changed(
+            strings_file[0], content.getvalue().decode("utf-8")
         )
 
-    # Create the Python strings file
-    output = "# This file is auto-generated by the create_strings.py script. Do not edit it directly."
-    output += "\ni18n_strings = {"
-    for python_string in PYTHON_ONLY_STRINGS:
-        output += "\n    " + f"'{python_string}': " + "{"
-        for lang_dir in all_langs:
+    # Written last, so that an interrupted run is redone
+    with open(os.path.join(values_dir, STAMP_FILENAME), "w") as f:
+        f.write(stamp)
+    return changed
+
+
+def create_python_strings_files(langs):
+    """
+    Create a compact JSON catalog for each language, of the translations of the Python only
+    strings, for src/i18n.py to load only the language it needs.
+    """
+    os.makedirs(PYTHON_STRINGS_DIR, exist_ok=True)
+    filenames = set()
+    for lang_dir in langs:
+        catalog = {}
+        for python_string in PYTHON_ONLY_STRINGS:
             value = _find_string(lang_dir, python_string)
-            if value is None:
-                continue
-            output += f"\n        '{lang_dir}': '{value}', "
-        output += "\n    },"
-    output += "\n}\n"
-    with open(os.path.join(os.path.dirname(__file__), "../src/strings.py"), "w") as f:
-        f.write(output)
+            if value is not None:
+                catalog[python_string] = value
+        if not catalog:
+            continue
+        filename = f"{lang_dir}.json"
+        filenames.add(filename)
+        _write_if_changed(
+            os.path.join(PYTHON_STRINGS_DIR, filename),
+            json.dumps(
+                catalog, ensure_ascii=False, separators=(",", ":"), sort_keys=True
+            ),
+        )
+    for filename in os.listdir(PYTHON_STRINGS_DIR):
+        if filename.endswith(".json") and filename not in filenames:
+            os.remove(os.path.join(PYTHON_STRINGS_DIR, filename))
+    if os.path.exists(LEGACY_PYTHON_STRINGS_FILE):
+        os.remove(LEGACY_PYTHON_STRINGS_FILE)
+
+
+def create_resource_files(output_dir, stamps):
+    """
+    Create the resource files of each language in `stamps`, whose loading pages are in its
+    directory of `output_dir`, in parallel, and the Python strings catalogs of all languages.
+    """
+    en_strings = [
+        (string.get("name"), string.text)
+        for string in ET.parse(EN_STRINGS_FILE).getroot().findall("string")
+    ]
+    all_langs = list(os.listdir(output_dir))
+
+    # Build the index before starting the workers, so that forked workers share it
+    _english_index()
+    with ProcessPoolExecutor() as executor:
+        futures = {
+            lang_dir: executor.submit(
+                create_language_resource_files,
+                output_dir,
+                lang_dir,
+                en_strings,
+                stamp,
+            )
+            for lang_dir, stamp in stamps.items()
+        }
+        for lang_dir, future in futures.items():
+            print(f"{lang_dir}: {future.result()} files changed")
+
+    create_python_strings_files(all_langs)
 
 
 def main():
     """
-    Run the script to generate the loading pages and create the Android resource files.
+    Run the script to generate the loading pages and create the Android resource files,
+    for the languages whose inputs have changed since they were last created.
     """
+    from kolibri.utils.i18n import KOLIBRI_SUPPORTED_LANGUAGES
+
+    version_text = apk_version().replace("-official", "")
+    stamps = {
+        lang_dir: _stamp(lang_dir, version_text)
+        for lang_dir in KOLIBRI_SUPPORTED_LANGUAGES
+    }
+    stamps = {
+        lang_dir: stamp
+        for lang_dir, stamp in stamps.items()
+        if not _is_up_to_date(lang_dir, stamp)
+    }
+    if not stamps and os.path.isdir(PYTHON_STRINGS_DIR):
+        print("Android resource files are up to date")
+        return
+
     with tempfile.TemporaryDirectory() as temp_dir:
-        generate_loading_pages(temp_dir)
-        create_resource_files(temp_dir)
+        generate_loading_pages(temp_dir, version_text)
+        create_resource_files(temp_dir, stamps)
 
 
 if __name__ == "__main__":
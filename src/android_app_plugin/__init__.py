@@ -0,0 +1 @@
+default_app_config = "android_app_plugin.apps.AndroidAppConfig"
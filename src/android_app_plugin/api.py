@@ -0,0 +1,19 @@
+from android_app_plugin.metrics import current_snapshot
+from android_app_plugin.metrics import latest_dumps
+from kolibri.core.device.permissions import IsSuperuser
+from kolibri.utils.conf import KOLIBRI_HOME
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+
+class MetricsView(APIView):
+    """
+    The metrics of this process, and the last dump of each process role
+    """
+
+    permission_classes = (IsSuperuser,)
+
+    def get(self, request):
+        return Response(
+            {"process": current_snapshot(), "dumps": latest_dumps(KOLIBRI_HOME)}
+        )
@@ -0,0 +1,4 @@
+from android_app_plugin.api import MetricsView
+from django.conf.urls import url
+
+urlpatterns = [url(r"^metrics/$", MetricsView.as_view(), name="metrics")]
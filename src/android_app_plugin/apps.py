@@ -0,0 +1,13 @@
+from django.apps import AppConfig
+
+
+class AndroidAppConfig(AppConfig):
+    name = "android_app_plugin"
+
+    def ready(self):
+        from kolibri.utils.conf import KOLIBRI_HOME
+        from kolibri.utils.conf import OPTIONS
+
+        from android_app_plugin.metrics import start
+
+        start(KOLIBRI_HOME, OPTIONS["Android"]["METRICS_DUMP_INTERVAL"])
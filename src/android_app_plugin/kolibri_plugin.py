@@ -1,67 +1,102 @@
+import atexit
 import logging
+import threading
+import time
 from datetime import datetime
 
-from jnius import autoclass
+from android_app_plugin.metrics import registry
+from django.utils import translation
+from java_classes import get_class
 from kolibri.core.tasks.hooks import StorageHook
 from kolibri.core.tasks.job import Priority
+from kolibri.core.tasks.job import State
+from kolibri.core.tasks.storage import ORMJob
 from kolibri.plugins import KolibriPluginBase
 from kolibri.plugins.hooks import register_hook
 
-Locale = autoclass("java.util.Locale")
-Task = autoclass("org.learningequality.Task")
-TaskWorker = autoclass("org.learningequality.Kolibri.task.TaskWorkerImpl")
+Locale = get_class("java.util.Locale")
+Task = get_class("org.learningequality.Task")
+TaskWorker = get_class("org.learningequality.Kolibri.task.TaskWorkerImpl")
 PROGRESS_LIMIT = 10000
+# Progress is only forwarded when it changes by at least 1/PROGRESS_STEPS of the total
+PROGRESS_STEPS = 100
+# The minimum number of seconds between forwarded progress updates for a job
+PROGRESS_INTERVAL = 1.0
+
+FINAL_STATES = {State.COMPLETED, State.FAILED, State.CANCELED}
+
+# Jobs scheduled within this many seconds of each other are enqueued together
+SCHEDULE_WINDOW = 0.05
+# The maximum number of jobs enqueued together
+SCHEDULE_BATCH_SIZE = 500
+# Upper bounds of the buckets of the number of jobs enqueued together
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, SCHEDULE_BATCH_SIZE)
 
 
 logger = logging.getLogger(__name__)
 
 
 class AndroidApp(KolibriPluginBase):
-    pass
+    untranslated_view_urls = "api_urls"
+    kolibri_options = "options"
 
 
-@register_hook
-class StorageHook(StorageHook):
-    def schedule(
-        self,
-        job,
-        orm_job,
-    ):
-        if orm_job.id:
+class JobProgress:
+    __slots__ = "locale", "task", "sent", "checked_at"
 
-            delay = (
-                max(0, (orm_job.scheduled_time - datetime.now()).total_seconds())
-                if orm_job.scheduled_time
-                else 0
-            )
+    def __init__(self, locale, task):
+        self.locale = locale
+        self.task = task
+        # The (title, text, quantized progress) last forwarded
+        self.sent = None
+        # When the status was last generated
+        self.checked_at = None
 
-            high_priority = orm_job.priority <= Priority.HIGH
 
-            # Android has no mechanism for scheduling a limited run of repeating tasks,
-            # so we just schedule it as a one-off task, and then re-schedule it when the task
-            # is completed.
-            # We could use WorkManager's PeriodicWorkRequest, but this gives us more control
-            # over execution, and also allows us to use the same mechanism for all tasks.
-            # Similarly, retry_intervals are handled by the schedule mechanism, so we don't
-            # leverage Android's retry mechanism either.
-            logger.info(
-                "Scheduling task {} for job {} with delay {} and high priority {}".format(
-                    job.func, orm_job.id, delay, high_priority
+class ProgressCoalescer:
+    """
+    Decides which job updates are forwarded to the Java side, as each forwarded update
+    crosses JNI and ends in a notification update.
+
+    Progress updates are forwarded at most every `interval` seconds, and only if the
+    quantized progress or the status text has changed since the last one. State changes
+    are always forwarded. The locale and task are looked up once per job, rather than on
+    every update, as a new Job object is created for each update.
+    """
+
+    def __init__(self, notify, interval=PROGRESS_INTERVAL, steps=PROGRESS_STEPS):
+        self.notify = notify
+        self.interval = interval
+        self.steps = steps
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _job_progress(self, job):
+        with self._lock:
+            job_progress = self._jobs.get(job.job_id)
+            if job_progress is None:
+                job_progress = JobProgress(
+                    Locale.getDefault().toLanguageTag(), job.task
                 )
-            )
-            request_id = Task.enqueueOnce(
-                orm_job.id,
-                delay,
-                high_priority,
-                job.func,
-                job.long_running,
-            )
-            job.update_worker_info(extra=request_id)
+                self._jobs[job.job_id] = job_progress
+            return job_progress
 
-    def update(self, job, orm_job, state=None, **kwargs):
-        currentLocale = Locale.getDefault().toLanguageTag()
+    def update(self, job, state=None):
+        now = time.monotonic()
+        job_progress = self._job_progress(job)
+        if (
+            state is None
+            and job_progress.checked_at is not None
+            and now - job_progress.checked_at < self.interval
+        ):
+            return
+        if state in FINAL_STATES:
+            with self._lock:
+                self._jobs.pop(job.job_id, None)
 
-        status = job.status(currentLocale)
+        job_progress.checked_at = now
+        with translation.override(job_progress.locale):
+            status = job_progress.task.generate_status(job)
 
         if status:
             if job.total_progress:
@@ -71,19 +106,219 @@ class StorageHook(StorageHook):
                 progress = -1
                 total_progress = -1
 
+            sent = (
+                status.title,
+                status.text,
+                self.steps * progress // total_progress,
+            )
+            if state is None and sent == job_progress.sent:
+                return
+            job_progress.sent = sent
+
             # avoid passing integers that are too large
             # PROGRESS_LIMIT gives sufficient precision for a % progress calculation
             if total_progress > PROGRESS_LIMIT:
                 progress = PROGRESS_LIMIT * progress // total_progress
                 total_progress = PROGRESS_LIMIT
 
-            TaskWorker.notifyLocalObservers(
-                status.title,
-                status.text,
-                progress,
-                total_progress,
+            self.notify(status.title, status.text, progress, total_progress)
+
+
+def _notify(*args):
+    registry.counter("jni.notifyLocalObservers").increment()
+    TaskWorker.notifyLocalObservers(*args)
+
+
+progress_coalescer = ProgressCoalescer(_notify)
+
+
+class ScheduleBatcher:
+    """
+    Collects jobs as they are scheduled, and enqueues them with WorkManager in batches, as
+    each call to the Java side crosses JNI and each worker info update is a DB commit.
+
+    A batch is enqueued once no more jobs have been scheduled for `window` seconds, once it
+    reaches `batch_size` jobs, or when the process exits. If a batch cannot be enqueued,
+    its jobs are enqueued one at a time instead.
+    """
+
+    def __init__(self, window=SCHEDULE_WINDOW, batch_size=SCHEDULE_BATCH_SIZE):
+        self.window = window
+        self.batch_size = batch_size
+        self._pending = []
+        self._timer = None
+        self._lock = threading.Lock()
+        # Held while enqueuing, so that batches are enqueued in the order scheduled
+        self._flush_lock = threading.Lock()
+
+    def add(self, job, orm_job):
+        with self._lock:
+            self._pending.append((job, orm_job))
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if len(self._pending) < self.batch_size:
+                self._timer = threading.Timer(self.window, self._flush_from_timer)
+                self._timer.daemon = True
+                self._timer.start()
+                return
+        self.flush()
+
+    def discard(self, job_id):
+        with self._lock:
+            self._pending = [
+                (job, orm_job) for job, orm_job in self._pending if orm_job.id != job_id
+            ]
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        finally:
+            from jnius import detach
+
+            # Threads started from python must be detached from the JVM before exiting
+            detach()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                pending = self._pending
+                self._pending = []
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            if pending:
+                try:
+                    self._enqueue(pending)
+                except Exception as e:
+                    logger.error(
+                        "Failed to schedule {} tasks: {}".format(len(pending), e)
+                    )
+
+    def _job_args(self, job, orm_job):
+        delay = (
+            max(0, (orm_job.scheduled_time - datetime.now()).total_seconds())
+            if orm_job.scheduled_time
+            else 0
+        )
+        high_priority = orm_job.priority <= Priority.HIGH
+        logger.debug(
+            "Scheduling task {} for job {} with delay {} and high priority {}".format(
+                job.func, orm_job.id, delay, high_priority
+            )
+        )
+        return orm_job.id, int(delay), high_priority, job.func, job.long_running
+
+    def _enqueue_each(self, jobs_args):
+        request_ids = []
+        for job_args in jobs_args:
+            try:
+                request_ids.append(Task.enqueueOnce(*job_args))
+                registry.counter("jni.enqueueOnce").increment()
+            except Exception as e:
+                logger.error("Failed to schedule job {}: {}".format(job_args[0], e))
+                request_ids.append(None)
+        return request_ids
+
+    def _enqueue(self, pending):
+        jobs_args = [self._job_args(job, orm_job) for job, orm_job in pending]
+
+        logger.info("Scheduling {} tasks".format(len(jobs_args)))
+        start = time.perf_counter()
+        try:
+            ids, delays, high_priorities, funcs, long_runnings = (
+                list(column) for column in zip(*jobs_args)
+            )
+            request_ids = Task.enqueueOnceBatch(
+                ids, delays, high_priorities, funcs, long_runnings
+            )
+            registry.counter("jni.enqueueOnceBatch").increment()
+        except Exception as e:
+            logger.warning(
+                "Failed to schedule {} tasks together, scheduling each: {}".format(
+                    len(jobs_args), e
+                )
             )
+            request_ids = self._enqueue_each(jobs_args)
+        registry.histogram("schedule_batch_size", BATCH_SIZE_BUCKETS).observe(
+            len(jobs_args)
+        )
+        registry.histogram("schedule_enqueue_ms").observe(
+            (time.perf_counter() - start) * 1000
+        )
+
+        # Record the work request IDs, with one update per storage
+        updates = {}
+        for (job, orm_job), request_id in zip(pending, request_ids):
+            if request_id is None:
+                continue
+            updates.setdefault(job.storage, []).append(
+                {"id": orm_job.id, "worker_extra": request_id}
+            )
+        for storage, mappings in updates.items():
+            with storage.session_scope() as session:
+                session.bulk_update_mappings(ORMJob, mappings)
+
+
+schedule_batcher = ScheduleBatcher()
+atexit.register(schedule_batcher.flush)
+
+
+class TaskTimer:
+    """
+    Times jobs from when they start running in this process until they reach a final state,
+    and counts them by that state
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._started = {}
+        self._lock = threading.Lock()
+
+    def update(self, job, state):
+        if state == State.RUNNING:
+            with self._lock:
+                self._started[job.job_id] = self.clock()
+        elif state in FINAL_STATES:
+            with self._lock:
+                started = self._started.pop(job.job_id, None)
+            registry.counter("tasks.{}".format(state.lower())).increment()
+            if started is not None:
+                # By the last part of the function name, which is enough to tell tasks apart
+                registry.histogram("task_ms." + job.func.rsplit(".", 1)[-1]).observe(
+                    (self.clock() - started) * 1000
+                )
+
+
+task_timer = TaskTimer()
+
+
+@register_hook
+class StorageHook(StorageHook):
+    def schedule(
+        self,
+        job,
+        orm_job,
+    ):
+        if orm_job.id:
+            # Android has no mechanism for scheduling a limited run of repeating tasks,
+            # so we just schedule it as a one-off task, and then re-schedule it when the task
+            # is completed.
+            # We could use WorkManager's PeriodicWorkRequest, but this gives us more control
+            # over execution, and also allows us to use the same mechanism for all tasks.
+            # Similarly, retry_intervals are handled by the schedule mechanism, so we don't
+            # leverage Android's retry mechanism either.
+            registry.counter("tasks.scheduled").increment()
+            schedule_batcher.add(job, orm_job)
+
+    def update(self, job, orm_job, state=None, **kwargs):
+        if state is not None:
+            task_timer.update(job, state)
+        progress_coalescer.update(job, state=state)
 
     def clear(self, job, orm_job):
         logger.info("Clearing task {} for job {}".format(job.func, orm_job.id))
+        registry.counter("tasks.cleared").increment()
+        schedule_batcher.discard(orm_job.id)
         Task.clear(orm_job.id)
+        registry.counter("jni.clear").increment()
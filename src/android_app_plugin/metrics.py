@@ -0,0 +1,344 @@
+"""
+Metrics
+=======
+
+Numbers on how the app performs over a school day, kept in memory by each process with
+little overhead. Each metric holds a ring buffer of WINDOWS windows of WINDOW_SECONDS each,
+so the last hour by the minute:
+
+- counters count events, such as requests by status, or tasks by the state they end in
+- histograms count values into fixed buckets, such as how long requests or tasks take
+- gauges keep the last, lowest and highest value set, such as the resident memory
+
+They are fed by the request middleware, the storage hook, and a sampler thread, which sets
+the memory and thread gauges every SAMPLE_INTERVAL seconds. Every `METRICS_DUMP_INTERVAL`
+seconds, and as the process exits, the sampler appends the windows completed since its last
+dump, as one compact JSON line, to `KOLIBRI_HOME/metrics/<role>-<date>.jsonl`, so that they
+can be collected offline.
+
+Superusers can get the metrics of the main process, and the last dump of each process role,
+from `/android_app_plugin/api/metrics/`.
+"""
+import atexit
+import bisect
+import collections
+import copy
+import json
+import logging
+import os
+import threading
+import time
+from datetime import date
+
+from boot_trace import process_role
+from boot_trace import rss_kb
+
+logger = logging.getLogger(__name__)
+
+DIR_NAME = "metrics"
+WINDOW_SECONDS = 60
+WINDOWS = 60
+SAMPLE_INTERVAL = 10
+
+# The most metrics a process keeps, with any more counted together in one of each kind
+MAX_METRICS = 200
+
+# The number of dump files to keep, one per process role and day
+MAX_DUMP_FILES = 60
+
+# Upper bounds of the buckets of durations, in ms, with a last bucket for anything longer
+DURATION_BUCKETS_MS = (
+    5,
+    10,
+    25,
+    50,
+    100,
+    250,
+    500,
+    1000,
+    2500,
+    5000,
+    10000,
+    30000,
+    60000,
+    300000,
+)
+
+
+class Metric(object):
+    """
+    A ring buffer of windows, each a list starting with the time the window started
+    """
+
+    kind = None
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.windows = collections.deque(maxlen=WINDOWS)
+        self._lock = threading.Lock()
+
+    def new_window(self, start):
+        raise NotImplementedError
+
+    def _window(self):
+        """
+        Returns the current window, starting a new one if its time has come
+        """
+        start = int(self.clock() // WINDOW_SECONDS * WINDOW_SECONDS)
+        if not self.windows or self.windows[-1][0] != start:
+            self.windows.append(self.new_window(start))
+        return self.windows[-1]
+
+    def describe(self):
+        return {"kind": self.kind}
+
+    def snapshot(self, since=0, until=None):
+        """
+        Returns the windows that started from `since` and before `until`
+        """
+        with self._lock:
+            return [
+                copy.deepcopy(window)
+                for window in self.windows
+                if window[0] >= since and (until is None or window[0] < until)
+            ]
+
+
+class Counter(Metric):
+    """
+    Windows of [start, count]
+    """
+
+    kind = "counter"
+
+    def new_window(self, start):
+        return [start, 0]
+
+    def increment(self, count=1):
+        with self._lock:
+            self._window()[1] += count
+
+
+class Histogram(Metric):
+    """
+    Windows of [start, [count per bucket], sum]
+    """
+
+    kind = "histogram"
+
+    def __init__(self, buckets=DURATION_BUCKETS_MS, clock=time.time):
+        super(Histogram, self).__init__(clock=clock)
+        self.buckets = tuple(buckets)
+
+    def new_window(self, start):
+        return [start, [0] * (len(self.buckets) + 1), 0]
+
+    def describe(self):
+        return {"kind": self.kind, "buckets": self.buckets}
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            window = self._window()
+            window[1][index] += 1
+            window[2] += value
+
+
+class Gauge(Metric):
+    """
+    Windows of [start, last, lowest, highest]
+    """
+
+    kind = "gauge"
+
+    def new_window(self, start):
+        return [start, None, None, None]
+
+    def set(self, value):
+        with self._lock:
+            window = self._window()
+            window[1] = value
+            window[2] = value if window[2] is None else min(window[2], value)
+            window[3] = value if window[3] is None else max(window[3], value)
+
+
+class Registry(object):
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, name, cls, *args):
+        metric = self.metrics.get(name)
+        if metric is None:
+            with self._lock:
+                if name not in self.metrics and len(self.metrics) >= MAX_METRICS:
+                    name = "other.{}".format(cls.kind)
+                metric = self.metrics.get(name)
+                if metric is None:
+                    metric = cls(*args, clock=self.clock)
+                    self.metrics[name] = metric
+        if not isinstance(metric, cls):
+            raise TypeError("{} is a {}".format(name, metric.kind))
+        return metric
+
+    def counter(self, name):
+        return self._get(name, Counter)
+
+    def histogram(self, name, buckets=DURATION_BUCKETS_MS):
+        return self._get(name, Histogram, buckets)
+
+    def gauge(self, name):
+        return self._get(name, Gauge)
+
+    def snapshot(self, since=0, until=None):
+        """
+        Returns each metric with windows that started from `since` and before `until`
+        """
+        snapshot = {}
+        for name, metric in list(self.metrics.items()):
+            windows = metric.snapshot(since, until)
+            if windows:
+                snapshot[name] = dict(metric.describe(), windows=windows)
+        return snapshot
+
+
+registry = Registry()
+
+
+def _dump_dir(home):
+    return os.path.join(home, DIR_NAME)
+
+
+def _last_line(path, chunk_size=65536):
+    """
+    Returns the last line of a file, reading it from the end
+    """
+    with open(path, "rb") as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        data = b""
+        while position > 0 and data.count(b"\n") < 2:
+            position = max(0, position - chunk_size)
+            f.seek(position)
+            data = f.read(end - position)
+    lines = data.rstrip(b"\n").rsplit(b"\n", 1)
+    return lines[-1].decode("utf-8") if lines[-1] else None
+
+
+def latest_dumps(home):
+    """
+    Returns the last dump of each process role, by role
+    """
+    try:
+        names = sorted(os.listdir(_dump_dir(home)))
+    except OSError:
+        return {}
+    latest = {}
+    for name in names:
+        role, _, _ = name.rpartition("-")
+        if name.endswith(".jsonl") and role:
+            # Names sort by date within each role, so the last one seen is the latest
+            latest[role] = os.path.join(_dump_dir(home), name)
+    dumps = {}
+    for role, path in latest.items():
+        try:
+            line = _last_line(path)
+            if line:
+                dumps[role] = json.loads(line)
+        except (OSError, ValueError) as e:
+            logger.warning("Could not read metrics from {}: {}".format(path, e))
+    return dumps
+
+
+def current_snapshot():
+    return {
+        "role": process_role(),
+        "pid": os.getpid(),
+        "time": int(time.time()),
+        "window_seconds": WINDOW_SECONDS,
+        "metrics": registry.snapshot(),
+    }
+
+
+class Sampler(object):
+    """
+    Sets the memory and thread gauges, and dumps the metrics every `dump_interval` seconds
+    """
+
+    def __init__(self, registry, home, dump_interval):
+        self.registry = registry
+        self.home = home
+        self.dump_interval = dump_interval
+        self.role = process_role()
+        # The start of the first window that has not been dumped
+        self.dumped_until = 0
+        self._dump_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def sample(self):
+        self.registry.gauge("rss_kb").set(rss_kb())
+        self.registry.gauge("threads").set(threading.active_count())
+
+    def dump(self, final=False):
+        """
+        Appends the windows completed since the last dump, or all of them when final
+        """
+        now = self.registry.clock()
+        until = None if final else int(now // WINDOW_SECONDS * WINDOW_SECONDS)
+        with self._dump_lock:
+            metrics = self.registry.snapshot(self.dumped_until, until)
+            self.dumped_until = until or int(now) + WINDOW_SECONDS
+            if not metrics:
+                return
+            line = json.dumps(
+                {
+                    "role": self.role,
+                    "pid": os.getpid(),
+                    "time": int(now),
+                    "window_seconds": WINDOW_SECONDS,
+                    "metrics": metrics,
+                },
+                separators=(",", ":"),
+            )
+            dump_dir = _dump_dir(self.home)
+            os.makedirs(dump_dir, exist_ok=True)
+            path = os.path.join(
+                dump_dir, "{}-{:%Y%m%d}.jsonl".format(self.role, date.today())
+            )
+            # A single write, so that lines from processes of the same role do not mix
+            with open(path, "a") as f:
+                f.write(line + "\n")
+            for name in sorted(os.listdir(dump_dir), key=lambda name: name[-14:])[
+                :-MAX_DUMP_FILES
+            ]:
+                os.remove(os.path.join(dump_dir, name))
+
+    def _dump_safely(self, final=False):
+        try:
+            self.dump(final=final)
+        except OSError as e:
+            logger.warning("Could not dump metrics: {}".format(e))
+
+    def run(self):
+        next_dump = time.monotonic() + self.dump_interval
+        self.sample()
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            self.sample()
+            if self.dump_interval and time.monotonic() >= next_dump:
+                self._dump_safely()
+                next_dump = time.monotonic() + self.dump_interval
+
+    def start(self):
+        threading.Thread(target=self.run, name="metrics", daemon=True).start()
+        if self.dump_interval:
+            atexit.register(self._dump_safely, final=True)
+
+    def stop(self):
+        self._stop.set()
+
+
+def start(home, dump_interval):
+    sampler = Sampler(registry, home, dump_interval)
+    sampler.start()
+    return sampler
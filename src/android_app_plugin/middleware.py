@@ -0,0 +1,24 @@
+import time
+
+from android_app_plugin.metrics import registry
+
+
+class RequestMetricsMiddleware(object):
+    """
+    Counts responses by status class, and times requests by the URL namespace of their view
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        response = self.get_response(request)
+        duration_ms = (time.perf_counter() - start) * 1000
+        match = getattr(request, "resolver_match", None)
+        namespace = (match.namespace if match else None) or "other"
+        registry.histogram("request_ms." + namespace).observe(duration_ms)
+        registry.counter(
+            "responses.{}xx".format(response.status_code // 100)
+        ).increment()
+        return response
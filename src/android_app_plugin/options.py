@@ -0,0 +1,36 @@
+option_spec = {
+    "Android": {
+        "SQLITE_CACHE_KB": {
+            "type": "integer",
+            "default": 0,
+            "description": """
+                The size of the SQLite page cache of each database connection, in KB.
+                If 0, it is sized to the device's memory.
+            """,
+        },
+        "CACHE_MEMORY_KB": {
+            "type": "integer",
+            "default": 0,
+            "description": """
+                The memory budget of the cache in each process, in KB. If 0, it is sized
+                to the device's memory.
+            """,
+        },
+        "TASK_WORKERS": {
+            "type": "integer",
+            "default": 0,
+            "description": """
+                The maximum number of tasks to run at once. If 0, it is sized to the
+                device's CPU count and memory. Takes effect the next time the app starts.
+            """,
+        },
+        "METRICS_DUMP_INTERVAL": {
+            "type": "integer",
+            "default": 900,
+            "description": """
+                How often each process appends its performance metrics to a file under
+                KOLIBRI_HOME/metrics, in seconds. If 0, they are only kept in memory.
+            """,
+        },
+    },
+}
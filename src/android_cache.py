@@ -0,0 +1,285 @@
+"""
+Android cache
+=============
+
+A Django cache backend with a bounded memory tier in front of a disk tier, so that the
+cache's memory use is under our control on devices with 1 or 2 GB of memory.
+
+The memory tier is local to each process, holds pickled values, and evicts the least
+recently used entries once their size exceeds its byte budget. The disk tier is a
+diskcache database under KOLIBRI_HOME, which the server and task worker processes can
+safely share, with its own size limit. Values are written to both tiers, and values read
+from disk are promoted into memory. As with Kolibri's default local memory cache, other
+processes may read a stale value from their memory tier until it expires.
+
+Django creates a cache object per thread, so, as for its local memory cache, the tiers
+are shared by all the cache objects for a location in a process.
+
+The memory tier can be shrunk on demand, as when Android asks the app to trim its memory,
+and both tiers count their hits, misses and evictions.
+"""
+import logging
+import pickle
+import sqlite3
+import threading
+import time
+from collections import Counter
+from collections import OrderedDict
+
+from diskcache import Cache
+from diskcache import Timeout
+from django.core.cache.backends.base import BaseCache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MEMORY_BYTES = 8 * 1024 * 1024
+DEFAULT_DISK_BYTES = 64 * 1024 * 1024
+
+# An estimate of the memory used by each entry, beyond its key and pickled value
+ENTRY_OVERHEAD_BYTES = 200
+
+# Android's ComponentCallbacks2 trim memory levels
+TRIM_MEMORY_RUNNING_CRITICAL = 15
+TRIM_MEMORY_BACKGROUND = 40
+
+DISK_ERRORS = (sqlite3.OperationalError, Timeout)
+
+
+class TieredStore:
+    """
+    The memory and disk tiers for one cache location, keyed by Django's full cache keys
+    """
+
+    def __init__(self, location, memory_bytes, disk_bytes):
+        self.memory_bytes = memory_bytes
+        # Key to (expiry time, pickled value), least recently used first
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._lock = threading.Lock()
+        self._disk = Cache(
+            location, size_limit=disk_bytes, eviction_policy="least-recently-used"
+        )
+        self.counters = Counter()
+
+    # Memory tier, all called with the lock held
+
+    @staticmethod
+    def _entry_size(key, pickled):
+        return len(key) + len(pickled) + ENTRY_OVERHEAD_BYTES
+
+    def _memory_get(self, key):
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        expires, pickled = entry
+        if expires is not None and expires <= time.time():
+            self._memory_delete(key)
+            return None
+        self._memory.move_to_end(key)
+        return pickled
+
+    def _memory_set(self, key, pickled, expires):
+        self._memory_delete(key)
+        size = self._entry_size(key, pickled)
+        if size > self.memory_bytes:
+            return
+        self._memory[key] = (expires, pickled)
+        self._memory_size += size
+        self._evict(self.memory_bytes)
+
+    def _memory_delete(self, key):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_size -= self._entry_size(key, entry[1])
+        return entry is not None
+
+    def _evict(self, target_bytes):
+        while self._memory_size > target_bytes and self._memory:
+            key, (_, pickled) = self._memory.popitem(last=False)
+            self._memory_size -= self._entry_size(key, pickled)
+            self.counters["memory_evictions"] += 1
+
+    # Disk tier
+
+    def _disk_call(self, method, *args, **kwargs):
+        try:
+            return getattr(self._disk, method)(*args, **kwargs)
+        except DISK_ERRORS as e:
+            self.counters["disk_errors"] += 1
+            logger.debug("Cache disk tier {} failed: {}".format(method, e))
+            return None
+
+    @staticmethod
+    def _disk_expire(expires):
+        if expires is None:
+            return None
+        return max(0, expires - time.time())
+
+    def get(self, key):
+        """
+        Returns the pickled value for key, or None if it is missing
+        """
+        with self._lock:
+            pickled = self._memory_get(key)
+        if pickled is not None:
+            self.counters["memory_hits"] += 1
+            return pickled
+        result = self._disk_call("get", key, expire_time=True)
+        pickled, expires = result if result else (None, None)
+        if pickled is None:
+            self.counters["misses"] += 1
+            return None
+        self.counters["disk_hits"] += 1
+        with self._lock:
+            self._memory_set(key, pickled, expires)
+        return pickled
+
+    def set(self, key, pickled, expires):
+        with self._lock:
+            self._memory_set(key, pickled, expires)
+        self._disk_call("set", key, pickled, expire=self._disk_expire(expires))
+
+    def add(self, key, pickled, expires):
+        # The disk tier is shared, so decides whether the key was already set
+        added = self._disk_call("add", key, pickled, expire=self._disk_expire(expires))
+        with self._lock:
+            if added is None:
+                added = self._memory_get(key) is None
+            if added:
+                self._memory_set(key, pickled, expires)
+        return added
+
+    def touch(self, key, expires):
+        """
+        Sets a new expiry time for key, returning whether it was set
+        """
+        with self._lock:
+            pickled = self._memory_get(key)
+            if pickled is not None:
+                self._memory[key] = (expires, pickled)
+        # The disk tier is shared, so decides whether the key was set
+        touched = self._disk_call("touch", key, expire=self._disk_expire(expires))
+        if touched is None:
+            touched = pickled is not None
+        return touched
+
+    def delete(self, key):
+        """
+        Returns whether the key was set
+        """
+        with self._lock:
+            in_memory = self._memory_delete(key)
+        # The disk tier is shared, so decides whether the key was set
+        deleted = self._disk_call("delete", key)
+        if deleted is None:
+            deleted = in_memory
+        return deleted
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+        self._disk_call("clear")
+
+    def shrink(self, target_bytes=None):
+        """
+        Evict least recently used entries from memory until they take up at most
+        `target_bytes`, by default half of the budget
+        """
+        if target_bytes is None:
+            target_bytes = self.memory_bytes // 2
+        with self._lock:
+            self._evict(target_bytes)
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_size,
+                "memory_budget_bytes": self.memory_bytes,
+            }
+        stats.update(self.counters)
+        stats["disk_bytes"] = self._disk_call("volume")
+        return stats
+
+
+# Location to the TieredStore shared by all cache objects for it
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class TieredCache(BaseCache):
+    def __init__(self, location, params):
+        super(TieredCache, self).__init__(params)
+        options = params.get("OPTIONS", {})
+        with _stores_lock:
+            if location not in _stores:
+                _stores[location] = TieredStore(
+                    location,
+                    memory_bytes=options.get("MEMORY_BYTES", DEFAULT_MEMORY_BYTES),
+                    disk_bytes=options.get("DISK_BYTES", DEFAULT_DISK_BYTES),
+                )
+            self.store = _stores[location]
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def get(self, key, default=None, version=None):
+        pickled = self.store.get(self._key(key, version))
+        if pickled is None:
+            return default
+        try:
+            return pickle.loads(pickled)
+        except pickle.PickleError:
+            return default
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.store.set(
+            self._key(key, version),
+            pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+            self.get_backend_timeout(timeout),
+        )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.store.add(
+            self._key(key, version),
+            pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+            self.get_backend_timeout(timeout),
+        )
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.store.touch(
+            self._key(key, version), self.get_backend_timeout(timeout)
+        )
+
+    def delete(self, key, version=None):
+        return self.store.delete(self._key(key, version))
+
+    def has_key(self, key, version=None):
+        return self.store.get(self._key(key, version)) is not None
+
+    def clear(self):
+        self.store.clear()
+
+    def shrink(self, target_bytes=None):
+        self.store.shrink(target_bytes)
+
+    def stats(self):
+        return self.store.stats()
+
+
+def trim_memory(level):
+    """
+    Shrink the memory tier of every tiered cache in this process, in response to an
+    Android trim memory level
+    """
+    with _stores_lock:
+        stores = list(_stores.values())
+    for store in stores:
+        if level >= TRIM_MEMORY_BACKGROUND or level == TRIM_MEMORY_RUNNING_CRITICAL:
+            store.shrink(0)
+        else:
+            store.shrink()
@@ -3,11 +3,11 @@ import os
 import re
 from functools import cache
 
-from cryptography import x509
-from cryptography.hazmat.backends import default_backend
+from boot_environment import get_version_code
 from i18n import get_string
-from jnius import autoclass
+from java_classes import get_class
 from jnius import cast
+from value_store import ValueStore
 
 
 def is_service_context():
@@ -19,14 +19,14 @@ def is_taskworker_context():
 
 
 def get_timezone_name():
-    Timezone = autoclass("java.util.TimeZone")
+    Timezone = get_class("java.util.TimeZone")
     return Timezone.getDefault().getDisplayName()
 
 
 def start_service(service_name, service_args=None):
-    PythonActivity = autoclass("org.kivy.android.PythonActivity")
+    PythonActivity = get_class("org.kivy.android.PythonActivity")
     service_args = service_args or {}
-    service = autoclass(
+    service = get_class(
         "org.learningequality.Kolibri.Service{}".format(service_name.title())
     )
     service.start(PythonActivity.mActivity, json.dumps(dict(service_args)))
@@ -49,7 +49,7 @@ def get_version_name():
 
 @cache
 def get_context():
-    PythonContext = autoclass("org.kivy.android.PythonContext")
+    PythonContext = get_class("org.kivy.android.PythonContext")
     return PythonContext.get()
 
 
@@ -63,46 +63,48 @@ def get_home_folder():
     return os.path.join(get_external_files_dir(), "KOLIBRI_DATA")
 
 
-class AndroidValueCache:
+class AndroidValueCache(ValueStore):
     """
     A helper class to cache values to disk that might otherwise be expensive to
     query from Android APIs, and that we are pretty sure will be static.
+    Versioned values are invalidated when the app is updated.
     """
 
-    __slots__ = "_storage_path", "_dict"
+    __slots__ = ()
 
     def __init__(self):
-        self._dict = {}
-        self._storage_path = None
-
-    def _load(self, key):
-        try:
-            with open(os.path.join(self._storage_path, key)) as f:
-                self._dict[key] = f.read().strip()
-        except FileNotFoundError:
-            pass
-
-    def _ensure_storage(self):
-        if self._storage_path is None:
-            # Store this in the parent of the Kolibri home dir to prevent collisions.
-            self._storage_path = os.path.join(get_external_files_dir(), ".value_cache")
-            if not os.path.exists(self._storage_path):
-                os.mkdir(self._storage_path)
-
-    def get(self, key):
-        self._ensure_storage()
-        if key not in self._dict:
-            self._load(key)
-        return self._dict.get(key)
-
-    def set(self, key, value):
-        self._ensure_storage()
-        self._dict[key] = value
-        self._save(key)
+        super().__init__(version=get_version_code())
 
-    def _save(self, key):
-        with open(os.path.join(self._storage_path, key), "w") as f:
-            f.write(self._dict[key])
+    def _storage_path(self):
+        if self._path is None:
+            # Store this in the parent of the Kolibri home dir to prevent collisions.
+            self._path = os.path.join(get_external_files_dir(), ".value_cache.log")
+        return self._path
+
+    def _legacy_path(self, key):
+        # Values used to be stored in a file per key
+        return os.path.join(get_external_files_dir(), ".value_cache", key)
+
+    def get_many(self, keys):
+        values = super().get_many(keys)
+        legacy_values = {}
+        for key in keys:
+            if key not in values:
+                try:
+                    with open(self._legacy_path(key)) as f:
+                        legacy_values[key] = f.read().strip()
+                except FileNotFoundError:
+                    pass
+        if legacy_values:
+            self.set_many(legacy_values)
+            for key in legacy_values:
+                try:
+                    os.remove(self._legacy_path(key))
+                except FileNotFoundError:
+                    # Another process has already migrated it
+                    pass
+            values.update(legacy_values)
+        return values
 
 
 value_cache = AndroidValueCache()
@@ -117,11 +119,11 @@ def share_by_intent(path=None, filename=None, message=None, app=None, mimetype=N
     assert (
         path or message or filename
     ), "Must provide either a path, a filename, or a msg to share"
-    AndroidString = autoclass("java.lang.String")
-    Context = autoclass("android.content.Context")
-    File = autoclass("java.io.File")
-    FileProvider = autoclass("android.support.v4.content.FileProvider")
-    Intent = autoclass("android.content.Intent")
+    AndroidString = get_class("java.lang.String")
+    Context = get_class("android.content.Context")
+    File = get_class("java.io.File")
+    FileProvider = get_class("android.support.v4.content.FileProvider")
+    Intent = get_class("android.content.Intent")
 
     sendIntent = Intent()
     sendIntent.setAction(Intent.ACTION_SEND)
@@ -146,22 +148,22 @@ def share_by_intent(path=None, filename=None, message=None, app=None, mimetype=N
 
 
 def make_service_foreground(title, message):
-    service = autoclass("org.kivy.android.PythonService").mService
-    Drawable = autoclass("{}.R$drawable".format(service.getPackageName()))
+    service = get_class("org.kivy.android.PythonService").mService
+    Drawable = get_class("{}.R$drawable".format(service.getPackageName()))
     app_context = service.getApplication().getApplicationContext()
 
-    ANDROID_VERSION = autoclass("android.os.Build$VERSION")
+    ANDROID_VERSION = get_class("android.os.Build$VERSION")
     SDK_INT = ANDROID_VERSION.SDK_INT
-    AndroidString = autoclass("java.lang.String")
-    Context = autoclass("android.content.Context")
-    Intent = autoclass("android.content.Intent")
-    NotificationBuilder = autoclass("android.app.Notification$Builder")
-    NotificationManager = autoclass("android.app.NotificationManager")
-    PendingIntent = autoclass("android.app.PendingIntent")
-    PythonActivity = autoclass("org.kivy.android.PythonActivity")
+    AndroidString = get_class("java.lang.String")
+    Context = get_class("android.content.Context")
+    Intent = get_class("android.content.Intent")
+    NotificationBuilder = get_class("android.app.Notification$Builder")
+    NotificationManager = get_class("android.app.NotificationManager")
+    PendingIntent = get_class("android.app.PendingIntent")
+    PythonActivity = get_class("org.kivy.android.PythonActivity")
 
     if SDK_INT >= 26:
-        NotificationChannel = autoclass("android.app.NotificationChannel")
+        NotificationChannel = get_class("android.app.NotificationChannel")
         notification_service = cast(
             NotificationManager,
             get_context().getSystemService(Context.NOTIFICATION_SERVICE),
@@ -196,7 +198,11 @@ def make_service_foreground(title, message):
 
 
 def get_signature_key_issuer():
-    PackageManager = autoclass("android.content.pm.PackageManager")
+    # Only needed until the issuing org is cached, so import these on first use
+    from cryptography import x509
+    from cryptography.hazmat.backends import default_backend
+
+    PackageManager = get_class("android.content.pm.PackageManager")
     signature = get_package_info(flags=PackageManager.GET_SIGNATURES).signatures[0]
     cert = x509.load_der_x509_certificate(
         signature.toByteArray().tostring(), default_backend()
@@ -206,31 +212,29 @@ def get_signature_key_issuer():
 
 
 def get_signature_key_issuing_organization():
-    cache_key = "SIGNATURE_KEY_ORG"
-    value = value_cache.get(cache_key)
-    if value is None:
+    def get_issuing_organization():
         signer = get_signature_key_issuer()
         orgs = re.findall(r"\bO=([^,]+)", signer)
-        value = orgs[0] if orgs else ""
-        value_cache.set(cache_key, value)
-    else:
-        print("Using cached value for issuing org")
-    return value
+        return orgs[0] if orgs else ""
+
+    return value_cache.get_or_set("SIGNATURE_KEY_ORG", get_issuing_organization)
 
 
 def get_dummy_user_name():
-    cache_key = "DUMMY_USER_NAME"
-    value = value_cache.get(cache_key)
-    if value is None:
-        Locale = autoclass("java.util.Locale")
+    def get_learner_string():
+        Locale = get_class("java.util.Locale")
         currentLocale = Locale.getDefault().toLanguageTag()
-        value = get_string("Learner", currentLocale)
-        value_cache.set(cache_key, value)
-    return value
+        return get_string("Learner", currentLocale)
+
+    # Versioned, as the string catalogs ship with the app. A new key, as values cached
+    # under "DUMMY_USER_NAME" were not, and would never be refreshed.
+    return value_cache.get_or_set(
+        "DUMMY_USER_NAME_VERSIONED", get_learner_string, versioned=True
+    )
 
 
 def is_active_network_metered():
-    ConnectivityManager = autoclass("android.net.ConnectivityManager")
+    ConnectivityManager = get_class("android.net.ConnectivityManager")
 
     return cast(
         ConnectivityManager,
@@ -0,0 +1,102 @@
+"""
+Boot environment
+================
+
+Caches the environment variables that initialization derives from Android APIs in a single
+snapshot file, so that each process can load them with one read and no JNI calls.
+
+The snapshot is keyed on the APK versionCode, read from the `private.version` file written
+when the app is extracted, and on the timezone and locale, which the Java application class
+exports to the environment of every process at startup, along with the app's files
+directory, where the snapshot is kept. If any of these differ from when
+the snapshot was taken, or cannot be determined, the snapshot is ignored.
+"""
+import json
+import os
+
+SNAPSHOT_FILENAME = "boot_environment.json"
+
+# Bump this if the values stored in the snapshot change
+SNAPSHOT_FORMAT = 1
+
+TIMEZONE_ENV = "KOLIBRI_ANDROID_TIMEZONE"
+LOCALE_ENV = "KOLIBRI_ANDROID_LOCALE"
+FILES_DIR_ENV = "KOLIBRI_ANDROID_FILES_DIR"
+
+
+def get_files_dir():
+    """
+    Returns the app's files directory, the same in every process, unlike ANDROID_PRIVATE,
+    which is the files directory in the main process and services but the app root in
+    task workers
+    """
+    return os.environ.get(FILES_DIR_ENV)
+
+
+def _app_root():
+    files_dir = get_files_dir()
+    if not files_dir:
+        return None
+    # Where the app is extracted, as in PythonUtil.getAppRoot
+    return os.path.join(files_dir, "app")
+
+
+def _snapshot_path():
+    files_dir = get_files_dir()
+    if not files_dir:
+        return None
+    # Store this outside of the app root, as that is deleted when the app is updated
+    return os.path.join(files_dir, SNAPSHOT_FILENAME)
+
+
+def get_version_code():
+    try:
+        with open(os.path.join(_app_root(), "private.version")) as f:
+            return f.read().strip()
+    except (OSError, TypeError):
+        return None
+
+
+def _snapshot_key():
+    key = {
+        "format": SNAPSHOT_FORMAT,
+        "version_code": get_version_code(),
+        "timezone": os.environ.get(TIMEZONE_ENV),
+        "locale": os.environ.get(LOCALE_ENV),
+    }
+    if None in key.values():
+        return None
+    return key
+
+
+def load_boot_environment():
+    """
+    Returns the snapshotted environment variables, or None if there is no valid snapshot
+    """
+    path = _snapshot_path()
+    key = _snapshot_key()
+    if path is None or key is None:
+        return None
+    try:
+        with open(path) as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if snapshot.get("key") != key:
+        return None
+    return snapshot.get("environment")
+
+
+def save_boot_environment(environment):
+    path = _snapshot_path()
+    key = _snapshot_key()
+    if path is None or key is None:
+        return
+    temp_path = "{}.{}".format(path, os.getpid())
+    try:
+        with open(temp_path, "w") as f:
+            json.dump({"key": key, "environment": environment}, f)
+        # Atomically replace any previous snapshot, as other processes may be reading it
+        os.replace(temp_path, path)
+    except OSError:
+        pass
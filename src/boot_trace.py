@@ -0,0 +1,168 @@
+"""
+Boot tracing
+============
+
+Records how long named startup phases take, and the resident memory at the end of each,
+so that we can see where cold start time goes on real devices.
+
+Each process writes one small tab separated file per boot under `KOLIBRI_HOME/boot_traces`:
+
+    # <role> <pid> <unix time of process start>
+    <phase>\t<start ms>\t<duration ms>\t<rss kB>
+
+Times are in milliseconds since the process was started, so the first phase also shows
+how long the interpreter took to boot. Phases recorded before `set_home` is called with
+the Kolibri home folder are buffered and written once it is.
+Set `KOLIBRI_BOOT_TRACE=0` to disable tracing.
+
+Use `scripts/boot_trace_summary.py` to compare boots by phase.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+TRACE_DIR_NAME = "boot_traces"
+
+# The number of trace files to keep, per process role
+MAX_TRACES = 20
+
+enabled = os.environ.get("KOLIBRI_BOOT_TRACE", "1") != "0"
+
+_pending = []
+_home = None
+_trace_path = None
+
+
+def _process_start():
+    """
+    Returns the process start time in seconds since system boot, read from /proc
+    """
+    try:
+        with open("/proc/self/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        # starttime is the 22nd field, the 20th after the command name and state
+        return int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return time.clock_gettime(time.CLOCK_BOOTTIME)
+
+
+_start = _process_start()
+_start_unix = time.time() - (time.clock_gettime(time.CLOCK_BOOTTIME) - _start)
+
+try:
+    _page_kb = os.sysconf("SC_PAGE_SIZE") // 1024
+except (OSError, ValueError):
+    _page_kb = 4
+
+
+def _now_ms():
+    return (time.clock_gettime(time.CLOCK_BOOTTIME) - _start) * 1000
+
+
+def rss_kb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _page_kb
+    except (OSError, IndexError, ValueError):
+        return -1
+
+
+def process_role():
+    if "PYTHON_WORKER_ARGUMENT" in os.environ:
+        return "taskworker"
+    if "PYTHON_SERVICE_ARGUMENT" in os.environ:
+        return "remoteshell"
+    return "main"
+
+
+def _prune(trace_dir, role):
+    traces = sorted(name for name in os.listdir(trace_dir) if name.startswith(role))
+    for name in traces[:-MAX_TRACES]:
+        try:
+            os.remove(os.path.join(trace_dir, name))
+        except OSError:
+            pass
+
+
+def _open_trace():
+    global _trace_path
+    if not _home:
+        return None
+    trace_dir = os.path.join(_home, TRACE_DIR_NAME)
+    role = process_role()
+    try:
+        os.makedirs(trace_dir, exist_ok=True)
+        _prune(trace_dir, role)
+        path = os.path.join(
+            trace_dir,
+            "{}-{}-{}.tsv".format(
+                role,
+                time.strftime("%Y%m%d%H%M%S", time.gmtime(_start_unix)),
+                os.getpid(),
+            ),
+        )
+        with open(path, "w") as f:
+            f.write("# {} {} {:.3f}\n".format(role, os.getpid(), _start_unix))
+    except OSError:
+        return None
+    _trace_path = path
+    return path
+
+
+def _write(lines):
+    path = _trace_path or _open_trace()
+    if path is None:
+        return False
+    try:
+        with open(path, "a") as f:
+            f.writelines(lines)
+    except OSError:
+        pass
+    return True
+
+
+def _flush():
+    if _pending and _write(_pending):
+        del _pending[:]
+
+
+def set_home(home):
+    """
+    Set the Kolibri home folder, under which traces are written
+    """
+    global _home
+    _home = home
+    if enabled:
+        _flush()
+
+
+def record(phase, start_ms, duration_ms):
+    if not enabled:
+        return
+    _pending.append(
+        "{}\t{:.1f}\t{:.1f}\t{}\n".format(phase, start_ms, duration_ms, rss_kb())
+    )
+    _flush()
+
+
+def mark(phase):
+    """
+    Record a point in time, such as an event being received
+    """
+    if enabled:
+        record(phase, _now_ms(), 0)
+
+
+@contextmanager
+def trace(phase):
+    """
+    Record how long the wrapped block takes
+    """
+    if not enabled:
+        yield
+        return
+    start = _now_ms()
+    try:
+        yield
+    finally:
+        record(phase, start, _now_ms() - start)
@@ -0,0 +1,134 @@
+"""
+Bytecode importer
+=================
+
+Imports Kolibri's modules from the bytecode bundle that scripts/bytecode_bundle.py builds
+into site-packages, rather than as thousands of small .pyc files.
+
+The bundle is a single file of marshalled code objects, preceded by an index of the module
+names it holds, so that an import is a dictionary lookup and one read, without the stats of
+each directory on sys.path that the path finder makes, or opening a file per module.
+Modules are given the `__file__` they would have had as .pyc files, so that the data files
+beside them are found as before.
+
+Modules of Kolibri's bundled dependencies are indexed both under `kolibri.dist.` and by
+their own name, which is only served once `kolibri` has put its dist folder on sys.path.
+
+If the app was built without a bundle, `install` does nothing and modules are imported from
+their .pyc files. A bundle built for another format or python cannot be ignored, as the
+modules in it were deleted when it was built, so `install` raises `BundleError` for it.
+"""
+import marshal
+import os
+import struct
+import sys
+from importlib.machinery import PathFinder
+from importlib.machinery import SourcelessFileLoader
+from importlib.util import MAGIC_NUMBER
+from importlib.util import spec_from_file_location
+
+BUNDLE_FILENAME = "kolibri.bytecode"
+
+# Bump this if the layout of the bundle changes
+BUNDLE_FORMAT = b"KBC1"
+# The bundle format, the magic number of the python that compiled it, and the index size
+HEADER = struct.Struct("<4s4sI")
+
+
+class BundleError(ImportError):
+    pass
+
+
+def read_header(f):
+    """
+    Returns the index of a bundle open for reading, as a dict of module name to its offset
+    from the end of the index and its size, the path of its .pyc file and the sys.path
+    entry it is under, both relative to the bundle
+    """
+    bundle_format, magic, index_size = HEADER.unpack(f.read(HEADER.size))
+    if bundle_format != BUNDLE_FORMAT:
+        raise BundleError(
+            "{} has bundle format {!r}, expected {!r}".format(
+                f.name, bundle_format, BUNDLE_FORMAT
+            )
+        )
+    if magic != MAGIC_NUMBER:
+        raise BundleError(
+            "{} was compiled by a python with magic number {!r}, this is {!r}".format(
+                f.name, magic, MAGIC_NUMBER
+            )
+        )
+    return marshal.loads(f.read(index_size))
+
+
+class BundleLoader(SourcelessFileLoader):
+    def __init__(self, fullname, path, finder, offset, size):
+        super(BundleLoader, self).__init__(fullname, path)
+        self._finder = finder
+        self._offset = offset
+        self._size = size
+
+    def get_code(self, fullname):
+        return marshal.loads(
+            os.pread(self._finder.fd, self._size, self._finder.start + self._offset)
+        )
+
+
+class BundleFinder(object):
+    def __init__(self, path):
+        self.root = os.path.dirname(path)
+        with open(path, "rb") as f:
+            self.index = read_header(f)
+            self.start = f.tell()
+        # Kept open for the life of the process, to read modules from
+        self.fd = os.open(path, os.O_RDONLY)
+        self._sys_path = None
+        # Whether each sys.path entry of the index is on sys.path, until sys.path changes
+        self._entries = {}
+
+    def _on_sys_path(self, entry):
+        if entry == "":
+            return True
+        if sys.path != self._sys_path:
+            self._sys_path = list(sys.path)
+            self._entries = {}
+        if entry not in self._entries:
+            real_path = os.path.realpath(os.path.join(self.root, entry))
+            self._entries[entry] = any(
+                os.path.realpath(path) == real_path for path in self._sys_path if path
+            )
+        return self._entries[entry]
+
+    def find_spec(self, fullname, path=None, target=None):
+        module = self.index.get(fullname)
+        if module is None:
+            return None
+        offset, size, filename, entry = module
+        if not self._on_sys_path(entry):
+            return None
+        filename = os.path.join(self.root, filename)
+        loader = BundleLoader(fullname, filename, self, offset, size)
+        return spec_from_file_location(fullname, filename, loader=loader)
+
+    def invalidate_caches(self):
+        self._sys_path = None
+
+
+def find_bundle():
+    for path in sys.path:
+        bundle = os.path.join(path, BUNDLE_FILENAME)
+        if os.path.isfile(bundle):
+            return bundle
+    return None
+
+
+def install():
+    """
+    Import modules from the bytecode bundle, if there is one
+    """
+    bundle = find_bundle()
+    if bundle is None:
+        return None
+    finder = BundleFinder(bundle)
+    sys.meta_path.insert(sys.meta_path.index(PathFinder), finder)
+    return finder
@@ -0,0 +1,229 @@
+"""
+Device profile
+==============
+
+Sizes the server thread pool, the SQLite page cache, the memory used by the cache and the
+number of concurrent task workers to the device, rather than using the same values on a 1 GB tablet and on a phone
+with 8 GB of memory that serves a classroom.
+
+The device is profiled from its CPU count, its total and available memory, and the app's
+memory class, which the Java application class exports to the environment. The settings
+are then picked from `POLICY` by total memory, one tier lower if memory is short, and
+capped by the CPU count:
+
+=================  ==============  ============  ============  ============
+Total memory       Server threads  SQLite cache  Memory cache  Task workers
+=================  ==============  ============  ============  ============
+under 1.5 GB       2               2 MB          4 MB          2
+1.5 to 3 GB        4               4 MB          8 MB          3
+3 to 6 GB          6               8 MB          16 MB         4
+6 GB and over      8               16 MB         32 MB         6
+=================  ==============  ============  ============  ============
+
+Server threads are capped at twice the CPU count, and task workers at half of it, with at
+least `MIN_TASK_WORKERS`, so that a long running job, such as a content import, does not
+hold up syncs and other high priority jobs. Kolibri itself reserves 2 of its 6 workers for
+them. Memory is short if less than `LOW_MEMORY_FRACTION` of it is available, or the
+memory class is below `LOW_MEMORY_CLASS_MB`.
+
+Each setting can be overridden by its environment variable in `OVERRIDES`, or in
+options.ini, under the Kolibri option named there.
+
+The main process profiles the device on each boot, and saves the profile and settings to a
+file in the app's files directory, which other processes load, and which the Java side
+reads to size the WorkManager thread pool.
+"""
+import json
+import os
+
+from boot_environment import get_files_dir
+
+PROFILE_FILENAME = "device_profile.json"
+
+# Bump this if the values stored in the profile file change
+PROFILE_FORMAT = 3
+
+MEMORY_CLASS_ENV = "KOLIBRI_ANDROID_MEMORY_CLASS"
+
+# (minimum total memory in MB, server threads, SQLite cache in KB, memory cache in KB,
+# task workers)
+POLICY = (
+    (0, 2, 2048, 4096, 2),
+    (1536, 4, 4096, 8192, 3),
+    (3072, 6, 8192, 16384, 4),
+    (6144, 8, 16384, 32768, 6),
+)
+
+# The fewest task workers, so that one is left for high priority jobs while a long one runs
+MIN_TASK_WORKERS = 2
+
+LOW_MEMORY_FRACTION = 0.15
+LOW_MEMORY_CLASS_MB = 128
+
+# Setting name to (environment variable, (options.ini section, option name))
+OVERRIDES = {
+    "server_threads": (
+        "KOLIBRI_CHERRYPY_THREAD_POOL",
+        ("Server", "CHERRYPY_THREAD_POOL"),
+    ),
+    "sqlite_cache_kb": (
+        "KOLIBRI_ANDROID_SQLITE_CACHE_KB",
+        ("Android", "SQLITE_CACHE_KB"),
+    ),
+    "cache_memory_kb": (
+        "KOLIBRI_ANDROID_CACHE_MEMORY_KB",
+        ("Android", "CACHE_MEMORY_KB"),
+    ),
+    "task_workers": ("KOLIBRI_ANDROID_TASK_WORKERS", ("Android", "TASK_WORKERS")),
+}
+
+
+def _profile_path():
+    files_dir = get_files_dir()
+    if not files_dir:
+        return None
+    # Where App.java reads it to size the WorkManager thread pool
+    return os.path.join(files_dir, PROFILE_FILENAME)
+
+
+def _meminfo_mb():
+    """
+    Returns the total and available memory in MB
+    """
+    meminfo = {}
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                meminfo[name] = int(value.split()[0]) // 1024
+    except (OSError, IndexError, ValueError):
+        pass
+    total = meminfo.get("MemTotal", 0)
+    return total, meminfo.get("MemAvailable", total)
+
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def profile_device():
+    total_mb, available_mb = _meminfo_mb()
+    return {
+        "cpu_count": os.cpu_count() or 1,
+        "total_memory_mb": total_mb,
+        "available_memory_mb": available_mb,
+        "memory_class_mb": _int_or_none(os.environ.get(MEMORY_CLASS_ENV)),
+    }
+
+
+def derive_settings(profile):
+    """
+    Returns the settings for a device profile, according to `POLICY`
+    """
+    tier = max(
+        i for i, row in enumerate(POLICY) if row[0] <= profile["total_memory_mb"]
+    )
+    memory_class = profile["memory_class_mb"]
+    short_of_memory = (
+        profile["available_memory_mb"]
+        < profile["total_memory_mb"] * LOW_MEMORY_FRACTION
+    )
+    if short_of_memory or (
+        memory_class is not None and memory_class < LOW_MEMORY_CLASS_MB
+    ):
+        tier = max(0, tier - 1)
+    _, server_threads, sqlite_cache_kb, cache_memory_kb, task_workers = POLICY[tier]
+    cpu_count = profile["cpu_count"]
+    return {
+        "server_threads": max(POLICY[0][1], min(server_threads, 2 * cpu_count)),
+        "sqlite_cache_kb": sqlite_cache_kb,
+        "cache_memory_kb": cache_memory_kb,
+        "task_workers": max(MIN_TASK_WORKERS, min(task_workers, cpu_count // 2)),
+    }
+
+
+def _read_options(home):
+    """
+    Returns the options in options.ini as a dict of (section, option) to value
+    """
+    path = os.path.join(home or "", "options.ini")
+    if not home or not os.path.exists(path):
+        return {}
+    from configparser import ConfigParser
+
+    parser = ConfigParser(interpolation=None)
+    # Preserve the case of option names, as Kolibri does
+    parser.optionxform = str
+    try:
+        parser.read(path)
+    except Exception:
+        return {}
+    return {
+        (section, option): value
+        for section in parser.sections()
+        for option, value in parser.items(section)
+    }
+
+
+def apply_overrides(settings, home=None):
+    """
+    Returns the settings, with any set in the environment or options.ini replaced
+    """
+    settings = dict(settings)
+    options = None
+    for name, (envvar, (section, option)) in OVERRIDES.items():
+        value = _int_or_none(os.environ.get(envvar))
+        if value is None:
+            if options is None:
+                options = _read_options(home)
+            value = _int_or_none(options.get((section, option)))
+        if value is not None and value > 0:
+            settings[name] = value
+    return settings
+
+
+def _load():
+    path = _profile_path()
+    if path is None:
+        return None
+    try:
+        with open(path) as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if saved.get("format") != PROFILE_FORMAT:
+        return None
+    return saved
+
+
+def _save(profile, settings):
+    path = _profile_path()
+    if path is None:
+        return
+    temp_path = "{}.{}".format(path, os.getpid())
+    try:
+        with open(temp_path, "w") as f:
+            json.dump(
+                {"format": PROFILE_FORMAT, "profile": profile, "settings": settings}, f
+            )
+        # Atomically replace any previous profile, as other processes may be reading it
+        os.replace(temp_path, path)
+    except OSError:
+        pass
+
+
+def get_device_settings(home=None, refresh=False):
+    """
+    Returns the settings for this device, profiling it if `refresh` is True or there is no
+    saved profile, and saving the result
+    """
+    saved = None if refresh else _load()
+    if saved is None:
+        profile = profile_device()
+        settings = apply_overrides(derive_settings(profile), home=home)
+        _save(profile, settings)
+        return settings
+    return saved["settings"]
@@ -0,0 +1,731 @@
+"""
+Diagnostics
+===========
+
+Tools for looking into a slow process on a field device from the remote shell. Each has a
+time limit and bounded overhead, and only one of each runs at a time in a process, so that
+they are safe to use on a classroom server while it is in use:
+
+- `sample_stacks` samples the stack of every thread, for a flame graph
+- `thread_stacks` returns the current stack of every thread
+- `memory_snapshot` and `memory_diff` take and compare tracemalloc snapshots. Tracing slows
+  every allocation down, so stops by itself after TRACEMALLOC_MAX_SECONDS
+- `db_summary` lists the database files open, and times the queries run over a window
+- `gc_stats` returns the garbage collector's stats, and the time spent collecting
+
+The remote shell runs in its own process, so the main process and task workers serve these
+tools to it from a thread listening on a local socket, started with `start_agent`. Each
+process that serves them is listed in `KOLIBRI_HOME/diagnostics`.
+In the shell, `diagnostics` is a `Toolkit`, whose tools run on a thread and return Deferreds.
+Set `KOLIBRI_DIAGNOSTICS=0` to not serve the tools.
+"""
+import atexit
+import collections
+import gc
+import json
+import logging
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from datetime import datetime
+
+import boot_trace
+
+logger = logging.getLogger(__name__)
+
+DIR_NAME = "diagnostics"
+PROFILES_DIR_NAME = "profiles"
+
+# The abstract socket name that each process serves the tools on, followed by its pid
+ADDRESS_PREFIX = "\0org.learningequality.Kolibri.Diagnostics."
+
+# The longest any tool may run for, in seconds
+MAX_SECONDS = 60
+# The shortest time between stack samples
+MIN_INTERVAL = 0.005
+# The most frames kept of each stack, innermost first
+MAX_DEPTH = 64
+# The most distinct stacks kept by a sample, with the rest counted together
+MAX_STACKS = 2000
+# The most distinct statements timed by a database summary, with the rest counted together
+MAX_STATEMENTS = 500
+TRACEMALLOC_MAX_SECONDS = 300
+MAX_SNAPSHOTS = 3
+# The number of profiles to keep
+MAX_PROFILES = 10
+# The most requests answered at once, each on its own thread, with any more refused
+MAX_REQUESTS = 8
+
+enabled = os.environ.get("KOLIBRI_DIAGNOSTICS", "1") != "0"
+
+
+class DiagnosticsError(Exception):
+    pass
+
+
+_sample_lock = threading.Lock()
+_memory_lock = threading.Lock()
+_db_lock = threading.Lock()
+_gc_lock = threading.Lock()
+
+
+@contextmanager
+def _exclusive(lock, name):
+    if not lock.acquire(blocking=False):
+        raise DiagnosticsError("{} is already running".format(name))
+    try:
+        yield
+    finally:
+        lock.release()
+
+
+def _limit(seconds):
+    return max(0.0, min(float(seconds), MAX_SECONDS))
+
+
+def _thread_names():
+    return {thread.ident: thread.name for thread in threading.enumerate()}
+
+
+def sample_stacks(seconds=10, interval=0.01, thread_prefix=None):
+    """
+    Samples the stack of each thread every `interval` seconds for `seconds`, and returns how
+    many samples had each stack, as `thread;outermost;...;innermost count` lines, which is
+    the collapsed format read by flamegraph.pl and speedscope
+    """
+    seconds = _limit(seconds)
+    interval = max(float(interval), MIN_INTERVAL)
+    counts = collections.Counter()
+    # Frame names by code object, as the same few are seen over and over
+    frame_names = {}
+    sampler = threading.get_ident()
+    with _exclusive(_sample_lock, "sample_stacks"):
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = _thread_names()
+            for ident, frame in sys._current_frames().items():
+                name = names.get(ident, str(ident)).replace(";", ":")
+                if ident == sampler or (
+                    thread_prefix and not name.startswith(thread_prefix)
+                ):
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_DEPTH:
+                    code = frame.f_code
+                    if code not in frame_names:
+                        frame_names[code] = "{} ({}:{})".format(
+                            code.co_name,
+                            os.path.basename(code.co_filename),
+                            code.co_firstlineno,
+                        )
+                    stack.append(frame_names[code])
+                    frame = frame.f_back
+                key = ";".join([name] + stack[::-1])
+                if key not in counts and len(counts) >= MAX_STACKS:
+                    key = name + ";[other stacks]"
+                counts[key] += 1
+            time.sleep(interval)
+    return ["{} {}".format(stack, count) for stack, count in counts.most_common()]
+
+
+def thread_stacks():
+    """
+    Returns the current stack of each thread, by thread name
+    """
+    names = _thread_names()
+    caller = threading.get_ident()
+    return {
+        "{} ({})".format(names.get(ident, "unknown"), ident): traceback.format_stack(
+            frame, limit=MAX_DEPTH
+        )
+        for ident, frame in sys._current_frames().items()
+        if ident != caller
+    }
+
+
+_snapshots = []
+_snapshot_count = 0
+_tracemalloc_timer = None
+
+
+def memory_stop():
+    """
+    Stops tracing memory allocations, and forgets the snapshots taken
+    """
+    global _tracemalloc_timer
+    import tracemalloc
+
+    with _memory_lock:
+        if _tracemalloc_timer is not None:
+            _tracemalloc_timer.cancel()
+            _tracemalloc_timer = None
+        del _snapshots[:]
+        tracemalloc.stop()
+
+
+def _snapshot(number):
+    for snapshot_number, snapshot in _snapshots:
+        if snapshot_number == number:
+            return snapshot
+    raise DiagnosticsError(
+        "No snapshot {}, only {}".format(
+            number, [snapshot_number for snapshot_number, _ in _snapshots]
+        )
+    )
+
+
+def memory_snapshot(limit=20):
+    """
+    Takes a snapshot of the memory allocated since tracing started, starting it if needed,
+    and returns its number and the lines that allocated the most of it that is still in use
+    """
+    global _snapshot_count, _tracemalloc_timer
+    import tracemalloc
+
+    with _exclusive(_memory_lock, "memory_snapshot"):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracemalloc_timer = threading.Timer(TRACEMALLOC_MAX_SECONDS, memory_stop)
+            _tracemalloc_timer.daemon = True
+            _tracemalloc_timer.start()
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)]
+        )
+        traced_kb = tracemalloc.get_traced_memory()[0] // 1024
+        _snapshot_count += 1
+        number = _snapshot_count
+        _snapshots.append((number, snapshot))
+        del _snapshots[:-MAX_SNAPSHOTS]
+    return {
+        "snapshot": number,
+        "traced_kb": traced_kb,
+        "top": [str(stat) for stat in snapshot.statistics("lineno")[:limit]],
+    }
+
+
+def memory_diff(first=None, second=None, limit=20):
+    """
+    Returns the lines whose memory in use changed the most between two snapshots,
+    the last two by default
+    """
+    with _exclusive(_memory_lock, "memory_diff"):
+        if first is None and second is None:
+            if len(_snapshots) < 2:
+                raise DiagnosticsError("Take two snapshots to compare")
+            (first, _), (second, _) = _snapshots[-2:]
+        stats = _snapshot(second).compare_to(_snapshot(first), "lineno")
+    return {
+        "first": first,
+        "second": second,
+        "top": [str(stat) for stat in stats[:limit]],
+    }
+
+
+def open_database_files():
+    """
+    Returns the number of file descriptors open on each SQLite database file
+    """
+    counts = collections.Counter()
+    fd_dir = "/proc/self/fd"
+    for fd in os.listdir(fd_dir):
+        try:
+            path = os.readlink(os.path.join(fd_dir, fd))
+        except OSError:
+            continue
+        if ".sqlite3" in path:
+            counts[path] += 1
+    return dict(counts)
+
+
+class QueryTimings(object):
+    """
+    The count, total and longest time of each statement, keeping at most MAX_STATEMENTS
+    """
+
+    def __init__(self):
+        self.statements = {}
+        self._lock = threading.Lock()
+
+    def record(self, sql, seconds):
+        with self._lock:
+            if sql not in self.statements and len(self.statements) >= MAX_STATEMENTS:
+                sql = "[other statements]"
+            timing = self.statements.setdefault(sql, [0, 0.0, 0.0])
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+
+    def timed(self, method):
+        timings = self
+
+        def timed_method(self, sql, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(self, sql, *args, **kwargs)
+            finally:
+                timings.record(sql, time.perf_counter() - start)
+
+        return timed_method
+
+    def top(self, limit):
+        statements = sorted(
+            self.statements.items(), key=lambda item: item[1][1], reverse=True
+        )
+        return [
+            {
+                "sql": " ".join(str(sql).split())[:300],
+                "count": count,
+                "total_ms": total * 1000,
+                "max_ms": longest * 1000,
+            }
+            for sql, (count, total, longest) in statements[:limit]
+        ]
+
+
+def _job_storage_engine():
+    """
+    Returns the SQLAlchemy engine of Kolibri's job storage, if this process has made it
+    """
+    try:
+        from django.utils.functional import empty
+        from kolibri.core.tasks.main import connection
+    except ImportError:
+        return None
+    if connection._wrapped is empty:
+        return None
+    return connection._wrapped
+
+
+@contextmanager
+def _time_job_storage(timings):
+    engine = _job_storage_engine()
+    if engine is None:
+        yield
+        return
+    from sqlalchemy import event
+
+    starts = threading.local()
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        starts.start = time.perf_counter()
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        timings.record(statement, time.perf_counter() - starts.start)
+
+    event.listen(engine, "before_cursor_execute", before)
+    event.listen(engine, "after_cursor_execute", after)
+    try:
+        yield
+    finally:
+        event.remove(engine, "before_cursor_execute", before)
+        event.remove(engine, "after_cursor_execute", after)
+
+
+def db_summary(seconds=10, limit=20):
+    """
+    Returns the database files open, and the statements that took the longest in total,
+    through Django or Kolibri's job storage, over the next `seconds`
+    """
+    from django.db.backends.utils import CursorWrapper
+
+    seconds = _limit(seconds)
+    timings = QueryTimings()
+    with _exclusive(_db_lock, "db_summary"):
+        execute = CursorWrapper.execute
+        executemany = CursorWrapper.executemany
+        CursorWrapper.execute = timings.timed(execute)
+        CursorWrapper.executemany = timings.timed(executemany)
+        try:
+            with _time_job_storage(timings):
+                time.sleep(seconds)
+        finally:
+            CursorWrapper.execute = execute
+            CursorWrapper.executemany = executemany
+    return {
+        "open_files": open_database_files(),
+        "seconds": seconds,
+        "statements": timings.top(limit),
+    }
+
+
+def gc_stats(seconds=0, types=0):
+    """
+    Returns the garbage collector's counts and stats, the time it spends collecting each
+    generation over the next `seconds`, and the `types` most common types of objects
+    it tracks, which takes a moment with the GIL held when there are many objects
+    """
+    seconds = _limit(seconds)
+    collections_by_generation = collections.defaultdict(lambda: [0, 0.0, 0.0])
+    starts = {}
+
+    def callback(phase, info):
+        if phase == "start":
+            starts[info["generation"]] = time.perf_counter()
+        elif info["generation"] in starts:
+            duration = time.perf_counter() - starts.pop(info["generation"])
+            timing = collections_by_generation[info["generation"]]
+            timing[0] += 1
+            timing[1] += duration
+            timing[2] = max(timing[2], duration)
+
+    with _exclusive(_gc_lock, "gc_stats"):
+        if seconds:
+            gc.callbacks.append(callback)
+            try:
+                time.sleep(seconds)
+            finally:
+                gc.callbacks.remove(callback)
+        result = {
+            "enabled": gc.isenabled(),
+            "counts": gc.get_count(),
+            "thresholds": gc.get_threshold(),
+            "stats": gc.get_stats(),
+            "garbage": len(gc.garbage),
+            "seconds": seconds,
+            "collections": {
+                generation: {
+                    "count": count,
+                    "total_ms": total * 1000,
+                    "max_ms": longest * 1000,
+                }
+                for generation, (count, total, longest) in sorted(
+                    collections_by_generation.items()
+                )
+            },
+        }
+        if types:
+            counts = collections.Counter(type(obj).__name__ for obj in gc.get_objects())
+            result["types"] = counts.most_common(min(int(types), 100))
+    return result
+
+
+TOOLS = {
+    "sample_stacks": sample_stacks,
+    "thread_stacks": thread_stacks,
+    "memory_snapshot": memory_snapshot,
+    "memory_diff": memory_diff,
+    "memory_stop": memory_stop,
+    "db_summary": db_summary,
+    "gc_stats": gc_stats,
+}
+
+
+def run_tool(name, kwargs):
+    if name not in TOOLS:
+        raise DiagnosticsError("No tool {}".format(name))
+    return TOOLS[name](**kwargs)
+
+
+def _peer_uid(conn):
+    creds = conn.getsockopt(
+        socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")
+    )
+    return struct.unpack("3i", creds)[1]
+
+
+def _answer(conn):
+    with conn, conn.makefile("rw") as channel:
+        if _peer_uid(conn) != os.getuid():
+            return
+        conn.settimeout(5)
+        request = json.loads(channel.readline())
+        conn.settimeout(None)
+        try:
+            response = {"result": run_tool(request["tool"], request["kwargs"])}
+        except Exception as e:
+            response = {"error": "{}: {}".format(type(e).__name__, e)}
+        channel.write(json.dumps(response, default=str) + "\n")
+        channel.flush()
+
+
+_requests = threading.BoundedSemaphore(MAX_REQUESTS)
+
+
+def _answer_safely(conn):
+    try:
+        _answer(conn)
+    except Exception as e:
+        logger.warning("Diagnostics request failed: {}".format(e))
+    finally:
+        _requests.release()
+
+
+def _serve(listener):
+    # Each request is answered on its own thread, so that a tool that runs for a while
+    # does not hold up others, such as dumping the stacks while profiling
+    while True:
+        conn, _ = listener.accept()
+        if not _requests.acquire(blocking=False):
+            conn.close()
+            continue
+        threading.Thread(
+            target=_answer_safely,
+            args=(conn,),
+            name="diagnostics request",
+            daemon=True,
+        ).start()
+
+
+def _registry_dir(home):
+    return os.path.join(home, DIR_NAME)
+
+
+def start_agent(home):
+    """
+    Serves the tools to the remote shell from a thread, until the process exits
+    """
+    if not enabled:
+        return
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        listener.bind(ADDRESS_PREFIX + str(os.getpid()))
+        listener.listen(MAX_REQUESTS)
+        os.makedirs(_registry_dir(home), exist_ok=True)
+        entry = os.path.join(
+            _registry_dir(home), "{}-{}".format(boot_trace.process_role(), os.getpid())
+        )
+        open(entry, "w").close()
+    except OSError as e:
+        logger.warning("Not serving diagnostics: {}".format(e))
+        listener.close()
+        return
+    atexit.register(os.remove, entry)
+    threading.Thread(
+        target=_serve, args=(listener,), name="diagnostics", daemon=True
+    ).start()
+
+
+def processes(home):
+    """
+    Returns the role and pid of each process serving the tools, forgetting exited ones
+    """
+    try:
+        entries = os.listdir(_registry_dir(home))
+    except OSError:
+        return []
+    running = []
+    for entry in entries:
+        role, _, pid = entry.rpartition("-")
+        if not pid.isdigit():
+            continue
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            os.remove(os.path.join(_registry_dir(home), entry))
+            continue
+        except PermissionError:
+            # The pid has been reused by another app's process
+            continue
+        running.append((role, int(pid)))
+    return sorted(running)
+
+
+def call(pid, tool, **kwargs):
+    """
+    Runs a tool in the process with the pid, and returns its result
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.settimeout(MAX_SECONDS + 30)
+        conn.connect(ADDRESS_PREFIX + str(pid))
+        with conn.makefile("rw") as channel:
+            channel.write(json.dumps({"tool": tool, "kwargs": kwargs}) + "\n")
+            channel.flush()
+            response = json.loads(channel.readline())
+    if "error" in response:
+        raise DiagnosticsError(response["error"])
+    return response["result"]
+
+
+class Report(str):
+    """
+    Text that the remote shell shows as is, rather than as a string literal
+    """
+
+    def __repr__(self):
+        return str(self)
+
+
+def _format_statements(statements):
+    lines = ["{:>8} {:>10} {:>10}  {}".format("count", "total ms", "max ms", "sql")]
+    for statement in statements:
+        lines.append(
+            "{count:>8} {total_ms:>10.1f} {max_ms:>10.1f}  {sql}".format(**statement)
+        )
+    return lines
+
+
+class Toolkit(object):
+    """
+    Diagnostics for the app's processes, each given as a role, "main", "taskworker" or
+    "remoteshell", or as a pid. Each runs on a thread, and returns a Deferred that the
+    shell shows the result of once it is done:
+
+    diagnostics.processes()
+    diagnostics.profile(process="main", seconds=10, interval=0.01, thread_prefix=None)
+        samples stacks, writing them to a file for flamegraph.pl or speedscope
+    diagnostics.stacks(process="main")
+    diagnostics.memory_snapshot(process="main", limit=20)
+    diagnostics.memory_diff(process="main", first=None, second=None, limit=20)
+    diagnostics.memory_stop(process="main")
+    diagnostics.db(process="main", seconds=10, limit=20)
+    diagnostics.gc(process="main", seconds=0, types=0)
+    """
+
+    def __init__(self, home, run_in_thread):
+        self.home = home
+        self.run_in_thread = run_in_thread
+
+    def __repr__(self):
+        return self.__doc__
+
+    def _pid(self, process):
+        if process == boot_trace.process_role() or process == os.getpid():
+            return None
+        running = processes(self.home)
+        pids = [pid for role, pid in running if process in (role, pid)]
+        if len(pids) != 1:
+            raise DiagnosticsError(
+                "{} matches {} of the processes serving diagnostics: {}".format(
+                    process, len(pids), running
+                )
+            )
+        return pids[0]
+
+    def _call(self, process, tool, **kwargs):
+        pid = self._pid(process)
+        if pid is None:
+            return run_tool(tool, kwargs)
+        return call(pid, tool, **kwargs)
+
+    def _run(self, format_result, process, tool, **kwargs):
+        def run():
+            return Report(format_result(self._call(process, tool, **kwargs)))
+
+        return self.run_in_thread(run)
+
+    def processes(self):
+        return Report(
+            "\n".join(
+                "{:<12} {}".format(role, pid) for role, pid in processes(self.home)
+            )
+        )
+
+    def _write_profile(self, process, lines):
+        profiles_dir = os.path.join(self.home, DIR_NAME, PROFILES_DIR_NAME)
+        os.makedirs(profiles_dir, exist_ok=True)
+        path = os.path.join(
+            profiles_dir,
+            "{}-{:%Y%m%d-%H%M%S}.folded".format(process, datetime.now()),
+        )
+        with open(path, "w") as f:
+            f.writelines(line + "\n" for line in lines)
+        for name in sorted(os.listdir(profiles_dir))[:-MAX_PROFILES]:
+            os.remove(os.path.join(profiles_dir, name))
+        return path
+
+    def profile(self, process="main", seconds=10, interval=0.01, thread_prefix=None):
+        def summarize(lines):
+            path = self._write_profile(process, lines)
+            # The innermost frame of each stack is where the samples were spent
+            functions = collections.Counter()
+            for line in lines:
+                stack, _, count = line.rpartition(" ")
+                functions[stack.rsplit(";", 1)[-1]] += int(count)
+            total = sum(functions.values())
+            summary = [
+                "{} samples written to {}".format(total, path),
+                "{:>6}  {}".format("%", "function"),
+            ]
+            for function, count in functions.most_common(15):
+                summary.append("{:>6.1f}  {}".format(count * 100 / total, function))
+            return "\n".join(summary)
+
+        return self._run(
+            summarize,
+            process,
+            "sample_stacks",
+            seconds=seconds,
+            interval=interval,
+            thread_prefix=thread_prefix,
+        )
+
+    def stacks(self, process="main"):
+        def format_stacks(stacks):
+            return "\n".join(
+                "{}:\n{}".format(name, "".join(stack))
+                for name, stack in sorted(stacks.items())
+            )
+
+        return self._run(format_stacks, process, "thread_stacks")
+
+    def memory_snapshot(self, process="main", limit=20):
+        def format_snapshot(result):
+            return "\n".join(
+                ["Snapshot {snapshot}, {traced_kb} kB traced".format(**result)]
+                + result["top"]
+            )
+
+        return self._run(format_snapshot, process, "memory_snapshot", limit=limit)
+
+    def memory_diff(self, process="main", first=None, second=None, limit=20):
+        def format_diff(result):
+            return "\n".join(
+                ["Snapshot {first} to {second}".format(**result)] + result["top"]
+            )
+
+        return self._run(
+            format_diff,
+            process,
+            "memory_diff",
+            first=first,
+            second=second,
+            limit=limit,
+        )
+
+    def memory_stop(self, process="main"):
+        return self._run(lambda _: "Stopped tracing", process, "memory_stop")
+
+    def db(self, process="main", seconds=10, limit=20):
+        def format_summary(result):
+            lines = ["Open database files:"]
+            lines.extend(
+                "{:>4}  {}".format(count, path)
+                for path, count in sorted(result["open_files"].items())
+            )
+            lines.append("Statements over {}s:".format(result["seconds"]))
+            lines.extend(_format_statements(result["statements"]))
+            return "\n".join(lines)
+
+        return self._run(
+            format_summary, process, "db_summary", seconds=seconds, limit=limit
+        )
+
+    def gc(self, process="main", seconds=0, types=0):
+        def format_stats(result):
+            lines = [
+                "enabled {enabled}, counts {counts}, thresholds {thresholds}, "
+                "uncollectable {garbage}".format(**result)
+            ]
+            for generation, stats in enumerate(result["stats"]):
+                lines.append("generation {}: {}".format(generation, stats))
+            for generation, timing in result["collections"].items():
+                lines.append(
+                    "generation {} over {}s: {count} collections, {total_ms:.1f} ms, "
+                    "longest {max_ms:.1f} ms".format(
+                        generation, result["seconds"], **timing
+                    )
+                )
+            lines.extend(
+                "{:>10}  {}".format(count, name)
+                for name, count in result.get("types", [])
+            )
+            return "\n".join(lines)
+
+        return self._run(
+            format_stats, process, "gc_stats", seconds=seconds, types=types
+        )
@@ -1,11 +1,93 @@
-try:
-    from strings import i18n_strings
-except ImportError:
-    i18n_strings = {}
+"""
+Strings
+=======
 
+Translations of the strings that we only use from Python, generated by
+scripts/create_strings.py as one small JSON catalog per Kolibri language in `i18n_strings/`,
+such as `es-419.json`, mapping each string to its translation.
 
-def get_string(name, language):
+Only the catalogs of the requested language and its fallbacks are loaded, on first use, so
+the memory used does not grow with the number of languages shipped.
+
+Language tags, as given by `Locale.toLanguageTag()`, fall back to less specific ones until a
+catalog has the string, then to other catalogs for the same language, and then to the string
+itself, so that `es-MX` resolves through `es-419` and `es`.
+"""
+import json
+import os
+from functools import lru_cache
+
+CATALOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "i18n_strings")
+
+# Regions whose Spanish falls back to Latin American Spanish, as in CLDR's parent locales
+LATIN_AMERICAN_REGIONS = {
+    "ar",
+    "bo",
+    "br",
+    "bz",
+    "cl",
+    "co",
+    "cr",
+    "cu",
+    "do",
+    "ec",
+    "gt",
+    "hn",
+    "mx",
+    "ni",
+    "pa",
+    "pe",
+    "pr",
+    "py",
+    "sv",
+    "us",
+    "uy",
+    "ve",
+}
+
+
+@lru_cache(maxsize=1)
+def _available_languages():
+    try:
+        names = os.listdir(CATALOG_DIR)
+    except OSError:
+        return ()
+    return tuple(sorted(name[:-5] for name in names if name.endswith(".json")))
+
+
+@lru_cache(maxsize=None)
+def _catalog(language):
     try:
-        return i18n_strings[language][name]
-    except KeyError:
-        return name
+        with open(os.path.join(CATALOG_DIR, language + ".json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+@lru_cache(maxsize=None)
+def fallback_chain(language):
+    """
+    Returns the languages with a catalog to look a string up in, most specific first
+    """
+    subtags = language.lower().replace("_", "-").split("-")
+    chain = []
+    for i in range(len(subtags), 0, -1):
+        chain.append("-".join(subtags[:i]))
+        if i == 2 and subtags[0] == "es" and subtags[1] in LATIN_AMERICAN_REGIONS:
+            chain.append("es-419")
+    available = _available_languages()
+    chain.extend(other for other in available if other.split("-")[0] == subtags[0])
+    # Keep the first of any duplicates, and only the languages we have catalogs for
+    return tuple(
+        code
+        for i, code in enumerate(chain)
+        if code in available and code not in chain[:i]
+    )
+
+
+def get_string(name, language):
+    for code in fallback_chain(language):
+        catalog = _catalog(code)
+        if name in catalog:
+            return catalog[name]
+    return name
@@ -2,49 +2,93 @@ import os
 import re
 import sys
 
-import kolibri  # noqa: F401  Import Kolibri here so we can import modules from dist folder
-import monkey_patch_zeroconf  # noqa: F401 Import this to patch zeroconf
-from android_utils import get_context
-from android_utils import get_home_folder
-from android_utils import get_signature_key_issuing_organization
-from android_utils import get_timezone_name
-from android_utils import get_version_name
-from jnius import autoclass
+import boot_trace
+import bytecode_importer
+from boot_trace import trace
+
+with trace("bytecode index"):
+    bytecode_importer.install()
+
+with trace("import"):
+    import kolibri  # noqa: F401  Import Kolibri here so we can import modules from dist folder
+    import monkey_patch_zeroconf  # noqa: F401 Import this to patch zeroconf
+    from android_utils import get_context
+    from android_utils import get_home_folder
+    from android_utils import get_signature_key_issuing_organization
+    from android_utils import get_timezone_name
+    from android_utils import get_version_name
+    from boot_environment import load_boot_environment
+    from boot_environment import save_boot_environment
+    from device_profile import get_device_settings
+    from java_classes import get_class
 
 script_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(script_dir)
 
-os.environ["KOLIBRI_HOME"] = get_home_folder()
-os.environ["KOLIBRI_APK_VERSION_NAME"] = get_version_name()
-os.environ["DJANGO_SETTINGS_MODULE"] = "kolibri_app_settings"
-# Disable restart hooks, as the default restart hook will crash the app.
-os.environ["KOLIBRI_RESTART_HOOKS"] = ""
-signing_org = get_signature_key_issuing_organization()
-if signing_org == "Learning Equality":
-    runmode = "android-testing"
-elif signing_org == "Android":
-    runmode = "android-debug"
-elif signing_org == "Google Inc.":
-    runmode = ""  # Play Store!
-else:
-    runmode = "android-" + re.sub(r"[^a-z ]", "", signing_org.lower()).replace(" ", "-")
-os.environ["KOLIBRI_RUN_MODE"] = runmode
-
-os.environ["TZ"] = get_timezone_name()
-os.environ["LC_ALL"] = "en_US.UTF-8"
-
 
-os.environ["KOLIBRI_CHERRYPY_THREAD_POOL"] = "2"
+def get_run_mode():
+    with trace("signature lookup"):
+        signing_org = get_signature_key_issuing_organization()
+    if signing_org == "Learning Equality":
+        return "android-testing"
+    elif signing_org == "Android":
+        return "android-debug"
+    elif signing_org == "Google Inc.":
+        return ""  # Play Store!
+    return "android-" + re.sub(r"[^a-z ]", "", signing_org.lower()).replace(" ", "-")
 
 
-def set_node_id():
-    Secure = autoclass("android.provider.Settings$Secure")
+def get_node_id():
+    Secure = get_class("android.provider.Settings$Secure")
     node_id = Secure.getString(get_context().getContentResolver(), Secure.ANDROID_ID)
 
     # Don't set this if the retrieved id is falsy, too short, or a specific
     # id that is known to be hardcoded in many devices.
     if node_id and len(node_id) >= 16 and node_id != "9774d56d682e549c":
-        os.environ["MORANGO_NODE_ID"] = node_id
+        return node_id
+    return None
+
 
+def get_boot_environment():
+    """
+    Derive the environment variables that depend on the device and the installed APK
+    """
+    environment = {}
+    with trace("home folder"):
+        environment["KOLIBRI_HOME"] = get_home_folder()
+    with trace("version name"):
+        environment["KOLIBRI_APK_VERSION_NAME"] = get_version_name()
+    environment["KOLIBRI_RUN_MODE"] = get_run_mode()
+    with trace("timezone"):
+        environment["TZ"] = get_timezone_name()
+    with trace("node id"):
+        node_id = get_node_id()
+    if node_id:
+        environment["MORANGO_NODE_ID"] = node_id
+    return environment
+
+
+with trace("boot environment"):
+    boot_environment = load_boot_environment()
+if boot_environment is None:
+    boot_environment = get_boot_environment()
+    save_boot_environment(boot_environment)
+os.environ.update(boot_environment)
+boot_trace.set_home(os.environ["KOLIBRI_HOME"])
+
+os.environ["DJANGO_SETTINGS_MODULE"] = "kolibri_app_settings"
+# Disable restart hooks, as the default restart hook will crash the app.
+os.environ["KOLIBRI_RESTART_HOOKS"] = ""
+os.environ["LC_ALL"] = "en_US.UTF-8"
 
-set_node_id()
+# Size the server, database cache and task workers to the device, profiling it afresh
+# each time the app starts, and reusing that profile in the other processes
+with trace("device profile"):
+    device_settings = get_device_settings(
+        home=os.environ["KOLIBRI_HOME"],
+        refresh=boot_trace.process_role() == "main",
+    )
+os.environ["KOLIBRI_CHERRYPY_THREAD_POOL"] = str(device_settings["server_threads"])
+os.environ["KOLIBRI_ANDROID_SQLITE_CACHE_KB"] = str(device_settings["sqlite_cache_kb"])
+os.environ["KOLIBRI_ANDROID_CACHE_MEMORY_KB"] = str(device_settings["cache_memory_kb"])
+os.environ["KOLIBRI_ANDROID_TASK_WORKERS"] = str(device_settings["task_workers"])
@@ -0,0 +1,100 @@
+"""
+Java classes
+============
+
+Resolves Java classes through jnius reflection once per process, and shares them between
+callers, as each `autoclass` call is an expensive walk over the class through JNI.
+
+Classes in `PRELOAD` can be resolved ahead of time on a background thread, once the app is
+otherwise idle. Only framework classes are preloaded, as threads started from python can
+only find classes through the system class loader, which cannot see the app's own classes.
+"""
+import logging
+import threading
+import time
+
+from jnius import autoclass
+
+logger = logging.getLogger(__name__)
+
+# Framework classes that are used in response to user actions, rather than on startup
+PRELOAD = [
+    "android.app.Notification$Builder",
+    "android.app.NotificationChannel",
+    "android.app.NotificationManager",
+    "android.app.PendingIntent",
+    "android.content.Context",
+    "android.content.Intent",
+    "android.content.pm.PackageManager",
+    "android.net.ConnectivityManager",
+    "android.os.Build$VERSION",
+    "java.io.File",
+    "java.lang.String",
+    "java.util.Locale",
+]
+
+
+class JavaClassRegistry:
+    def __init__(self):
+        self._classes = {}
+        self._lock = threading.Lock()
+        # Class name to [number of lookups, seconds spent resolving]
+        self._stats = {}
+
+    def get(self, name):
+        with self._lock:
+            java_class = self._resolve(name)
+            self._stats[name][0] += 1
+        return java_class
+
+    def _resolve(self, name):
+        if name in self._classes:
+            return self._classes[name]
+        start = time.monotonic()
+        java_class = autoclass(name)
+        self._classes[name] = java_class
+        self._stats[name] = [0, time.monotonic() - start]
+        return java_class
+
+    def preload(self, names=None):
+        """
+        Resolve classes on a background thread, so they are ready when first needed
+        """
+
+        def run():
+            try:
+                for name in names or PRELOAD:
+                    try:
+                        with self._lock:
+                            self._resolve(name)
+                    except Exception as e:
+                        # Such as classes added in a later API level than the device's
+                        logger.warning(
+                            "Failed to preload Java class {}: {}".format(name, e)
+                        )
+            finally:
+                from jnius import detach
+
+                # Threads started from python must be detached from the JVM before exiting
+                detach()
+            logger.debug("Java class registry: {}".format(self.report()))
+
+        thread = threading.Thread(target=run, name="java-class-preload", daemon=True)
+        thread.start()
+        return thread
+
+    def report(self):
+        """
+        Returns the number of lookups and milliseconds spent resolving each class
+        """
+        return {
+            name: {"lookups": lookups, "resolve_ms": round(seconds * 1000, 2)}
+            for name, (lookups, seconds) in self._stats.items()
+        }
+
+
+registry = JavaClassRegistry()
+
+
+def get_class(name):
+    return registry.get(name)
@@ -2,7 +2,54 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import os
+
+from boot_trace import process_role
+from django.db.backends.signals import connection_created
 from kolibri.deployment.default.settings.base import *  # noqa E402
+from kolibri.utils.conf import KOLIBRI_HOME
+from kolibri.utils.conf import OPTIONS
+from sqlite_profile import connection_pragmas
+from sqlite_profile import get_profile
 
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
 SESSION_COOKIE_AGE = 52560000
+
+# Sized to the device by device_profile when the app starts
+CACHE_MEMORY_KB = int(os.environ.get("KOLIBRI_ANDROID_CACHE_MEMORY_KB") or 0)
+SQLITE_CACHE_KB = int(os.environ.get("KOLIBRI_ANDROID_SQLITE_CACHE_KB") or 0)
+
+# Bound the memory used by the default cache, backing it with a cache on disk, as the
+# default local memory cache is only bounded by its number of entries
+if OPTIONS["Cache"]["CACHE_BACKEND"] != "redis" and CACHE_MEMORY_KB:
+    CACHES["default"] = {  # noqa F405
+        "BACKEND": "android_cache.TieredCache",
+        "LOCATION": os.path.join(KOLIBRI_HOME, "android_cache"),
+        "TIMEOUT": OPTIONS["Cache"]["CACHE_TIMEOUT"],
+        "OPTIONS": {
+            "MEMORY_BYTES": CACHE_MEMORY_KB * 1024,
+            "DISK_BYTES": 64 * 1024 * 1024,
+        },
+    }
+
+# Time every request, including the time spent in Kolibri's middleware
+MIDDLEWARE = [  # noqa F405
+    "android_app_plugin.middleware.RequestMetricsMiddleware"
+] + MIDDLEWARE  # noqa F405
+
+SQLITE_ROLE = process_role()
+SQLITE_PRAGMAS = connection_pragmas(SQLITE_ROLE, cache_kb=SQLITE_CACHE_KB)
+
+for database in DATABASES.values():  # noqa F405
+    if database["ENGINE"] == "django.db.backends.sqlite3":
+        database["CONN_MAX_AGE"] = get_profile(SQLITE_ROLE)["conn_max_age"]
+
+
+def apply_sqlite_profile(sender, connection, **kwargs):
+    if connection.vendor == "sqlite":
+        cursor = connection.cursor()
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+
+
+connection_created.connect(apply_sqlite_profile)
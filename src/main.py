@@ -1,26 +1,35 @@
 import logging
+import os
 from uuid import uuid4
 
 import initialization  # noqa: F401 keep this first, to ensure we're set up for other imports
+from android_cache import trim_memory
 from android_utils import get_dummy_user_name
 from android_utils import share_by_intent
-from jnius import autoclass
+from boot_trace import mark
+from boot_trace import trace
+from diagnostics import start_agent
+from java_classes import get_class
+from java_classes import registry
+from jnius import java_method
+from jnius import PythonJavaClass
 from kolibri.main import enable_plugin
 from kolibri.plugins.app.utils import interface
 from kolibri.utils.cli import initialize
 from kolibri.utils.server import BaseKolibriProcessBus
 from kolibri.utils.server import KolibriServerPlugin
-from kolibri.utils.server import ZeroConfPlugin
 from kolibri.utils.server import ZipContentServerPlugin
 from magicbus.plugins import SimplePlugin
+from monkey_patch_zeroconf import watch_network_changes
 from runnable import Runnable
 
 # from android_utils import is_active_network_metered
 
+mark("imports")
 
-PythonActivity = autoclass("org.kivy.android.PythonActivity")
+PythonActivity = get_class("org.kivy.android.PythonActivity")
 
-FullScreen = autoclass("org.learningequality.FullScreen")
+FullScreen = get_class("org.learningequality.FullScreen")
 configureWebview = Runnable(FullScreen.configureWebview)
 configureWebview(PythonActivity.mActivity)
 
@@ -35,34 +44,75 @@ def os_user(auth_token):
     return None, False
 
 
+class TrimMemoryCallbacks(PythonJavaClass):
+    """
+    Shrinks our caches when Android asks the app to trim its memory
+    """
+
+    __javainterfaces__ = ["android/content/ComponentCallbacks2"]
+
+    # ComponentCallbacks2.TRIM_MEMORY_COMPLETE
+    TRIM_MEMORY_COMPLETE = 80
+
+    @java_method("(I)V")
+    def onTrimMemory(self, level):
+        trim_memory(level)
+
+    @java_method("()V")
+    def onLowMemory(self):
+        trim_memory(self.TRIM_MEMORY_COMPLETE)
+
+    @java_method("(Landroid/content/res/Configuration;)V")
+    def onConfigurationChanged(self, configuration):
+        pass
+
+
 class AppPlugin(SimplePlugin):
     def __init__(self, bus):
         self.bus = bus
         self.bus.subscribe("SERVING", self.SERVING)
 
     def SERVING(self, port):
+        mark("SERVING")
         start_url = "http://127.0.0.1:{port}".format(
             port=port
         ) + interface.get_initialize_url(auth_token=auth_token_value)
         loadUrl(start_url)
+        mark("loadUrl")
+        # Now that the UI is loading, resolve classes we'll need later in the background
+        registry.preload()
 
 
 logging.info("Initializing Kolibri and running any upgrade routines")
 
 # activate app mode
-enable_plugin("kolibri.plugins.app")
-enable_plugin("android_app_plugin")
+with trace("enable plugins"):
+    enable_plugin("kolibri.plugins.app")
+    enable_plugin("android_app_plugin")
 
 # we need to initialize Kolibri to allow us to access the app key
-initialize()
+with trace("initialize"):
+    initialize()
+
+# Let the remote shell look into this process
+start_agent(os.environ["KOLIBRI_HOME"])
+
+# Kolibri's discovery modules can only be imported once Django is set up
+from peer_discovery import PeerDiscoveryPlugin  # noqa: E402
 
 interface.register(share_file=share_by_intent)
 # interface.register(check_is_metered=is_active_network_metered)
 interface.register(get_os_user=os_user)
 
-kolibri_bus = BaseKolibriProcessBus()
-# Setup zeroconf plugin
-zeroconf_plugin = ZeroConfPlugin(kolibri_bus, kolibri_bus.port)
+# Keep a reference, so it is not garbage collected while registered with Java
+trim_memory_callbacks = TrimMemoryCallbacks()
+PythonActivity.mActivity.registerComponentCallbacks(trim_memory_callbacks)
+watch_network_changes(PythonActivity.mActivity)
+
+with trace("bus setup"):
+    kolibri_bus = BaseKolibriProcessBus()
+# Setup zeroconf plugin, with discovered peers cached across launches
+zeroconf_plugin = PeerDiscoveryPlugin(kolibri_bus, kolibri_bus.port)
 zeroconf_plugin.subscribe()
 kolibri_server = KolibriServerPlugin(
     kolibri_bus,
@@ -78,4 +128,5 @@ kolibri_server.subscribe()
 alt_port_server.subscribe()
 app_plugin = AppPlugin(kolibri_bus)
 app_plugin.subscribe()
+mark("bus run")
 kolibri_bus.run()
@@ -1,11 +1,110 @@
+"""
+Replaces zeroconf's address lookup, which cannot list interfaces on Android, with one that
+asks Java for the active IPv4 addresses.
+
+Zeroconf asks for the addresses on every announcement and every tick of Kolibri's zeroconf
+plugin, and each answer walks all the network interfaces over JNI, so the list is cached.
+It is refreshed when Android reports a change in connectivity, once `watch_network_changes`
+has registered for changes, and in any case once it is `MAX_AGE` seconds old, as when the
+device starts a hotspot, which Android does not report as a network change.
+"""
+import logging
+import threading
+import time
+
 import zeroconf
-from jnius import autoclass
+from java_classes import get_class
+from jnius import java_method
+from jnius import PythonJavaClass
 
-NetworkUtils = autoclass("org.learningequality.NetworkUtils")
+logger = logging.getLogger(__name__)
 
+MAX_AGE = 60
 
-def get_all_addresses():
+
+def _fetch_addresses():
+    NetworkUtils = get_class("org.learningequality.NetworkUtils")
     return list(NetworkUtils.getActiveIPv4Addresses())
 
 
+class AddressCache:
+    def __init__(self, fetch=_fetch_addresses, max_age=MAX_AGE, clock=time.monotonic):
+        self._fetch = fetch
+        self.max_age = max_age
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._addresses = None
+        self._fetched_at = None
+        self._stale = True
+        self.refreshed = 0
+        self.served = 0
+
+    def invalidate(self):
+        self._stale = True
+
+    def get(self):
+        with self._lock:
+            now = self._clock()
+            if (
+                self._stale
+                or self._fetched_at is None
+                or now - self._fetched_at >= self.max_age
+            ):
+                # Clear this first, so a change reported during the fetch is not lost
+                self._stale = False
+                try:
+                    self._addresses = self._fetch()
+                except Exception:
+                    # Fetch again next time, rather than serving the old addresses
+                    self._stale = True
+                    raise
+                self._fetched_at = now
+                self.refreshed += 1
+            else:
+                self.served += 1
+            return list(self._addresses)
+
+    def report(self):
+        return {"refreshed": self.refreshed, "served": self.served}
+
+
+address_cache = AddressCache()
+
+
+def get_all_addresses():
+    return address_cache.get()
+
+
+class NetworkChangeListener(PythonJavaClass):
+    __javainterfaces__ = ["org/learningequality/NetworkUtils$NetworkChangeListener"]
+
+    def __init__(self, cache):
+        super(NetworkChangeListener, self).__init__()
+        self.cache = cache
+
+    @java_method("()V")
+    def onNetworkChanged(self):
+        logger.debug(
+            "Network changed, addresses refreshed {refreshed} times and served "
+            "{served} times from cache".format(**self.cache.report())
+        )
+        self.cache.invalidate()
+
+
+# Keep a reference, so it is not garbage collected while registered with Java
+_listener = None
+
+
+def watch_network_changes(context):
+    """
+    Refresh the cached addresses when connectivity changes. Call this from the main thread,
+    which can find the app's Java classes.
+    """
+    global _listener
+    if _listener is None:
+        NetworkUtils = get_class("org.learningequality.NetworkUtils")
+        _listener = NetworkChangeListener(address_cache)
+        NetworkUtils.registerNetworkChangeListener(context, _listener)
+
+
 zeroconf.get_all_addresses = get_all_addresses
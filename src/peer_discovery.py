@@ -0,0 +1,242 @@
+"""
+Peer discovery
+==============
+
+Kolibri's zeroconf plugin forgets the peers it found when the app stops, so each launch
+waits on multicast responses, often over congested school Wi-Fi, before any device shows
+up in the "find devices" screen.
+
+`PeerDiscoveryPlugin` replaces it, and saves the peers it discovers to a `ValueStore`
+under KOLIBRI_HOME, keyed by the network they were seen on. When our broadcast starts, or
+the device moves to another network, the peers last seen on that network are added as
+network locations straight away, as if they had just been discovered, and Kolibri checks
+that they can still be reached while live discovery carries on. Peers expire once they
+have not been seen for `PEER_TTL` seconds, and are forgotten when they leave the network.
+
+Networks are identified by the /24 subnets of the device's addresses, as Android only
+reveals the Wi-Fi SSID to apps with the location permission.
+
+For the first `STARTUP_WINDOW` seconds of a broadcast, while peers answer our first
+queries and the Wi-Fi connection settles, the plugin also reuses the result of a service
+lookup made in the last `LOOKUP_REUSE` seconds, rather than querying the network again for
+the update that zeroconf reports along with each new peer, and only rebroadcasts on new
+addresses once they have been stable for two checks.
+"""
+import ipaddress
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from kolibri.core.discovery.utils.network.broadcast import build_broadcast_instance
+from kolibri.core.discovery.utils.network.broadcast import KolibriBroadcast
+from kolibri.core.discovery.utils.network.broadcast import KolibriInstance
+from kolibri.core.discovery.utils.network.search import NetworkLocationListener
+from kolibri.utils.conf import KOLIBRI_HOME
+from kolibri.utils.server import ZeroConfPlugin
+from monkey_patch_zeroconf import get_all_addresses
+from value_store import ValueStore
+
+logger = logging.getLogger(__name__)
+
+PEER_CACHE_FILENAME = "peer_cache.log"
+
+PEER_TTL = 3 * 24 * 60 * 60
+# How often to save that a peer has been seen again, if nothing else about it changed
+SEEN_SAVE_INTERVAL = 60 * 60
+
+STARTUP_WINDOW = 60
+LOOKUP_REUSE = 10
+
+
+def network_key(addresses):
+    """
+    Returns a key for the networks the device is on, or None if it is on none
+    """
+    subnets = sorted(
+        {
+            str(ipaddress.ip_network(address + "/24", strict=False))
+            for address in addresses
+            if not address.startswith("127.")
+        }
+    )
+    return ",".join(subnets) or None
+
+
+class PeerCache:
+    """
+    The peers seen on each network, as dicts of their `KolibriInstance.to_dict()` and the
+    time they were last seen, by instance id
+    """
+
+    def __init__(self, path, ttl=PEER_TTL, clock=time.time):
+        self.store = ValueStore(path)
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def _live(self, network):
+        now = self._clock()
+        return {
+            peer_id: peer
+            for peer_id, peer in (self.store.get(network) or {}).items()
+            if now - peer["last_seen"] < self.ttl
+        }
+
+    def peers(self, network):
+        if network is None:
+            return []
+        with self._lock:
+            return [peer["instance"] for peer in self._live(network).values()]
+
+    def seen(self, network, instance):
+        if network is None:
+            return
+        now = self._clock()
+        with self._lock:
+            peers = self._live(network)
+            previous = peers.get(instance["id"])
+            if (
+                previous is not None
+                and previous["instance"] == instance
+                and now - previous["last_seen"] < SEEN_SAVE_INTERVAL
+            ):
+                return
+            peers[instance["id"]] = {"instance": instance, "last_seen": now}
+            self.store.set(network, peers, ttl=self.ttl)
+
+    def forget(self, network, instance_id):
+        if network is None:
+            return
+        with self._lock:
+            peers = self._live(network)
+            if peers.pop(instance_id, None) is not None:
+                self.store.set(network, peers, ttl=self.ttl)
+
+
+peer_cache = PeerCache(os.path.join(KOLIBRI_HOME, PEER_CACHE_FILENAME))
+
+
+class CachingNetworkLocationListener(NetworkLocationListener):
+    """
+    Adds the cached peers for the current network as network locations, and keeps the
+    cache up to date with the peers discovered
+    """
+
+    def __init__(self, broadcast):
+        super(CachingNetworkLocationListener, self).__init__(broadcast)
+        self.network = None
+
+    def _serve_cached_peers(self):
+        self.network = network_key(get_all_addresses())
+        served = 0
+        for state in peer_cache.peers(self.network):
+            instance = KolibriInstance.from_dict(dict(state))
+            if instance.id == self.broadcast.instance.id:
+                continue
+            # This enqueues the same job as live discovery of the peer, so a peer that is
+            # also found live is only added once
+            super(CachingNetworkLocationListener, self).add_instance(instance)
+            served += 1
+        self.broadcast.counters["peers_served"] += served
+        logger.debug(
+            "Served {} cached peers for network {}".format(served, self.network)
+        )
+
+    def register_instance(self, instance):
+        super(CachingNetworkLocationListener, self).register_instance(instance)
+        self._serve_cached_peers()
+
+    def unregister_instance(self, instance):
+        super(CachingNetworkLocationListener, self).unregister_instance(instance)
+        # Also published when the broadcast moves to new addresses
+        if network_key(get_all_addresses()) != self.network:
+            self._serve_cached_peers()
+
+    def add_instance(self, instance):
+        super(CachingNetworkLocationListener, self).add_instance(instance)
+        peer_cache.seen(self.network, instance.to_dict())
+
+    def update_instance(self, instance):
+        super(CachingNetworkLocationListener, self).update_instance(instance)
+        peer_cache.seen(self.network, instance.to_dict())
+
+    def remove_instance(self, instance):
+        super(CachingNetworkLocationListener, self).remove_instance(instance)
+        peer_cache.forget(self.network, instance.id)
+
+
+class PeerDiscoveryBroadcast(KolibriBroadcast):
+    __slots__ = ("started_at", "counters", "_lookups")
+
+    def __init__(self, *args, **kwargs):
+        super(PeerDiscoveryBroadcast, self).__init__(*args, **kwargs)
+        self.started_at = None
+        self.counters = Counter()
+        # Service name to the time and result of its last lookup
+        self._lookups = {}
+
+    def in_startup_window(self):
+        return (
+            self.started_at is not None
+            and time.monotonic() - self.started_at < STARTUP_WINDOW
+        )
+
+    def start_broadcast(self):
+        self.started_at = time.monotonic()
+        super(PeerDiscoveryBroadcast, self).start_broadcast()
+
+    def _get_service_info(self, name):
+        lookup = self._lookups.get(name)
+        if (
+            lookup is not None
+            and self.in_startup_window()
+            and time.monotonic() - lookup[0] < LOOKUP_REUSE
+        ):
+            self.counters["lookups_reused"] += 1
+            return lookup[1]
+        service_info = super(PeerDiscoveryBroadcast, self)._get_service_info(name)
+        self.counters["lookups"] += 1
+        if self.in_startup_window():
+            self._lookups[name] = (time.monotonic(), service_info)
+        else:
+            self._lookups.clear()
+        return service_info
+
+
+class PeerDiscoveryPlugin(ZeroConfPlugin):
+    def __init__(self, bus, port):
+        super(PeerDiscoveryPlugin, self).__init__(bus, port)
+        self._pending_addresses = None
+
+    def RUN(self):
+        instance = build_broadcast_instance(self.port)
+
+        if self.broadcast is None:
+            self.broadcast = PeerDiscoveryBroadcast(
+                instance, interfaces=self.interfaces
+            )
+            self.broadcast.add_listener(CachingNetworkLocationListener)
+            self.broadcast.start_broadcast()
+        else:
+            interfaces = self.interfaces if self.addresses_changed else None
+            self.broadcast.update_broadcast(instance=instance, interfaces=interfaces)
+
+    def run(self):
+        if not self.addresses_changed:
+            self._pending_addresses = None
+            return
+        addresses = set(get_all_addresses())
+        if self.broadcast.in_startup_window() and addresses != self._pending_addresses:
+            # Wait for the addresses to settle before broadcasting on them
+            self._pending_addresses = addresses
+            self.broadcast.counters["address_updates_deferred"] += 1
+            return
+        self._pending_addresses = None
+        super(PeerDiscoveryPlugin, self).run()
+
+    def report(self):
+        if self.broadcast is None:
+            return {}
+        return dict(self.broadcast.counters)
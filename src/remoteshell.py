@@ -1,26 +1,66 @@
+import hashlib
+import hmac
+import logging
 import os
 
 import initialization  # noqa: F401 keep this first, to ensure we're set up for other imports
+from boot_trace import mark
+from boot_trace import trace
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.asymmetric import rsa
+from diagnostics import Toolkit
 from kolibri.main import initialize
 from twisted.conch import manhole
 from twisted.conch import manhole_ssh
+from twisted.conch.interfaces import IConchUser
+from twisted.conch.ssh import common
 from twisted.conch.ssh import keys
+from twisted.conch.ssh import userauth
 from twisted.cred import checkers
 from twisted.cred import credentials
 from twisted.cred import error
 from twisted.cred import portal
 from twisted.internet import defer
+from twisted.internet import protocol
 from twisted.internet import reactor
+from twisted.internet import threads
 from zope.interface import implementer
 
+logger = logging.getLogger(__name__)
 
-def get_key_pair(refresh=False):
+
+# Where each type of SSH server key is stored, under the Kolibri home folder
+KEY_FILENAMES = {
+    "ed25519": "ssh_host_ed25519_key",
+    "rsa": "ssh_host_key",
+}
+
+
+def _key_path(key_type):
+    return os.path.join(os.environ.get("KOLIBRI_HOME", "."), KEY_FILENAMES[key_type])
+
+
+def _generate_key(key_type):
+    if key_type == "ed25519":
+        # Imported here, as older builds of cryptography cannot make ed25519 keys
+        from cryptography.hazmat.primitives.asymmetric import ed25519
+
+        return (
+            ed25519.Ed25519PrivateKey.generate(),
+            # ed25519 keys can only be serialized in OpenSSH's own format
+            serialization.PrivateFormat.OpenSSH,
+        )
+    key = rsa.generate_private_key(
+        backend=default_backend(), public_exponent=65537, key_size=2048
+    )
+    return key, serialization.PrivateFormat.TraditionalOpenSSL
+
+
+def get_key_pair(refresh=False, key_type="rsa"):
 
     # calculate paths where we'll store our SSH server keys
-    KEYPATH = os.path.join(os.environ.get("KOLIBRI_HOME", "."), "ssh_host_key")
+    KEYPATH = _key_path(key_type)
     PUBKEYPATH = KEYPATH + ".pub"
 
     # check whether we already have keys there, and use them if so
@@ -29,12 +69,10 @@ def get_key_pair(refresh=False):
             return f.read(), pf.read()
 
     # otherwise, generate a new key pair and serialize it
-    key = rsa.generate_private_key(
-        backend=default_backend(), public_exponent=65537, key_size=2048
-    )
+    key, private_format = _generate_key(key_type)
     private_key = key.private_bytes(
         serialization.Encoding.PEM,
-        serialization.PrivateFormat.TraditionalOpenSSL,
+        private_format,
         serialization.NoEncryption(),
     ).decode()
     public_key = (
@@ -53,46 +91,287 @@ def get_key_pair(refresh=False):
     return private_key, public_key
 
 
+def get_host_keys():
+    """
+    Returns the public and private keys of the SSH server, by key type.
+
+    Prefers an ed25519 key, which takes a fraction of a millisecond to generate where an
+    RSA key takes seconds on a slow device, and which OpenSSH clients have supported since
+    6.5. An RSA key is still served if one was made before, so that clients that already
+    know it keep connecting, and is made if this build cannot make ed25519 keys.
+    """
+    public_keys = {}
+    private_keys = {}
+    for key_type in ("ed25519", "rsa"):
+        if key_type == "rsa" and private_keys and not os.path.isfile(_key_path("rsa")):
+            continue
+        try:
+            with trace("host key " + key_type):
+                private_key, public_key = get_key_pair(key_type=key_type)
+                public_key = keys.Key.fromString(public_key)
+                private_key = keys.Key.fromString(private_key)
+        except Exception as e:
+            if key_type == "rsa":
+                raise
+            logger.warning("Cannot use an {} host key: {}".format(key_type, e))
+            continue
+        public_keys[public_key.sshType()] = public_key
+        private_keys[private_key.sshType()] = private_key
+    return public_keys, private_keys
+
+
+class SourcedUsernamePassword(credentials.UsernamePassword):
+    """
+    Username and password credentials, with the address they were sent from
+    """
+
+    def __init__(self, username, password, source):
+        super(SourcedUsernamePassword, self).__init__(username, password)
+        self.source = source
+
+
+class KolibriUserAuthServer(userauth.SSHUserAuthServer):
+    """
+    Passes the address that a password login comes from to the credentials checker
+    """
+
+    def auth_password(self, packet):
+        password = common.getNS(packet[1:])[0]
+        creds = SourcedUsernamePassword(
+            self.user, password, self.transport.transport.getPeer().host
+        )
+        return self.portal.login(creds, None, IConchUser).addErrback(self._ebPassword)
+
+
 @implementer(checkers.ICredentialsChecker)
 class KolibriSuperAdminCredentialsChecker(object):
     """
     Check that the device is unprovisioned, or the credentials are for a super admin,
     or the password matches the temp password set over ADB.
+
+    Checks are made on a thread, as hashing passwords and querying the database would
+    stall every session served by the reactor. Super admin credentials that were checked
+    are remembered for SUCCESS_TTL seconds. Logins let in by the temp password, or because
+    the device is unprovisioned, are not remembered, as they stop working once either
+    changes. Sources whose logins fail are refused without checking, for a time that
+    doubles with each failure up to BACKOFF_MAX seconds. Logins from a source that already
+    has one being checked are refused too, so that a burst of guesses cannot get past the
+    backoff, or take every thread from the reactor's pool.
     """
 
     credentialInterfaces = (credentials.IUsernamePassword,)
 
+    SUCCESS_TTL = 60
+    BACKOFF_MAX = 60
+    # Users are deleted by other processes, which this one cannot listen for, so whether
+    # there are any is only remembered for a short time
+    PROVISIONED_TTL = 5
+
+    def __init__(self, clock=reactor):
+        self.clock = clock
+        # Keyed by a keyed hash of the credentials, so that passwords are not kept
+        self._key = os.urandom(32)
+        self._successes = {}
+        # Failures and when they may try again, by source address
+        self._failures = {}
+        # Sources with a login being checked on a thread
+        self._checking = set()
+        self._temp_password_stat = None
+        self._temp_password = None
+        self._provisioned = False
+        self._provisioned_until = 0
+
+    def _credentials_key(self, creds):
+        return hmac.new(
+            self._key, creds.username + b"\0" + creds.password, hashlib.sha256
+        ).digest()
+
     def requestAvatarId(self, creds):
-        from kolibri.core.auth.models import FacilityUser
+        source = getattr(creds, "source", None)
+        now = self.clock.seconds()
+        failures = self._failures.get(source)
+        if failures is not None and now < failures[1]:
+            return defer.fail(error.UnauthorizedLogin("Too many failed logins"))
 
-        # if a temporary password was set over ADB, allow login with it
+        key = self._credentials_key(creds)
+        if self._successes.get(key, 0) > now:
+            return defer.succeed(creds.username)
+
+        if source in self._checking:
+            return defer.fail(error.UnauthorizedLogin("Another login is being checked"))
+        self._checking.add(source)
+
+        def done_checking(result):
+            self._checking.discard(source)
+            return result
+
+        return (
+            threads.deferToThread(self._check, creds)
+            .addBoth(done_checking)
+            .addCallback(self._checked, key, source)
+        )
+
+    def _checked(self, result, key, source):
+        avatar_id, remember = result
+        now = self.clock.seconds()
+        if avatar_id is None:
+            count = self._failures.get(source, (0, 0))[0] + 1
+            self._failures[source] = (
+                count,
+                now + min(2 ** (count - 1), self.BACKOFF_MAX),
+            )
+            # Forget sources once they have not failed for a while
+            self._failures = {
+                other: failures
+                for other, failures in self._failures.items()
+                if failures[1] + self.BACKOFF_MAX > now
+            }
+            # no matching users were found, so fail
+            raise error.UnauthorizedLogin()
+        self._failures.pop(source, None)
+        self._successes = {
+            other: expiry for other, expiry in self._successes.items() if expiry > now
+        }
+        if remember:
+            self._successes[key] = now + self.SUCCESS_TTL
+        return avatar_id
+
+    def _read_temp_password(self):
+        """
+        Returns the temp password set over ADB, reading it again only if it has changed
+        """
         TEMP_ADMIN_PASS_PATH = os.path.join(
             os.environ.get("KOLIBRI_HOME", "."), "temp_admin_pass"
         )
-        if os.path.isfile(TEMP_ADMIN_PASS_PATH):
+        try:
+            stat = os.stat(TEMP_ADMIN_PASS_PATH)
+        except OSError:
+            return None
+        stat = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        if stat != self._temp_password_stat:
             with open(TEMP_ADMIN_PASS_PATH) as f:
-                provided_password = creds.password.decode()
-                if provided_password and provided_password == f.read().strip():
-                    return creds.username
+                self._temp_password = f.read().strip()
+            self._temp_password_stat = stat
+        return self._temp_password
+
+    def _is_provisioned(self):
+        from kolibri.core.auth.models import FacilityUser
+
+        # Only remember that there are users, so that logins are not let in without a
+        # password once there are
+        now = self.clock.seconds()
+        if not self._provisioned or now >= self._provisioned_until:
+            self._provisioned = FacilityUser.objects.exists()
+            self._provisioned_until = now + self.PROVISIONED_TTL
+        return self._provisioned
+
+    def _check(self, creds):
+        """
+        Returns the avatar ID for the credentials, or None if they are not accepted, and
+        whether they may be accepted again without checking
+        """
+        from kolibri.core.auth.models import FacilityUser
+
+        # if a temporary password was set over ADB, allow login with it
+        provided_password = creds.password.decode()
+        if provided_password and provided_password == self._read_temp_password():
+            return creds.username, False
 
         # if there are no users yet (not yet provisioned), allow anon
-        if FacilityUser.objects.count() == 0:
-            return creds.username
+        if not self._is_provisioned():
+            return creds.username, False
 
         # check whether there are any super admins with these credentials
         users = FacilityUser.objects.filter(username=creds.username)
         for user in users:
             if user.is_superuser and user.check_password(creds.password):
-                return creds.username
+                return creds.username, True
+        return None, False
 
-        # no matching users were found, so fail
-        return defer.fail(error.UnauthorizedLogin())
 
+class _QueuedProtocol(protocol.Protocol):
+    """
+    Holds a connection made before the SSH server is ready, buffering what the client sends
+    until it can be handed to the SSH server.
+    """
 
-def _get_manhole_factory(namespace):
+    def __init__(self, factory, addr):
+        self.factory = factory
+        self.addr = addr
+        self.buffer = []
+        self.wrapped = None
+
+    def connectionMade(self):
+        self.factory.queued.append(self)
+
+    def ready(self, factory):
+        self.wrapped = factory.buildProtocol(self.addr)
+        if self.wrapped is None:
+            self.transport.loseConnection()
+            return
+        self.wrapped.makeConnection(self.transport)
+        for data in self.buffer:
+            self.wrapped.dataReceived(data)
+        self.buffer = []
 
+    def dataReceived(self, data):
+        if self.wrapped is None:
+            self.buffer.append(data)
+        else:
+            self.wrapped.dataReceived(data)
+
+    def connectionLost(self, reason=protocol.connectionDone):
+        if self.wrapped is None:
+            self.factory.queued.remove(self)
+        else:
+            self.wrapped.connectionLost(reason)
+
+
+class DeferredFactory(protocol.ServerFactory):
+    """
+    Accepts connections as soon as it is listening, and hands them to the factory that
+    `deferred` fires with, queueing those made before then.
+    """
+
+    def __init__(self, deferred):
+        self.factory = None
+        self.queued = []
+        deferred.addCallbacks(self._ready, self._failed)
+
+    def buildProtocol(self, addr):
+        if self.factory is not None:
+            return self.factory.buildProtocol(addr)
+        return _QueuedProtocol(self, addr)
+
+    def _ready(self, factory):
+        factory.doStart()
+        self.factory = factory
+        queued, self.queued = self.queued, []
+        for queued_protocol in queued:
+            queued_protocol.ready(factory)
+
+    def _failed(self, failure):
+        logger.error("Remote shell failed to start: {}".format(failure.getTraceback()))
+        for queued_protocol in list(self.queued):
+            queued_protocol.transport.loseConnection()
+        reactor.stop()
+
+    def stopFactory(self):
+        if self.factory is not None:
+            self.factory.doStop()
+
+
+def _initialize():
     # ensure django has been set up so we can use the ORM etc in the shell
-    initialize(skip_update=True)
+    with trace("initialize"):
+        initialize(skip_update=True)
+
+
+def _get_manhole_factory(namespace):
+    """
+    Returns a Deferred that fires with the manhole factory, once Kolibri is initialized
+    and there is a host key, both done on threads so that the reactor can listen meanwhile.
+    """
 
     # set up the twisted manhole with Kolibri-based authentication
     def get_manhole(_):
@@ -103,14 +382,24 @@ def _get_manhole_factory(namespace):
     p = portal.Portal(realm)
     p.registerChecker(KolibriSuperAdminCredentialsChecker())
     f = manhole_ssh.ConchFactory(p)
+    f.services = dict(f.services)
+    f.services[b"ssh-userauth"] = KolibriUserAuthServer
+
+    def ready(results):
+        _, (f.publicKeys, f.privateKeys) = results
+        mark("ready")
+        return f
 
     # get the SSH server key pair to use
-    private_rsa, public_rsa = get_key_pair()
-    f.publicKeys[b"ssh-rsa"] = keys.Key.fromString(public_rsa)
-    f.privateKeys[b"ssh-rsa"] = keys.Key.fromString(private_rsa)
+    return defer.gatherResults(
+        [threads.deferToThread(_initialize), threads.deferToThread(get_host_keys)],
+        consumeErrors=True,
+    ).addCallback(ready)
 
-    return f
 
+# Tools for looking into the app's processes, available in the shell
+diagnostics = Toolkit(os.environ["KOLIBRI_HOME"], threads.deferToThread)
 
-reactor.listenTCP(4242, _get_manhole_factory(globals()))
+reactor.listenTCP(4242, DeferredFactory(_get_manhole_factory(globals())))
+mark("listening")
 reactor.run()
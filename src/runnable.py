@@ -2,40 +2,130 @@
 Runnable
 ========
 
+Schedules calls of Python functions on the PythonActivity (UI) thread.
+
+Calls are queued, and drained several at a time by a single Java Runnable posted with
+`runOnUiThread`, so a burst of calls costs one hop to the UI thread rather than one each.
+Each call returns a `concurrent.futures.Future` for its result or exception, which can be
+awaited from asyncio with `asyncio.wrap_future`.
+
+Do not wait on a future from the UI thread itself, as it will never complete.
 """
-from jnius import autoclass
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+from java_classes import get_class
 from jnius import java_method
 from jnius import PythonJavaClass
 
 # reference to the activity
-_PythonActivity = autoclass("org.kivy.android.PythonActivity")
+_PythonActivity = get_class("org.kivy.android.PythonActivity")
+
+logger = logging.getLogger(__name__)
 
+# The maximum number of calls run per hop, so the UI thread can handle other events
+# between them
+MAX_CALLS_PER_HOP = 16
 
-class Runnable(PythonJavaClass):
-    """Wrapper around Java Runnable class. This class can be used to schedule a
-    call of a Python function into the PythonActivity thread.
+
+class _Drain(PythonJavaClass):
+    """
+    The Java Runnable posted to the UI thread, which runs queued calls when run
     """
 
     __javainterfaces__ = ["java/lang/Runnable"]
-    __runnables__ = []
 
-    def __init__(self, func):
-        super(Runnable, self).__init__()
-        self.func = func
-
-    def __call__(self, *args, **kwargs):
-        self.args = args
-        self.kwargs = kwargs
-        Runnable.__runnables__.append(self)
-        _PythonActivity.mActivity.runOnUiThread(self)
+    def __init__(self, dispatcher):
+        super(_Drain, self).__init__()
+        self.dispatcher = dispatcher
 
     @java_method("()V")
     def run(self):
+        self.dispatcher._drain()
+
+
+class UiThreadDispatcher:
+    def __init__(self, max_calls_per_hop=MAX_CALLS_PER_HOP):
+        self.max_calls_per_hop = max_calls_per_hop
+        self._calls = deque()
+        self._lock = threading.Lock()
+        # Whether the drain is posted to the UI thread, and has not yet emptied the queue
+        self._posted = False
+        # The one Java proxy is held here for as long as the dispatcher exists, so it
+        # cannot be garbage collected while Java holds a reference to it
+        self._drain_runnable = _Drain(self)
+        self.hops = 0
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Queue a call of func on the UI thread, returning a Future for its result
+        """
+        future = Future()
+        with self._lock:
+            self._calls.append((future, func, args, kwargs))
+            if self._posted:
+                return future
+            self._posted = True
+        self._post()
+        return future
+
+    def submit_async(self, func, *args, **kwargs):
+        """
+        Queue a call of func on the UI thread, returning an asyncio future for its result
+        """
+        import asyncio
+
+        return asyncio.wrap_future(self.submit(func, *args, **kwargs))
+
+    def _post(self):
+        self.hops += 1
         try:
-            self.func(*self.args, **self.kwargs)
-        except Exception:
-            import traceback
+            _PythonActivity.mActivity.runOnUiThread(self._drain_runnable)
+        except Exception as e:
+            with self._lock:
+                calls = list(self._calls)
+                self._calls.clear()
+                self._posted = False
+            for future, _, _, _ in calls:
+                future.set_exception(e)
+
+    def _drain(self):
+        for _ in range(self.max_calls_per_hop):
+            with self._lock:
+                if not self._calls:
+                    self._posted = False
+                    return
+                future, func, args, kwargs = self._calls.popleft()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as e:
+                logger.exception("Error running {} on the UI thread".format(func))
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+        with self._lock:
+            if not self._calls:
+                self._posted = False
+                return
+        # Leave the rest of the queue for another hop
+        self._post()
 
-            traceback.print_exc()
 
-        Runnable.__runnables__.remove(self)
+dispatcher = UiThreadDispatcher()
+
+
+class Runnable(object):
+    """
+    Wraps a function, so that calling it schedules a call on the PythonActivity thread,
+    returning a Future for its result.
+    """
+
+    def __init__(self, func):
+        self.func = func
+
+    def __call__(self, *args, **kwargs):
+        return dispatcher.submit(self.func, *args, **kwargs)
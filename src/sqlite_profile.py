@@ -0,0 +1,70 @@
+"""
+SQLite profile
+==============
+
+The SQLite settings used by each of the app's processes, which all share the same database
+files on what is often slow eMMC or SD card storage.
+
+All processes use WAL, so readers do not block the writer, with `synchronous=NORMAL`, which
+in WAL mode only syncs at checkpoints, and cannot corrupt the database on a power loss,
+though the most recent commits may be rolled back. The settings that differ by process are:
+
+===========  ===========  ==========  ============  ===================
+Role         Page cache   mmap        Busy timeout  Connection max age
+===========  ===========  ==========  ============  ===================
+main         all          64 MB       30 s          10 minutes
+taskworker   all          32 MB       100 s         for the process
+remoteshell  a quarter    none        30 s          per request
+===========  ===========  ==========  ============  ===================
+
+The main process serves the UI, so waits less for locks held by task workers than Kolibri's
+default of 100 seconds, and keeps connections open across requests. Task workers are long
+writers, that would rather wait for the server than fail. The remote shell is rarely used,
+so holds on to little memory.
+
+The page cache size for the device is set by device_profile.
+"""
+# Role to pragmas for each connection, and how long to keep connections open
+PROFILES = {
+    "main": {
+        "cache_fraction": 1,
+        "mmap_size": 64 * 1024 * 1024,
+        "busy_timeout": 30000,
+        "conn_max_age": 600,
+    },
+    "taskworker": {
+        "cache_fraction": 1,
+        "mmap_size": 32 * 1024 * 1024,
+        "busy_timeout": 100000,
+        "conn_max_age": None,
+    },
+    "remoteshell": {
+        "cache_fraction": 0.25,
+        "mmap_size": 0,
+        "busy_timeout": 30000,
+        "conn_max_age": 0,
+    },
+}
+
+# The page cache size if the device has not been profiled, as SQLite's default
+DEFAULT_CACHE_KB = 2000
+
+
+def get_profile(role):
+    return PROFILES.get(role, PROFILES["main"])
+
+
+def connection_pragmas(role, cache_kb=None):
+    """
+    Returns the statements to run on each new connection for a process role
+    """
+    profile = get_profile(role)
+    cache_kb = int((cache_kb or DEFAULT_CACHE_KB) * profile["cache_fraction"])
+    return [
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        # A negative cache size is in KB, rather than in pages
+        "PRAGMA cache_size=-{}".format(cache_kb),
+        "PRAGMA mmap_size={}".format(profile["mmap_size"]),
+        "PRAGMA busy_timeout={}".format(profile["busy_timeout"]),
+    ]
@@ -1,15 +1,54 @@
 import logging
+import os
+import socket
 
 import initialization  # noqa: F401 keep this first, to ensure we're set up for other imports
+from boot_trace import trace
+from diagnostics import start_agent
+from java_classes import get_class
 from kolibri.main import initialize
 
 
-initialize(skip_update=True)
+with trace("initialize"):
+    initialize(skip_update=True)
+start_agent(os.environ["KOLIBRI_HOME"])
 
 logger = logging.getLogger(__name__)
 
+# The abstract socket name that the Java side (PythonWorker) connects to, in order to hand
+# jobs to an interpreter that is already initialized, instead of booting a new one.
+# PythonWorker names it after the app's package, and exports it before starting python.
+WARM_WORKER_SOCKET = os.environ.get("PYTHON_WORKER_SOCKET")
+WARM_WORKER_ADDRESS = "\0" + WARM_WORKER_SOCKET if WARM_WORKER_SOCKET else None
 
-def main(job_request):
+# How long a warm interpreter waits for another job before giving up and exiting
+WARM_WORKER_IDLE_TIMEOUT = float(
+    os.environ.get("KOLIBRI_TASKWORKER_IDLE_TIMEOUT", "60")
+)
+
+# How many jobs a warm interpreter runs before it exits, so that it gets recycled
+# and any memory accumulated while running jobs is released.
+# Setting this to 0 disables warm workers entirely.
+WARM_WORKER_MAX_JOBS = int(os.environ.get("KOLIBRI_TASKWORKER_MAX_JOBS", "20"))
+
+
+def _bind_local_worker(request_id):
+    """
+    Point progress updates from this thread at the Java worker for the request
+    """
+    TaskWorker = get_class("org.learningequality.Kolibri.task.TaskWorkerImpl")
+    TaskWorker.bindLocalInstance(request_id)
+
+
+def _report_result(request_id, result):
+    """
+    Let the Java worker that booted this interpreter finish, without waiting for it to exit
+    """
+    PythonWorker = get_class("org.kivy.android.PythonWorker")
+    PythonWorker.reportResult(request_id, result)
+
+
+def execute(job_request):
     request_id, job_id, process_id, thread_id = job_request.split(",")
     logger.info(
         "Starting Kolibri task worker, for job {} and request {}".format(
@@ -36,3 +75,95 @@ def main(job_request):
             job_id, request_id
         )
     )
+
+
+def _listen(address):
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        listener.bind(address)
+    except OSError:
+        # Another interpreter is already serving jobs
+        listener.close()
+        return None
+    listener.listen(1)
+    return listener
+
+
+def serve(
+    address=WARM_WORKER_ADDRESS,
+    idle_timeout=WARM_WORKER_IDLE_TIMEOUT,
+    max_jobs=WARM_WORKER_MAX_JOBS,
+    execute=execute,
+    bind_local_worker=_bind_local_worker,
+    thread_id=None,
+):
+    """
+    Keep this interpreter warm, running job requests received over a local socket,
+    until it has been idle for `idle_timeout` seconds or has run `max_jobs` jobs.
+
+    Each request is a single `request_id,job_id,process_id,thread_id` line, and is answered
+    with a single line containing `0` on success or `1` on failure. The thread ID is that of
+    the Java worker that sent the request, so it is replaced with `thread_id`, the ID of the
+    thread that runs this interpreter, when given.
+    The listener is closed while a job runs, so that concurrent requests fall back to
+    booting their own interpreter rather than queueing behind this one.
+    """
+    jobs = 0
+    while jobs < max_jobs:
+        listener = _listen(address)
+        if listener is None:
+            break
+        listener.settimeout(idle_timeout)
+        try:
+            conn, _ = listener.accept()
+        except socket.timeout:
+            logger.info("Task worker idle for {}s, exiting".format(idle_timeout))
+            break
+        finally:
+            listener.close()
+
+        with conn, conn.makefile("rw") as channel:
+            job_request = channel.readline().strip()
+            if not job_request:
+                continue
+            jobs += 1
+            request_id, job_id, process_id, request_thread_id = job_request.split(",")
+            job_request = ",".join(
+                [request_id, job_id, process_id, thread_id or request_thread_id]
+            )
+            result = 0
+            try:
+                bind_local_worker(request_id)
+                with trace("warm job"):
+                    execute(job_request)
+            except Exception:
+                result = 1
+            finally:
+                bind_local_worker("")
+            try:
+                channel.write("{}\n".format(result))
+                channel.flush()
+            except OSError:
+                logger.warning(
+                    "Task worker could not report result for request {}".format(
+                        request_id
+                    )
+                )
+    logger.info("Task worker exiting after {} warm jobs".format(jobs))
+
+
+def main(job_request):
+    request_id, _, _, thread_id = job_request.split(",")
+    result = 0
+    try:
+        # PythonWorker runs this interpreter on its own thread, not the Java worker's
+        _bind_local_worker(request_id)
+        with trace("job"):
+            execute(job_request)
+    except Exception:
+        result = 1
+    finally:
+        _bind_local_worker("")
+    _report_result(request_id, result)
+    if WARM_WORKER_MAX_JOBS > 0 and WARM_WORKER_ADDRESS:
+        serve(thread_id=thread_id)
@@ -0,0 +1,185 @@
+"""
+Value store
+===========
+
+A small key/value store in a single file, that can be safely shared by the UI process,
+the service and task workers.
+
+Each commit appends one line to the file, holding a JSON object of the keys it sets.
+Lines are written and fsynced while holding an exclusive lock on a separate lock file, so
+a commit is all or nothing: a line torn by the process being killed mid-write is ignored
+when reading. Reads take no lock. Once enough commits have accumulated, the file is
+compacted to a single commit and atomically swapped in. The first line of the file is a
+unique generation marker, so that readers can tell when that has happened.
+
+Entries may have a time to live, and may be tied to a version (e.g. the APK versionCode),
+after which they are treated as missing.
+"""
+import fcntl
+import json
+import os
+import time
+import uuid
+from contextlib import contextmanager
+
+# The number of commits after which the log is compacted
+COMPACT_AFTER = 64
+
+VALUE = "v"
+EXPIRES = "e"
+VERSION = "r"
+
+
+class ValueStore:
+    __slots__ = "_path", "_dict", "_offset", "_generation", "_commits", "version"
+
+    def __init__(self, path=None, version=None):
+        self._path = path
+        self._dict = {}
+        self._offset = 0
+        self._generation = None
+        self._commits = 0
+        self.version = version
+
+    def _storage_path(self):
+        return self._path
+
+    @contextmanager
+    def _lock(self):
+        with open(self._storage_path() + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _refresh(self):
+        """
+        Read any commits made since we last read the file, including by other processes
+        """
+        try:
+            with open(self._storage_path(), "rb") as f:
+                generation = f.readline()
+                if not generation.endswith(b"\n"):
+                    return
+                if generation != self._generation:
+                    # The file has been compacted, so read it from the start
+                    self._generation = generation
+                    self._offset = len(generation)
+                    self._commits = 0
+                    self._dict = {}
+                f.seek(self._offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        for line in data.splitlines(True):
+            if not line.endswith(b"\n"):
+                # An incomplete commit, which may still be being written
+                break
+            self._offset += len(line)
+            try:
+                entries = json.loads(line)
+            except ValueError:
+                # A torn commit, left by a process that was killed
+                continue
+            if isinstance(entries, dict):
+                self._dict.update(entries)
+            self._commits += 1
+
+    def _valid(self, entry):
+        if entry.get(EXPIRES) is not None and entry[EXPIRES] < time.time():
+            return False
+        if VERSION in entry and entry[VERSION] != self.version:
+            return False
+        return True
+
+    def _entry(self, value, ttl=None, versioned=False):
+        entry = {VALUE: value}
+        if ttl is not None:
+            entry[EXPIRES] = time.time() + ttl
+        if versioned:
+            entry[VERSION] = self.version
+        return entry
+
+    def get_many(self, keys):
+        """
+        Returns a dict of the values for any of `keys` that are in the store
+        """
+        if any(
+            key not in self._dict or not self._valid(self._dict[key]) for key in keys
+        ):
+            self._refresh()
+        return {
+            key: self._dict[key][VALUE]
+            for key in keys
+            if key in self._dict and self._valid(self._dict[key])
+        }
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    @staticmethod
+    def _generation_marker():
+        return "#{}\n".format(uuid.uuid4().hex).encode()
+
+    def _append(self, entries):
+        path = self._storage_path()
+        # Pick up other processes' commits, so compaction does not lose them
+        self._refresh()
+        if self._commits >= COMPACT_AFTER:
+            self._dict.update(entries)
+            self._compact(path)
+            return
+        data = json.dumps(entries).encode() + b"\n"
+        with open(path, "ab+") as f:
+            if not f.seek(0, os.SEEK_END):
+                data = self._generation_marker() + data
+            else:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    # Terminate a commit torn by a killed process, so it can be skipped
+                    data = b"\n" + data
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        self._refresh()
+
+    def _compact(self, path):
+        live = {key: entry for key, entry in self._dict.items() if self._valid(entry)}
+        temp_path = "{}.{}".format(path, os.getpid())
+        with open(temp_path, "wb") as f:
+            f.write(self._generation_marker() + json.dumps(live).encode() + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+        self._refresh()
+
+    def set_many(self, values, ttl=None, versioned=False):
+        """
+        Atomically set all of `values`, optionally expiring them after `ttl` seconds,
+        or when the store's version changes if `versioned` is True
+        """
+        entries = {
+            key: self._entry(value, ttl=ttl, versioned=versioned)
+            for key, value in values.items()
+        }
+        with self._lock():
+            self._append(entries)
+
+    def set(self, key, value, ttl=None, versioned=False):
+        self.set_many({key: value}, ttl=ttl, versioned=versioned)
+
+    def get_or_set(self, key, default, ttl=None, versioned=False):
+        """
+        Returns the value for `key`, setting it to the result of calling `default` if it is
+        missing. Processes racing to set the same key only call `default` once.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        with self._lock():
+            value = self.get(key)
+            if value is None:
+                value = default()
+                self._append({key: self._entry(value, ttl=ttl, versioned=versioned)})
+        return value